@@ -1,12 +1,51 @@
 # dashboard.py - MLB薪資表現分析儀表板（優化整合版）
+import io
+import os
+import time
+from datetime import datetime
+
+from mlb_analysis.lazy_imports import (
+    check_import_budget, eager_modules, lazy_import, mark_startup_complete, measure_fresh_imports, startup_report
+)
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import os
-from datetime import datetime
-from scipy import stats  # 新增：用於計算百分位數和統計分佈
+
+from mlb_analysis import copy_tracker, instrumentation, profiler, shared_cache, telemetry
+from mlb_analysis.instrumentation import span
+from mlb_analysis.dataset import dataset_version as get_dataset_version, file_version
+from mlb_analysis.columnar import FORMATS as COLUMNAR_FORMATS, ColumnarDataset, bundle_bytes, export_tables
+from mlb_analysis.export import XLSX_MIME, write_workbook
+from mlb_analysis.figure_cache import FigureCache
+from mlb_analysis.filter_index import FilterIndex
+from mlb_analysis.jobs import ACTIVE_STATES, JOB_KINDS, STATES as JOB_STATES, JobQueue, in_process_worker
+from mlb_analysis.modes import ANALYSIS_MODES
+from mlb_analysis.summary_cube import SummaryCube, row_kpis
+from mlb_analysis.metrics import (
+    WVPI_COMPONENTS, WVPI_WEIGHTS, analyze_positional_arbitrage, calculate_all_team_psi,
+    calculate_salary_residuals, calculate_sei, calculate_wvpi_pca_weights, classify_psi, manual_ols_regression,
+    preprocess_data, salary_model_data, split_salary_anomalies
+)
+from mlb_analysis.charts import plot_lorenz_curve, plot_tpm_matrix
+from mlb_analysis.parallel import GroupExecutor, team_report
+from mlb_analysis.permutation import permutation_test, summary_table
+from mlb_analysis.precompute import PrecomputeScheduler, schedule_dataset, tpm_counts
+
+# 重量級子系統改為第一次使用時才載入，不需要圖表或統計的頁面不必付出載入成本
+# px 的每次呼叫（建立圖表）在效能量測啟用時記錄為 px.<函數名稱> 區段
+px = instrumentation.TracedModule(lazy_import("plotly.express"), "px")
+go = lazy_import("plotly.graph_objects")
+
+# 圖表快取容量上限 (MB)，可用環境變數調整
+FIGURE_CACHE_MAX_MB = int(os.environ.get("MLB_FIGURE_CACHE_MB", "128"))
+
+# 球員比較人數上限（球團名單檢視需要一次比較整份名單）
+MAX_COMPARE_PLAYERS = 50
+
+# 背景工作頁在有未結束的工作時更新進度的間隔（秒）
+JOB_POLL_SECONDS = 2
 
 # ============================================================
 # 設定頁面配置
@@ -18,6 +57,61 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ============================================================
+# 執行指標（設定 MLB_METRICS_PORT 時於旁路連接埠輸出 Prometheus 指標）
+# ============================================================
+telemetry.ensure_server()
+
+# 上一次執行沒有走到頁尾（st.stop 或被新的互動中斷）
+if st.session_state.pop('_rerun_started', None) is not None:
+    telemetry.RERUNS_ABORTED.inc()
+st.session_state['_rerun_started'] = time.perf_counter()
+
+# ============================================================
+# 效能量測（環境變數 MLB_INSTRUMENT=1、設定 MLB_INSTRUMENT_LOG 或網址參數 ?instrument=1 時啟用）
+# ============================================================
+INSTRUMENT_PANEL = os.environ.get("MLB_INSTRUMENT") == "1" or st.query_params.get("instrument") == "1"
+INSTRUMENT_ENABLED = INSTRUMENT_PANEL or instrumentation.log_path() is not None
+
+# 上一次執行若被 st.stop 中斷，量測不會走到頁尾，在此補結束
+_previous_run = st.session_state.pop('_instrument_run', None)
+if _previous_run is not None:
+    instrumentation.finish_run(status='aborted', run=_previous_run)
+
+if INSTRUMENT_ENABLED:
+    _ctx = get_script_run_ctx()
+    st.session_state['_instrument_run'] = instrumentation.start_run(
+        session=_ctx.session_id if _ctx is not None else None,
+        track_memory=instrumentation.memory_enabled()
+    )
+
+# ============================================================
+# 效能分析（環境變數 MLB_PROFILE=1 或網址參數 ?profile=1 時，對本次執行取樣並輸出 flamegraph 檔）
+# ============================================================
+PROFILE_ENABLED = os.environ.get("MLB_PROFILE") == "1" or st.query_params.get("profile") == "1"
+
+_previous_profiler = st.session_state.pop('_profiler', None)
+if _previous_profiler is not None:
+    _previous_profiler.stop().write(profiler.output_dir(), status='aborted')
+
+if PROFILE_ENABLED:
+    st.session_state['_profiler'] = profiler.SamplingProfiler(__file__, profiler.interval_ms()).start()
+
+# ============================================================
+# DataFrame 複本追蹤（環境變數 MLB_TRACK_COPIES=1 或網址參數 ?track_copies=1 時啟用）
+# ============================================================
+COPY_TRACK_ENABLED = os.environ.get("MLB_TRACK_COPIES") == "1" or st.query_params.get("track_copies") == "1"
+
+_previous_tracker = st.session_state.pop('_copy_tracker', None)
+if _previous_tracker is not None:
+    copy_tracker.stop_tracking(_previous_tracker, status='aborted')
+
+if COPY_TRACK_ENABLED:
+    _ctx = get_script_run_ctx()
+    st.session_state['_copy_tracker'] = copy_tracker.start_tracking(
+        session=_ctx.session_id if _ctx is not None else None
+    )
+
 # ============================================================
 # 自定義CSS樣式
 # ============================================================
@@ -82,6 +176,7 @@ st.markdown(f"""
 @st.cache_data(ttl=3600)
 def load_data():
     """從雲端資料夾載入數據"""
+    telemetry.note_load_data_miss()
     try:
         # 獲取當前程式所在的目錄
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -94,7 +189,11 @@ def load_data():
             os.path.join(current_dir, "mlb_salaries_2024", "data", "merged_performance_salary.csv"),
             os.path.join(os.path.dirname(current_dir), "data", "merged_performance_salary.csv")
         ]
-        
+
+        # 可用環境變數 MLB_DATA_PATH 指定其他資料檔（例如 mlb_analysis.synthetic 產生的合成資料）
+        if os.environ.get("MLB_DATA_PATH"):
+            possible_paths.insert(0, os.environ["MLB_DATA_PATH"])
+
         # 嘗試每個路徑
         data_path = None
         for path in possible_paths:
@@ -125,80 +224,21 @@ def load_data():
             
             return None
         
-        # 讀取數據
-        df = pd.read_csv(data_path)
-        st.success(f"✅ 成功載入 {len(df)} 筆數據")
-
-        # 數據預處理
-        if 'value_ratio' not in df.columns and 'WAR' in df.columns and 'Salary_millions' in df.columns:
-            df['value_ratio'] = df['WAR'] / df['Salary_millions']
-        
-        # 標準化欄位名稱
-        column_mapping = {}
-        
-        if 'Team' not in df.columns:
-            possible_team_cols = ['Team_performance', 'Team_salary', 'team', 'TEAM']
-            for col in possible_team_cols:
-                if col in df.columns:
-                    column_mapping[col] = 'Team'
-                    break
-        
-        if 'Position' not in df.columns:
-            possible_pos_cols = ['Position_salary', 'position', 'Pos', 'POS']
-            for col in possible_pos_cols:
-                if col in df.columns:
-                    column_mapping[col] = 'Position'
-                    break
-        
-        if 'Name' not in df.columns:
-            possible_name_cols = ['Name_clean', 'Player', 'Player_formatted', 'player']
-            for col in possible_name_cols:
-                if col in df.columns:
-                    column_mapping[col] = 'Name'
-                    break
-        
-        if column_mapping:
-            df = df.rename(columns=column_mapping)
-            
-        if 'Team' in df.columns:
-            df = df[df['Team'] != '---']
-            df = df.dropna(subset=['Team'])
-            df['Team'] = df['Team'].astype(str)
-            
-        pos_map = {
-            1: 'P', '1': 'P', '1.0': 'P',
-            2: 'C', '2': 'C', '2.0': 'C',
-            3: '1B', '3': '1B', '3.0': '1B',
-            4: '2B', '4': '2B', '4.0': '2B',
-            5: '3B', '5': '3B', '5.0': '3B',
-            6: 'SS', '6': 'SS', '6.0': 'SS',
-            7: 'LF', '7': 'LF', '7.0': 'LF',
-            8: 'CF', '8': 'CF', '8.0': 'CF',
-            9: 'RF', '9': 'RF', '9.0': 'RF',
-            10: 'DH', '10': 'DH', 'O': 'DH'
-        }
-
-        if 'Position' in df.columns:
-            df['Position'] = df['Position'].apply(lambda x: pos_map.get(x, x))
-
-        # 計算財務分析指標
-        if 'Salary_millions' in df.columns:
-            df['salary_percentile'] = df['Salary_millions'].rank(pct=True) * 100
-            df['salary_category'] = pd.qcut(df['Salary_millions'], q=4, 
-                                            labels=['低薪資', '中低薪資', '中高薪資', '高薪資'])
-        
-        if 'WAR' in df.columns:
-            df['war_percentile'] = df['WAR'].rank(pct=True) * 100
-            df['war_category'] = pd.qcut(df['WAR'], q=4,
-                                        labels=['低表現', '中低表現', '中高表現', '高表現'])
+        # 讀取數據、預處理與原創財務指標 (依據 new_variables.md)
+        # 設定 MLB_SHARED_CACHE_DIR 時由多個 worker 共用衍生資料，只有第一個 worker 需要解析 CSV 與計算指標
+        df, shared_status = shared_cache.load_derived(data_path, lambda: preprocess_data(pd.read_csv(data_path)))
+        telemetry.note_shared_cache(shared_status)
+        st.success(f"✅ 成功載入 {len(df)} 筆數據" + ("（共用快取）" if shared_status == 'hit' else ""))
+        if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+            st.warning("⚠️ 缺少 WAR 或 Salary_millions 欄位，無法計算部分原創指標")
         
-        # ============================================================
-        # 新增：計算原創財務指標 (依據 new_variables.md)
-        # ============================================================
-        df = calculate_original_financial_metrics(df)
+        # 除錯：記錄 WVPI 分佈（只在效能量測啟用時計算）
+        record_wvpi_summary(df)
         
-        # 除錯：檢查 WVPI 分佈
-        debug_wvpi(df)
+        # 記錄資料集版本，供圖表快取等使用
+        df.attrs['dataset_version'] = file_version(data_path)
+        # 背景工作由資料檔路徑重新載入資料
+        df.attrs['data_path'] = data_path
         
         return df
     
@@ -206,239 +246,57 @@ def load_data():
         st.error(f"❌ 讀取數據失敗: {e}")
         return None
 
-# 將 debug_wvpi 函數移到 load_data 函數之後
-def debug_wvpi(df):
-    """檢查 WVPI 的實際分佈"""
-    if 'WVPI' in df.columns:
-        print("=" * 50)
-        print("WVPI 統計摘要:")
-        print(f"最小值: {df['WVPI'].min():.2f}")
-        print(f"最大值: {df['WVPI'].max():.2f}")
-        print(f"平均值: {df['WVPI'].mean():.2f}")
-        print(f"中位數: {df['WVPI'].median():.2f}")
-        print(f"標準差: {df['WVPI'].std():.2f}")
-        print("\n百分位數:")
-        for p in [10, 25, 50, 75, 90, 95, 99]:
-            print(f"{p}th: {df['WVPI'].quantile(p/100):.2f}")
-        print("=" * 50)
+@st.cache_resource
+def get_figure_cache():
+    """跨工作階段共用的圖表快取"""
+    return FigureCache(max_bytes=FIGURE_CACHE_MAX_MB * 1024 * 1024)
 
-# ============================================================
-# 新增：原創財務指標計算函數 (依據 new_variables.md)
-# ============================================================
-def calculate_original_financial_metrics(df):
-    """計算六個原創財務指標：WVPI, RAV, MERI, PSI, TPM, SEI"""
-    
-    # 檢查必要欄位
-    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
-        st.warning("⚠️ 缺少 WAR 或 Salary_millions 欄位，無法計算部分原創指標")
-        return df
-    
-    # 2. 加權綜合價值指數 (WVPI)
-    df = calculate_wvpi(df)
-    
-    # 3. 風險調整後價值 (RAV)
-    df = calculate_rav(df)
-    
-    # 4. 市場效率殘差指數 (MERI)
-    df = calculate_meri(df)
-    
-    # 5. 投資組合夏普指數 (PSI) - 需要球隊層級計算，稍後在球隊分析中進行
-    
-    # 6. 雙因子績效矩陣 (TPM) - 需要百分位，已在計算中
-    
-    # 7. 同步效率指數 (SEI) - 需要全局計算，稍後在綜合儀表板中進行
-    
-    return df
+@st.cache_resource
+def get_precompute_scheduler():
+    """跨工作階段共用的背景預先計算排程器（結果依資料集版本存放）"""
+    return PrecomputeScheduler()
 
-def calculate_wvpi(df):
-    """計算加權綜合價值指數 (WVPI) - 修正版（所有項目標準化到 0-100）"""
-    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
-        return df
-    
-    # 定義權重 (依據 new_variables.md 2.3 節)
-    w1, w2, w3, w4 = 0.35, 0.30, 0.20, 0.15
-    
-    # 計算 WAR 百分位
-    df['P_WAR'] = df['WAR'].rank(pct=True) * 100
-    
-    # 計算薪資百分位
-    df['P_Salary'] = df['Salary_millions'].rank(pct=True) * 100
-    
-    # 計算 100 - P_Salary (相對成本項)
-    df['P_Salary_inv'] = 100 - df['P_Salary']
-    
-    # 計算性價比 (WAR/Salary)
-    df['VR'] = df['WAR'] / df['Salary_millions']
-    
-    # ==== 新增：標準化 WAR 和 VR 到 0-100 尺度 ====
-    war_max = df['WAR'].max()
-    vr_max = df['VR'].max()
-    
-    # 標準化 WAR (避免除以零)
-    if war_max > 0:
-        df['WAR_norm'] = (df['WAR'] / war_max) * 100
-    else:
-        df['WAR_norm'] = 0
-    
-    # 標準化 VR (避免除以零)
-    if vr_max > 0:
-        df['VR_norm'] = (df['VR'] / vr_max) * 100
-    else:
-        df['VR_norm'] = 0
-    
-    # 計算 WVPI - 使用標準化後的數值
-    df['WVPI'] = (w1 * df['WAR_norm'] + 
-                  w2 * df['VR_norm'] + 
-                  w3 * df['P_WAR'] + 
-                  w4 * df['P_Salary_inv'])
-    
-    # ==== 修正：根據實際分佈調整分類閾值 ====
-    # 先計算 WVPI 的百分位數，用於調整整體分佈
-    p25 = df['WVPI'].quantile(0.25)
-    p50 = df['WVPI'].quantile(0.50)
-    p75 = df['WVPI'].quantile(0.75)
-    p90 = df['WVPI'].quantile(0.90)
-    p95 = df['WVPI'].quantile(0.95)
-    
-    # 根據實際分佈設定閾值
-    conditions = [
-        df['WVPI'] > p90,                          # 前10% -> 頂級球星
-        (df['WVPI'] > p75) & (df['WVPI'] <= p90),  # 前10-25% -> 優質球員
-        (df['WVPI'] > p50) & (df['WVPI'] <= p75),  # 前25-50% -> 普通球員
-        (df['WVPI'] > p25) & (df['WVPI'] <= p50),  # 後25-50% -> 效率待提升
-        df['WVPI'] <= p25                           # 後25% -> 問題合約
-    ]
-    categories = ['頂級球星', '優質球員', '普通球員', '效率待提升', '問題合約']
-    df['WVPI_category'] = np.select(conditions, categories, default='未知')
-    
-    return df
-
-def calculate_rav(df):
-    """計算風險調整後價值 (RAV)"""
-    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
-        return df
-    
-    # 計算 WAR_min (替補球員水準) - 使用薪資低於第25百分位的球員平均WAR
-    low_salary_threshold = df['Salary_millions'].quantile(0.25)
-    bench_players = df[df['Salary_millions'] <= low_salary_threshold]
-    WAR_min = bench_players['WAR'].mean() if len(bench_players) > 0 else 0
-    
-    # 計算 σ_WAR (生涯WAR標準差) - 由於無多年數據，使用近似公式
-    # 使用位置平均WAR的絕對差異作為近似
-    if 'Position' in df.columns:
-        position_avg_war = df.groupby('Position')['WAR'].transform('mean')
-        df['sigma_WAR_approx'] = np.abs(df['WAR'] - position_avg_war)
-    else:
-        df['sigma_WAR_approx'] = df['WAR'].std() if df['WAR'].std() > 0 else 1
-    
-    # 計算薪資中位數
-    median_salary = df['Salary_millions'].median()
-    
-    # 計算 RAV
-    df['RAV'] = ((df['WAR'] - WAR_min) / (df['sigma_WAR_approx'] + 1)) * (median_salary / df['Salary_millions'])
-    
-    # 添加 RAV 分類 (依據 new_variables.md 3.6 節)
-    conditions = [
-        df['RAV'] > 2.0,
-        (df['RAV'] > 1.0) & (df['RAV'] <= 2.0),
-        (df['RAV'] > 0) & (df['RAV'] <= 1.0),
-        df['RAV'] <= 0
-    ]
-    categories = ['低風險高回報', '穩健型球員', '普通球員', '高風險或低於替補']
-    df['RAV_category'] = np.select(conditions, categories, default='未知')
-    
-    return df
+@st.cache_resource
+def get_group_executor():
+    """跨工作階段共用的分組計算行程池（資料量大時才啟動工作行程）"""
+    return GroupExecutor()
 
-def calculate_meri(df):
-    """計算市場效率殘差指數 (MERI)"""
-    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
-        return df
-    
-    # 清理數據
-    df_clean = df.dropna(subset=['WAR', 'Salary_millions']).copy()
-    
-    # 建立線性回歸模型 (WAR -> Salary)
-    X = df_clean[['WAR']].values
-    y = df_clean['Salary_millions'].values
-    
-    # 簡單線性回歸 (不使用外部庫)
-    X_mean = np.mean(X)
-    y_mean = np.mean(y)
-    
-    numerator = np.sum((X.flatten() - X_mean) * (y - y_mean))
-    denominator = np.sum((X.flatten() - X_mean) ** 2)
-    
-    beta = numerator / denominator if denominator != 0 else 0
-    alpha = y_mean - beta * X_mean
-    
-    # 計算預期薪資
-    df['expected_salary'] = alpha + beta * df['WAR']
-    
-    # 如果位置數據存在，加入位置調整 (簡化版)
-    if 'Position' in df.columns:
-        position_avg_residual = df.groupby('Position')['Salary_millions'].transform('mean') - \
-                                df.groupby('Position')['expected_salary'].transform('mean')
-        df['expected_salary_position'] = df['expected_salary'] + position_avg_residual
-    else:
-        df['expected_salary_position'] = df['expected_salary']
-    
-    # 計算殘差百分比
-    df['residual_pct'] = (df['Salary_millions'] - df['expected_salary_position']) / df['expected_salary_position']
-    
-    # 計算 MERI = 殘差百分比 × ln(1 + WAR)
-    df['MERI'] = df['residual_pct'] * np.log(1 + np.abs(df['WAR']))
-    
-    # 添加 MERI 分類 (依據 new_variables.md 4.6 節)
-    conditions = [
-        df['MERI'] > 0.5,
-        (df['MERI'] > 0.1) & (df['MERI'] <= 0.5),
-        (df['MERI'] >= -0.1) & (df['MERI'] <= 0.1),
-        (df['MERI'] >= -0.5) & (df['MERI'] < -0.1),
-        df['MERI'] < -0.5
-    ]
-    categories = ['嚴重高估', '稍微高估', '合理定價', '稍微低估', '嚴重低估']
-    df['MERI_category'] = np.select(conditions, categories, default='未知')
-    
-    return df
-
-def calculate_team_psi(team_df, league_efficiency):
-    """計算單一球隊的投資組合夏普指數 (PSI)"""
-    total_war = team_df['WAR'].sum()
-    total_salary = team_df['Salary_millions'].sum()
-    expected_war = total_salary * league_efficiency
-    excess_war = total_war - expected_war
-    team_risk = team_df['WAR'].std() if len(team_df) > 1 else 1
-    
-    # PSI = 超額WAR / 球隊風險
-    psi = excess_war / team_risk if team_risk != 0 else 0
-    return psi
-
-def calculate_sei(df):
-    """計算同步效率指數 (SEI)"""
-    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
-        return 0, 0, 0
-    
-    # 計算 WAR 與薪資的相關係數
-    df_clean = df.dropna(subset=['WAR', 'Salary_millions'])
-    correlation = df_clean['WAR'].corr(df_clean['Salary_millions'])
-    
-    # 計算薪資的基尼係數
-    salaries = df_clean['Salary_millions'].values
-    salaries = salaries[salaries > 0]
-    
-    if len(salaries) > 0:
-        # 計算基尼係數
-        salaries_sorted = np.sort(salaries)
-        n = len(salaries_sorted)
-        index = np.arange(1, n + 1)
-        gini = ((2 * index - n - 1) * salaries_sorted).sum() / (n * salaries_sorted.sum())
-    else:
-        gini = 0
-    
-    # SEI = ρ × (1 - G)
-    sei = correlation * (1 - gini)
-    
-    return correlation, gini, sei
+@st.cache_resource
+def get_job_queue():
+    """跨工作階段共用的背景工作佇列；預設在本行程中啟動工作者（MLB_JOBS_WORKER=0 時由獨立的工作者執行）"""
+    job_queue = JobQueue(executor=get_group_executor())
+    if in_process_worker():
+        job_queue.start_worker()
+    return job_queue
+
+@st.cache_resource(max_entries=4)
+def get_filter_index(dataset_version, _df):
+    """每個資料集版本建立一次的篩選索引（WAR/薪資排序與各球隊位元圖）"""
+    return FilterIndex(_df)
+
+@st.cache_resource(max_entries=2)
+def get_columnar_dataset(dataset_version, _df):
+    """每個資料集版本轉換一次的 Arrow 資料表（欄式匯出用，第一次匯出時才建立）"""
+    return ColumnarDataset(_df)
+
+@st.cache_resource(max_entries=4)
+def get_summary_cube(dataset_version, _df):
+    """每個資料集版本建立一次的摘要立方體（指標卡片與分組圖表由彙總格計算）"""
+    return SummaryCube(_df)
+
+# 將 WVPI 分佈摘要移到 load_data 函數之後
+def record_wvpi_summary(df):
+    """WVPI 的實際分佈：記錄為 wvpi_summary 區段的屬性（寫入 JSON lines 記錄檔）"""
+    if 'WVPI' not in df.columns or instrumentation.current_run() is None:
+        return
+    wvpi = df['WVPI']
+    percentiles = wvpi.quantile([p / 100 for p in [10, 25, 50, 75, 90, 95, 99]])
+    with span('wvpi_summary',
+              min=round(float(wvpi.min()), 2), max=round(float(wvpi.max()), 2),
+              mean=round(float(wvpi.mean()), 2), median=round(float(wvpi.median()), 2),
+              std=round(float(wvpi.std()), 2),
+              percentiles={f"p{round(q * 100)}": round(float(v), 2) for q, v in percentiles.items()}):
+        pass
 
 # ============================================================
 # 輔助函數 (含新增的高階分析函數)
@@ -496,140 +354,30 @@ def add_regression_line(fig, df, x_col, y_col):
     
     return fig
 
-def manual_ols_regression(x, y):
-    """手動實現OLS回歸，避免依賴statsmodels，並提供完整統計量"""
-    try:
-        # 添加常數項
-        X = np.column_stack([np.ones(len(x)), x])
-        
-        # OLS公式: β = (X'X)^{-1}X'y
-        XTX = np.dot(X.T, X)
-        XTX_inv = np.linalg.inv(XTX)
-        beta = np.dot(XTX_inv, np.dot(X.T, y))
-        
-        # 計算預測值和殘差
-        y_pred = np.dot(X, beta)
-        residuals = y - y_pred
-        
-        # 計算統計量
-        n = len(x)
-        k = 2  # 截距 + 斜率
-        
-        # 殘差平方和
-        ss_res = np.sum(residuals**2)
-        
-        # 總平方和
-        ss_tot = np.sum((y - np.mean(y))**2)
-        
-        # R²
-        r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
-        
-        # 調整後R²
-        adj_r_squared = 1 - (1 - r_squared) * (n - 1) / (n - k) if n > k else r_squared
-        
-        # 標準誤
-        sigma2 = ss_res / (n - k)
-        var_beta = sigma2 * np.diag(XTX_inv)
-        std_err = np.sqrt(var_beta)
-        
-        # t統計量
-        t_values = beta / std_err
-        
-        # p值（使用t分布）
-        p_values = [2 * (1 - stats.t.cdf(np.abs(t), df=n-k)) for t in t_values]
-        
-        # F統計量
-        msr = (ss_tot - ss_res) / (k - 1)
-        mse = ss_res / (n - k)
-        f_value = msr / mse if mse != 0 else 0
-        
-        return {
-            'intercept': beta[0],
-            'slope': beta[1],
-            'r_squared': r_squared,
-            'adj_r_squared': adj_r_squared,
-            'std_err_intercept': std_err[0],
-            'std_err_slope': std_err[1],
-            't_intercept': t_values[0],
-            't_slope': t_values[1],
-            'p_intercept': p_values[0],
-            'p_slope': p_values[1],
-            'f_value': f_value,
-            'n': n,
-            'residuals': residuals
-        }
-    except Exception as e:
-        st.warning(f"手動回歸計算錯誤: {e}")
-        return None
-
-def calculate_gini(series):
-    """計算基尼係數 (0=完全平等, 1=完全不平等)"""
-    # 確保數值為正
-    incomes = np.sort(series.dropna().values)
-    incomes = incomes[incomes > 0]
-    if len(incomes) == 0: return 0
-    
-    n = len(incomes)
-    index = np.arange(1, n + 1)
-    return ((2 * index - n - 1) * incomes).sum() / (n * incomes.sum())
-
-def plot_lorenz_curve(df, team_name="All Teams"):
-    """繪製羅倫茲曲線"""
-    incomes = np.sort(df['Salary_millions'].dropna().values)
-    incomes = incomes[incomes > 0]
-    if len(incomes) == 0: return go.Figure(), 0
-
-    # 計算累積比例
-    lorenz_curve = np.cumsum(incomes) / incomes.sum()
-    lorenz_curve = np.insert(lorenz_curve, 0, 0)
-    
-    # 理想平等線
-    x_axis = np.linspace(0, 1, len(lorenz_curve))
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=x_axis, y=lorenz_curve,
-        mode='lines', name='實際分配',
-        fill='tozeroy', fillcolor='rgba(26, 35, 126, 0.2)',
-        line=dict(color='#1a237e', width=2)
-    ))
-    fig.add_trace(go.Scatter(
-        x=[0, 1], y=[0, 1],
-        mode='lines', name='完全平等線',
-        line=dict(dash='dash', color='#ef5350')
-    ))
-    
-    gini = calculate_gini(df['Salary_millions'])
-    
-    fig.update_layout(
-        title=f'{team_name} 薪資不平等分析 (Gini: {gini:.3f})',
-        xaxis_title='球員累積百分比',
-        yaxis_title='薪資累積百分比',
-        height=400,
-        margin=dict(l=20, r=20, t=40, b=20)
-    )
-    return fig, gini
-
-def analyze_positional_arbitrage(df):
-    """位置套利分析"""
-    if 'Position' not in df.columns or 'WAR' not in df.columns:
-        return None
-        
-    # 計算各位置平均數據
-    pos_stats = df.groupby('Position').agg({
-        'Salary_millions': 'mean',
-        'WAR': 'mean',
-        'Name': 'count'
-    }).reset_index()
-    
-    # 過濾樣本過少的位置
-    pos_stats = pos_stats[pos_stats['Name'] >= 5]
-    
-    # 計算每1 WAR的成本 (Cost per WAR)
-    pos_stats['Cost_per_WAR'] = pos_stats['Salary_millions'] / pos_stats['WAR']
-    pos_stats = pos_stats.sort_values('Cost_per_WAR')
-    
-    return pos_stats
+def calculate_league_percentiles(df, player_names, metrics):
+    """批次計算多位球員在全聯盟的百分位數 (與 stats.percentileofscore 的 rank 定義相同)"""
+    # 同名球員取第一筆資料
+    players = df.drop_duplicates(subset='Name').set_index('Name').reindex(player_names)
+    percentiles = np.zeros((len(player_names), len(metrics)))
+    
+    for j, metric in enumerate(metrics):
+        if metric not in df.columns or not pd.api.types.is_numeric_dtype(df[metric]):
+            continue
+        
+        # 每個指標只排序一次，再以二分搜尋一次查出所有球員的位置
+        league = np.sort(df[metric].dropna().values.astype(float))
+        scores = players[metric].values.astype(float)
+        
+        if len(league) == 0:
+            percentiles[:, j] = np.nan
+            continue
+        
+        left = np.searchsorted(league, scores, side='left')
+        right = np.searchsorted(league, scores, side='right')
+        values = (left + right + (right > left)) * (50.0 / len(league))
+        percentiles[:, j] = np.where(np.isnan(scores), np.nan, values)
+    
+    return percentiles
 
 def plot_player_radar(df, player_names):
     """繪製球員雷達比較圖 (使用百分位數)"""
@@ -647,27 +395,17 @@ def plot_player_radar(df, player_names):
         metrics.append('RAV')
         labels.append('RAV')
     
+    # 為了讓雷達圖好看，我們計算球員在全聯盟的百分位數 (所有球員一次查詢)
+    percentiles = calculate_league_percentiles(df, player_names, metrics)
+    
+    # 封閉雷達圖
+    plot_labels = labels + [labels[0]]
+    
     fig = go.Figure()
     
-    for name in player_names:
-        player_data = df[df['Name'] == name].iloc[0]
-        
-        # 為了讓雷達圖好看，我們計算該球員在全聯盟的百分位數
-        values = []
-        for metric in metrics:
-            if metric in df.columns:
-                try:
-                    # 計算百分位數 (0-100)
-                    percentile = stats.percentileofscore(df[metric].dropna(), player_data[metric])
-                    values.append(percentile)
-                except:
-                    values.append(0)
-            else:
-                values.append(0)
-        
-        # 封閉雷達圖
+    for name, values in zip(player_names, percentiles):
+        values = values.tolist()
         values.append(values[0])
-        plot_labels = labels + [labels[0]]
         
         fig.add_trace(go.Scatterpolar(
             r=values,
@@ -685,58 +423,50 @@ def plot_player_radar(df, player_names):
     )
     return fig
 
-def plot_tpm_matrix(df):
-    """繪製雙因子績效矩陣 (TPM)"""
-    if 'war_percentile' not in df.columns or 'value_ratio' not in df.columns:
-        return None, None
-    
-    # 計算性價比百分位
-    df_temp = df.copy()
-    df_temp['value_percentile'] = df_temp['value_ratio'].rank(pct=True) * 100
-    
-    # 定義象限 - 使用布林遮罩來避免 dtype 問題
-    mask_star = (df_temp['war_percentile'] >= 50) & (df_temp['value_percentile'] >= 50)
-    mask_premium = (df_temp['war_percentile'] >= 50) & (df_temp['value_percentile'] < 50)
-    mask_rookie = (df_temp['war_percentile'] < 50) & (df_temp['value_percentile'] >= 50)
-    mask_deadweight = (df_temp['war_percentile'] < 50) & (df_temp['value_percentile'] < 50)
-    
-    # 使用 loc 和布林遮罩來賦值
-    df_temp['TPM_category'] = '未分類'
-    df_temp.loc[mask_star, 'TPM_category'] = '明星價值'
-    df_temp.loc[mask_premium, 'TPM_category'] = '溢價球星'
-    df_temp.loc[mask_rookie, 'TPM_category'] = '潛力新秀'
-    df_temp.loc[mask_deadweight, 'TPM_category'] = '球隊冗員'
-    
-    # 創建散點圖
-    fig = px.scatter(
-        df_temp,
-        x='war_percentile',
-        y='value_percentile',
-        color='TPM_category',
-        hover_name='Name' if 'Name' in df_temp.columns else None,
-        hover_data=['Team', 'Position', 'WAR', 'Salary_millions'],
-        title='雙因子績效矩陣 (TPM)',
-        labels={'war_percentile': 'WAR百分位 (%)', 'value_percentile': '性價比百分位 (%)'},
-        color_discrete_map={
-            '明星價值': '#2E7D32',  # 綠色
-            '溢價球星': '#C62828',  # 紅色
-            '潛力新秀': '#FF8F00',  # 橙色
-            '球隊冗員': '#757575',   # 灰色
-            '未分類': '#000000'      # 黑色
-        }
-    )
+def plot_player_comparison_bars(compare_df):
+    """繪製球員 WAR 與薪資比較圖 (每個指標一條 trace，涵蓋所有選取的球員)"""
+    compare_df_sorted = compare_df.sort_values('WAR', ascending=False)
+    player_names = compare_df_sorted['Name'].tolist()
     
-    # 添加象限分隔線
-    fig.add_hline(y=50, line_dash="dash", line_color="black", opacity=0.5)
-    fig.add_vline(x=50, line_dash="dash", line_color="black", opacity=0.5)
+    fig = go.Figure()
+    
+    # WAR 柱子（每位球員群組的左側）
+    fig.add_trace(go.Bar(
+        name='WAR',
+        x=player_names,
+        y=compare_df_sorted['WAR'],
+        marker_color='#1f77b4',
+        offsetgroup=0,  # 第一個群組
+    ))
+    
+    # 薪資柱子（每位球員群組的右側）
+    fig.add_trace(go.Bar(
+        name='薪資 (M)',
+        x=player_names,
+        y=compare_df_sorted['Salary_millions'],
+        marker_color='#2ca02c',
+        offsetgroup=1,  # 第二個群組
+    ))
     
+    # 更新版面配置
     fig.update_layout(
-        xaxis_range=[0, 100],
-        yaxis_range=[0, 100],
-        height=600
+        title='球員WAR與薪資比較',
+        xaxis_title='球員',
+        yaxis_title='數值',
+        barmode='group',  # 群組模式
+        bargap=0.3,  # 群組間的間距
+        bargroupgap=0.1,  # 群組內柱子間距
+        height=500,
+        xaxis_tickangle=-45,  # 旋轉標籤避免重疊
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
     )
-    
-    return fig, df_temp
+    return fig
 
 # ============================================================
 # 側邊欄控制面板
@@ -748,7 +478,7 @@ with st.sidebar:
     st.markdown("### 選擇分析功能")
     analysis_mode = st.selectbox(
         "選擇要進行的分析",
-        ["綜合儀表板", "球員搜尋", "球隊分析", "市場異常偵測", "進階策略分析", "原創財務指標", "公式與變數說明"],
+        ANALYSIS_MODES,
         key="analysis_mode"
     )
     
@@ -768,12 +498,33 @@ with st.sidebar:
 # ============================================================
 
 # 載入數據
-df = load_data()
+with span('load_data'), telemetry.load_data_call():
+    df = load_data()
 
 if df is None:
     st.warning("正在載入數據...")
     st.stop()
 
+dataset_version = get_dataset_version(df)
+figure_cache = get_figure_cache()
+group_executor = get_group_executor()
+# 資料載入後立即在背景計算各分析頁耗時的衍生結果（每個資料集版本只排程一次）
+precompute = get_precompute_scheduler()
+schedule_dataset(precompute, dataset_version, df, figure_cache)
+telemetry.watch_precompute('dashboard', precompute)
+telemetry.record_dataset(df)
+telemetry.watch_figure_cache('figures', figure_cache)
+filter_index = get_filter_index(dataset_version, df)
+summary_cube = get_summary_cube(dataset_version, df)
+
+# 每個分析模式的執行區段（到頁尾前結束）
+instrumentation.annotate_run(mode=analysis_mode)
+if PROFILE_ENABLED:
+    st.session_state['_profiler'].annotate(mode=analysis_mode)
+if COPY_TRACK_ENABLED:
+    st.session_state['_copy_tracker'].annotate(mode=analysis_mode)
+mode_span = span(f"mode:{analysis_mode}")
+
 # 根據選擇的模組顯示不同內容
 if analysis_mode == "綜合儀表板":
     st.markdown('<h2 class="section-title">綜合分析儀表板</h2>', unsafe_allow_html=True)
@@ -812,18 +563,30 @@ if analysis_mode == "綜合儀表板":
             salary_min, salary_max = float(df['Salary_millions'].min()), float(df['Salary_millions'].max())
             salary_range = st.slider("薪資範圍 (百萬美元)", salary_min, salary_max, (salary_min, salary_max))
     
-    # 應用篩選
-    filtered_df = df.copy()
-    
-    if 'Team' in df.columns and selected_team != "所有球隊":
-        filtered_df = filtered_df[filtered_df['Team'] == selected_team]
+    # 應用篩選（透過篩選索引取得列編號，不建立完整遮罩也不複製整份資料）
+    filter_ranges = {}
     
     if 'WAR' in df.columns:
-        filtered_df = filtered_df[(filtered_df['WAR'] >= war_range[0]) & (filtered_df['WAR'] <= war_range[1])]
+        filter_ranges['WAR'] = war_range
     
     if 'Salary_millions' in df.columns:
-        filtered_df = filtered_df[(filtered_df['Salary_millions'] >= salary_range[0]) & 
-                                 (filtered_df['Salary_millions'] <= salary_range[1])]
+        filter_ranges['Salary_millions'] = salary_range
+    
+    filter_team = selected_team if 'Team' in df.columns and selected_team != "所有球隊" else None
+    filtered_df = filter_index.select(df, ranges=filter_ranges, team=filter_team)
+    
+    # 篩選狀態（作為圖表快取鍵值的一部分）
+    filter_params = {
+        'team': selected_team if 'Team' in df.columns else None,
+        'war_range': war_range if 'WAR' in df.columns else None,
+        'salary_range': salary_range if 'Salary_millions' in df.columns else None,
+    }
+    
+    # 關鍵指標：只有球隊篩選時由摘要立方體彙總（與資料量無關），WAR/薪資範圍縮小時才由篩選後的資料列計算
+    if filter_index.restricts(filter_ranges):
+        kpis = row_kpis(filtered_df)
+    else:
+        kpis = summary_cube.kpis({'Team': filter_team})
     
     # 關鍵指標卡片
     st.markdown("### 關鍵績效指標")
@@ -832,26 +595,26 @@ if analysis_mode == "綜合儀表板":
     
     with col1:
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("球員總數", f"{len(filtered_df):,}")
+        st.metric("球員總數", f"{kpis['rows']:,}")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         if 'Salary_millions' in filtered_df.columns:
-            avg_salary = filtered_df['Salary_millions'].mean()
+            avg_salary = kpis['mean_Salary_millions']
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.metric("平均薪資", f"${avg_salary:.2f}M")
             st.markdown('</div>', unsafe_allow_html=True)
     
     with col3:
         if 'WAR' in filtered_df.columns:
-            avg_war = filtered_df['WAR'].mean()
+            avg_war = kpis['mean_WAR']
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.metric("平均WAR", f"{avg_war:.2f}")
             st.markdown('</div>', unsafe_allow_html=True)
     
     with col4:
         if 'WAR' in filtered_df.columns and 'Salary_millions' in filtered_df.columns:
-            correlation = filtered_df['WAR'].corr(filtered_df['Salary_millions'])
+            correlation = kpis['correlation']
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.metric("相關係數", f"{correlation:.3f}")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -905,25 +668,31 @@ if analysis_mode == "綜合儀表板":
         
         with col1:
             if 'Salary_millions' in filtered_df.columns:
-                fig1 = px.histogram(
-                    filtered_df,
-                    x='Salary_millions',
-                    nbins=30,
-                    title='薪資分布',
-                    labels={'Salary_millions': '薪資 (百萬美元)'},
-                    marginal="box"
+                fig1 = figure_cache.get_or_build(
+                    dataset_version, 'salary_histogram', filter_params,
+                    lambda: px.histogram(
+                        filtered_df,
+                        x='Salary_millions',
+                        nbins=30,
+                        title='薪資分布',
+                        labels={'Salary_millions': '薪資 (百萬美元)'},
+                        marginal="box"
+                    )
                 )
                 st.plotly_chart(fig1, use_container_width=True)  # 保留原始參數
         
         with col2:
             if 'WAR' in filtered_df.columns:
-                fig2 = px.histogram(
-                    filtered_df,
-                    x='WAR',
-                    nbins=30,
-                    title='WAR分布',
-                    labels={'WAR': '勝場貢獻值'},
-                    marginal="violin"
+                fig2 = figure_cache.get_or_build(
+                    dataset_version, 'war_histogram', filter_params,
+                    lambda: px.histogram(
+                        filtered_df,
+                        x='WAR',
+                        nbins=30,
+                        title='WAR分布',
+                        labels={'WAR': '勝場貢獻值'},
+                        marginal="violin"
+                    )
                 )
                 st.plotly_chart(fig2, use_container_width=True)  # 保留原始參數
     
@@ -959,17 +728,17 @@ if analysis_mode == "綜合儀表板":
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                avg_wvpi = filtered_df['WVPI'].mean()
+                avg_wvpi = kpis['mean_WVPI']
                 st.metric("平均 WVPI", f"{avg_wvpi:.2f}")
                 st.caption("加權綜合價值指數")
             
             with col2:
-                avg_rav = filtered_df['RAV'].mean()
+                avg_rav = kpis['mean_RAV']
                 st.metric("平均 RAV", f"{avg_rav:.2f}")
                 st.caption("風險調整後價值")
             
             with col3:
-                avg_meri = filtered_df['MERI'].mean()
+                avg_meri = kpis['mean_MERI']
                 st.metric("平均 MERI", f"{avg_meri:.4f}")
                 st.caption("市場效率殘差指數")
             
@@ -982,6 +751,41 @@ if analysis_mode == "綜合儀表板":
                 color='WVPI_category' if 'WVPI_category' in filtered_df.columns else None
             )
             st.plotly_chart(fig_wvpi, use_container_width=True)  # 保留原始參數
+        
+        # 顯著性檢定：在「薪資與表現無關」的虛無假設下重排薪資，檢驗上述市場效率結論是否異於隨機
+        if 'WAR' in filtered_df.columns and 'Salary_millions' in filtered_df.columns:
+            st.markdown("#### 顯著性檢定（置換檢定與拔靴信賴區間）")
+            perm_col1, perm_col2 = st.columns(2)
+            with perm_col1:
+                n_permutations = st.select_slider("置換次數", options=[1000, 2000, 5000, 10000], value=2000)
+            with perm_col2:
+                n_bootstrap = st.select_slider("拔靴次數（0 = 不計算信賴區間）", options=[0, 500, 1000, 2000], value=1000)
+            
+            permutation_key = (dataset_version, filter_params, n_permutations, n_bootstrap)
+            if st.button("執行置換檢定"):
+                with st.spinner("正在重排薪資並計算虛無分布..."):
+                    st.session_state['_permutation_test'] = (permutation_key, permutation_test(
+                        filtered_df, n_permutations, n_bootstrap, executor=get_group_executor()))
+            permutation_state = st.session_state.get('_permutation_test')
+            if permutation_state is not None and permutation_state[0] == permutation_key:
+                perm_result = permutation_state[1]
+                perm_table = summary_table(perm_result)
+                st.dataframe(perm_table.style.format(
+                    {col: "{:.4f}" for col in perm_table.columns if col not in ('統計量', '對立假設')}
+                ), use_container_width=True, hide_index=True)
+                
+                fig_null = px.histogram(x=perm_result['null']['correlation'], nbins=50,
+                                        title='虛無分布：重排薪資後的 WAR 與薪資相關係數',
+                                        labels={'x': '相關係數'})
+                fig_null.add_vline(x=perm_result['observed']['correlation'], line_dash="dash", line_color="red",
+                                   annotation_text="觀察值")
+                st.plotly_chart(fig_null, use_container_width=True)
+                
+                timing = perm_result['timing']
+                st.caption(f"{perm_result['n']:,} 位球員，{perm_result['n_permutations']:,} 次置換 + "
+                           f"{perm_result['n_bootstrap']:,} 次拔靴，{perm_result['blocks']} 個區塊 / "
+                           f"{perm_result['workers']} 個行程，耗時 {timing['total']:.2f} 秒；"
+                           f"p 值 < 0.05 表示該結論不太可能只是隨機造成")
     
     # 數據表格
     st.markdown("### 詳細數據表格")
@@ -1026,11 +830,49 @@ if analysis_mode == "綜合儀表板":
         mime="text/csv"
     )
 
+    # Excel 完整分析報表：按下按鈕才產生（write-only 串流寫入），結果保留到資料集版本改變
+    if st.button("產生 Excel 完整分析報表（全部球員）"):
+        with st.spinner("正在產生 Excel 報表..."):
+            buffer = io.BytesIO()
+            write_workbook(df, buffer)
+        st.session_state['_excel_export'] = (dataset_version, buffer.getvalue())
+    excel_export = st.session_state.get('_excel_export')
+    if excel_export is not None and excel_export[0] == dataset_version:
+        st.download_button(
+            label="下載 Excel 報表（球員、球隊PSI、位置套利、市場異常、OLS回歸）",
+            data=excel_export[1],
+            file_name=f"mlb_analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+            mime=XLSX_MIME
+        )
+
+    # 欄式匯出（Parquet / Arrow IPC）：篩選後的球員與衍生表，由共用的 Arrow 資料表依篩選結果取出
+    export_col1, export_col2 = st.columns([1, 2])
+    with export_col1:
+        columnar_format = st.selectbox("欄式匯出格式", list(COLUMNAR_FORMATS),
+                                       format_func=lambda f: {'parquet': 'Parquet', 'arrow': 'Arrow IPC (檔案)',
+                                                              'arrows': 'Arrow IPC (串流)'}[f])
+    with export_col2:
+        st.write("")
+        if st.button("產生欄式匯出（篩選後的球員與衍生表）"):
+            with st.spinner("正在產生欄式匯出..."):
+                row_ids = filter_index.query(ranges=filter_ranges, team=filter_team)
+                data = bundle_bytes(export_tables(get_columnar_dataset(dataset_version, df), row_ids),
+                                    fmt=columnar_format)
+            st.session_state['_columnar_export'] = (dataset_version, filter_params, columnar_format, data)
+    columnar_export = st.session_state.get('_columnar_export')
+    if columnar_export is not None and columnar_export[:3] == (dataset_version, filter_params, columnar_format):
+        st.download_button(
+            label=f"下載 {columnar_format} 匯出 (zip)",
+            data=columnar_export[3],
+            file_name=f"mlb_export_{datetime.now().strftime('%Y%m%d_%H%M')}_{columnar_format}.zip",
+            mime="application/zip"
+        )
+
 elif analysis_mode == "球員搜尋":
     st.markdown('<h2 class="section-title">球員搜尋與比較</h2>', unsafe_allow_html=True)
     
     with st.expander("使用說明", expanded=True):
-        st.markdown("""
+        st.markdown(f"""
         ### 功能介紹
         1. **球員搜尋**：輸入球員姓名（支援部分關鍵字）
         2. **球員比較**：選擇多位球員進行詳細比較
@@ -1038,7 +880,7 @@ elif analysis_mode == "球員搜尋":
         
         ### 使用技巧
         - 搜尋時可以使用姓氏或名字的任何部分
-        - 最多可同時比較5位球員
+        - 最多可同時比較{MAX_COMPARE_PLAYERS}位球員
         - 所有數據皆可排序和篩選
         """)
     
@@ -1100,8 +942,8 @@ elif analysis_mode == "球員搜尋":
             selected_players = st.multiselect(
                 "選擇要比較的球員",
                 player_options,
-                max_selections=5,
-                help="可選擇最多5位球員進行詳細比較"
+                max_selections=MAX_COMPARE_PLAYERS,
+                help=f"可選擇最多{MAX_COMPARE_PLAYERS}位球員進行詳細比較"
             )
             
             if len(selected_players) >= 1:
@@ -1130,56 +972,10 @@ elif analysis_mode == "球員搜尋":
                         if fig_radar:
                             st.plotly_chart(fig_radar, use_container_width=True)
                     
-                        # 修改後的柱狀圖 - 每個球員兩根獨立柱子
+                        # 柱狀圖 - 每個球員兩根獨立柱子
                         st.markdown("**數值直接比較 (薪資 vs WAR)**")
                         
-                        # 準備數據
-                        compare_df_sorted = compare_df.sort_values('WAR', ascending=False)
-                        player_names = compare_df_sorted['Name'].tolist()
-                        
-                        # 創建圖表
-                        fig = go.Figure()
-                        
-                        # 為每個球員添加兩根柱子
-                        for i, player in enumerate(player_names):
-                            player_data = compare_df_sorted[compare_df_sorted['Name'] == player].iloc[0]
-                            
-                            fig.add_trace(go.Bar(
-                                name='WAR',
-                                x=player_names,  # 只用球員姓名
-                                y=compare_df_sorted['WAR'],
-                                marker_color='#1f77b4',
-                                offsetgroup=0,  # 第一個群組
-                            ))
-                            
-                            # 薪資柱子（整個群組的右側）
-                            fig.add_trace(go.Bar(
-                                name='薪資 (M)',
-                                x=player_names,  # 同一個 x 軸
-                                y=compare_df_sorted['Salary_millions'],
-                                marker_color='#2ca02c',
-                                offsetgroup=1,  # 第二個群組
-                            ))
-                        
-                        # 更新版面配置
-                        fig.update_layout(
-                            title='球員WAR與薪資比較',
-                            xaxis_title='球員',
-                            yaxis_title='數值',
-                            barmode='group',  # 群組模式
-                            bargap=0.3,  # 群組間的間距
-                            bargroupgap=0.1,  # 群組內柱子間距
-                            height=500,
-                            xaxis_tickangle=-45,  # 旋轉標籤避免重疊
-                            legend=dict(
-                                orientation="h",
-                                yanchor="bottom",
-                                y=1.02,
-                                xanchor="right",
-                                x=1
-                            )
-                        )
-                        
+                        fig = plot_player_comparison_bars(compare_df)
                         st.plotly_chart(fig, use_container_width=True)
 
 elif analysis_mode == "球隊分析":
@@ -1224,12 +1020,12 @@ elif analysis_mode == "球隊分析":
             team_df = df[df['Team'].isin(selected_teams)]
             
             if analysis_type == "效率排名":
-                # 計算球隊統計
-                team_stats = team_df.groupby('Team').agg({
+                # 計算球隊統計（由摘要立方體的彙總格分組加總）
+                team_stats = summary_cube.group_table('Team', {
                     'Name': 'count',
                     'WAR': 'sum',
                     'Salary_millions': 'sum',
-                }).round(2).reset_index()
+                }, where={'Team': selected_teams}).round(2)
                 
                 team_stats['efficiency'] = (team_stats['WAR'] / team_stats['Salary_millions']).round(3)
                 team_stats = team_stats.rename(columns={
@@ -1282,9 +1078,17 @@ elif analysis_mode == "球隊分析":
                 st.markdown("#### 球隊詳細統計")
                 
                 if 'Team' in team_df.columns:
+                    # 各球隊的摘要指標一次以分組執行器計算
+                    team_summaries = {}
+                    if 'WAR' in team_df.columns and 'Salary_millions' in team_df.columns:
+                        team_summaries = team_report(
+                            team_df, keys=selected_teams, league_df=df, executor=group_executor
+                        ).set_index('Team').to_dict('index')
+                    
                     # 為每支球隊創建詳細統計
                     for team in selected_teams:
                         team_players = team_df[team_df['Team'] == team]
+                        team_summary = team_summaries.get(team)
                         
                         if len(team_players) > 0:
                             with st.expander(f"{team} - {len(team_players)}位球員", expanded=False):
@@ -1292,15 +1096,24 @@ elif analysis_mode == "球隊分析":
                                 col_a, col_b, col_c, col_d = st.columns(4)
                                 
                                 with col_a:
-                                    total_war = team_players['WAR'].sum() if 'WAR' in team_players.columns else 0
+                                    if team_summary:
+                                        total_war = team_summary['總WAR']
+                                    else:
+                                        total_war = team_players['WAR'].sum() if 'WAR' in team_players.columns else 0
                                     st.metric("總WAR", f"{total_war:.2f}")
                                 
                                 with col_b:
-                                    total_salary = team_players['Salary_millions'].sum() if 'Salary_millions' in team_players.columns else 0
+                                    if team_summary:
+                                        total_salary = team_summary['總薪資(M)']
+                                    else:
+                                        total_salary = team_players['Salary_millions'].sum() if 'Salary_millions' in team_players.columns else 0
                                     st.metric("總薪資", f"${total_salary:.2f}M")
                                 
                                 with col_c:
-                                    avg_salary = team_players['Salary_millions'].mean() if 'Salary_millions' in team_players.columns else 0
+                                    if team_summary:
+                                        avg_salary = team_summary['平均薪資']
+                                    else:
+                                        avg_salary = team_players['Salary_millions'].mean() if 'Salary_millions' in team_players.columns else 0
                                     st.metric("平均薪資", f"${avg_salary:.2f}M")
                                 
                                 with col_d:
@@ -1530,6 +1343,11 @@ elif analysis_mode == "球隊分析":
             elif analysis_type == "薪資不平等分析":
                 st.markdown("#### 球隊薪資結構與不平等 (Gini Coefficient)")
                 
+                # 各球隊的基尼係數一次以分組執行器計算
+                team_gini = team_report(
+                    team_df, keys=selected_teams, league_df=df, executor=group_executor
+                ).set_index('Team')['Gini']
+                
                 for team in selected_teams:
                     team_data = team_df[team_df['Team'] == team]
                     
@@ -1538,7 +1356,11 @@ elif analysis_mode == "球隊分析":
                         
                         with col1:
                             # 羅倫茲曲線與 Gini
-                            fig_lorenz, gini = plot_lorenz_curve(team_data, team)
+                            gini = team_gini.get(team, 0)
+                            fig_lorenz = figure_cache.get_or_build(
+                                dataset_version, 'lorenz_curve', {'team': team},
+                                lambda: plot_lorenz_curve(team_data, team)[0]
+                            )
                             st.plotly_chart(fig_lorenz, use_container_width=True)  # 保留原始參數
                             
                             # Gini 解讀
@@ -1571,32 +1393,11 @@ elif analysis_mode == "球隊分析":
                 - $\\sigma_{\\text{WAR}}^{\\text{team}}$：球隊內部球員WAR的標準差（衡量風險）
                 """)
                 
-                # 計算聯盟平均效率
-                league_efficiency = df['WAR'].sum() / df['Salary_millions'].sum()
-                
-                # 計算每支球隊的PSI
-                team_psi_list = []
-                for team in selected_teams:
-                    team_data = team_df[team_df['Team'] == team]
-                    
-                    if len(team_data) >= 3:  # 至少需要3個球員
-                        total_war = team_data['WAR'].sum()
-                        total_salary = team_data['Salary_millions'].sum()
-                        expected_war = total_salary * league_efficiency
-                        excess_war = total_war - expected_war
-                        team_risk = team_data['WAR'].std()
-                        
-                        psi = excess_war / team_risk if team_risk > 0 else 0
-                        
-                        team_psi_list.append({
-                            'Team': team,
-                            '總WAR': total_war,
-                            '總薪資(M)': total_salary,
-                            '預期WAR': expected_war,
-                            '超額WAR': excess_war,
-                            '球隊風險': team_risk,
-                            'PSI': psi
-                        })
+                # 計算每支球隊的PSI（聯盟平均效率以全聯盟資料計算；至少需要3個球員）
+                team_psi = team_report(team_df, keys=selected_teams, league_df=df, executor=group_executor)
+                team_psi_list = team_psi[team_psi['球員數'] >= 3][
+                    ['Team', '總WAR', '總薪資(M)', '預期WAR', '超額WAR', '球隊風險', 'PSI']
+                ].to_dict('records')
                 
                 if team_psi_list:
                     psi_df = pd.DataFrame(team_psi_list)
@@ -1615,15 +1416,7 @@ elif analysis_mode == "球隊分析":
                     
                     with col2:
                         # PSI分類 (依據 new_variables.md 5.6 節)
-                        conditions = [
-                            psi_df_sorted['PSI'] > 1.5,
-                            (psi_df_sorted['PSI'] > 0.5) & (psi_df_sorted['PSI'] <= 1.5),
-                            (psi_df_sorted['PSI'] > -0.5) & (psi_df_sorted['PSI'] <= 0.5),
-                            (psi_df_sorted['PSI'] > -1.5) & (psi_df_sorted['PSI'] <= -0.5),
-                            psi_df_sorted['PSI'] <= -1.5
-                        ]
-                        categories = ['卓越管理', '良好管理', '平庸管理', '效率不佳', '糟糕管理']
-                        psi_df_sorted['管理評價'] = np.select(conditions, categories, default='未知')
+                        psi_df_sorted['管理評價'] = classify_psi(psi_df_sorted['PSI'])
                         
                         st.dataframe(
                             psi_df_sorted[['Team', 'PSI', '管理評價']], 
@@ -1632,18 +1425,24 @@ elif analysis_mode == "球隊分析":
                         )
                     
                     # 可視化
-                    fig = px.bar(
-                        psi_df_sorted,
-                        x='Team',
-                        y='PSI',
-                        color='PSI',
-                        color_continuous_scale='RdYlGn',
-                        title='球隊投資組合夏普指數 (PSI) 排名',
-                        labels={'PSI': '投資組合夏普指數'}
+                    def build_psi_bar():
+                        fig = px.bar(
+                            psi_df_sorted,
+                            x='Team',
+                            y='PSI',
+                            color='PSI',
+                            color_continuous_scale='RdYlGn',
+                            title='球隊投資組合夏普指數 (PSI) 排名',
+                            labels={'PSI': '投資組合夏普指數'}
+                        )
+                        fig.add_hline(y=0, line_dash="dash", line_color="gray")
+                        fig.add_hline(y=0.5, line_dash="dash", line_color="green", opacity=0.3)
+                        fig.add_hline(y=-0.5, line_dash="dash", line_color="red", opacity=0.3)
+                        return fig
+                    
+                    fig = figure_cache.get_or_build(
+                        dataset_version, 'team_psi_bar', {'teams': set(selected_teams)}, build_psi_bar
                     )
-                    fig.add_hline(y=0, line_dash="dash", line_color="gray")
-                    fig.add_hline(y=0.5, line_dash="dash", line_color="green", opacity=0.3)
-                    fig.add_hline(y=-0.5, line_dash="dash", line_color="red", opacity=0.3)
                     
                     st.plotly_chart(fig, use_container_width=True)  # 保留原始參數
                     
@@ -1681,32 +1480,18 @@ elif analysis_mode == "市場異常偵測":
         min_salary_threshold = 1.0  # 100萬美元以下視為底薪
         
         # 只使用薪資高於門檻的球員來建立回歸模型
-        df_model = df[df['Salary_millions'] > min_salary_threshold].dropna(subset=['WAR', 'Salary_millions']).copy()
+        df_model = salary_model_data(df, min_salary_threshold)
         
         if len(df_model) < 10:
             st.warning(f"⚠️ 薪資高於 ${min_salary_threshold}M 的球員樣本不足 ({len(df_model)} 位)，無法建立可靠的回歸模型")
             st.stop()
         
         # 計算預期薪資（使用高於底薪的球員建立模型）
-        X = df_model[['WAR']].values
-        y = df_model['Salary_millions'].values
+        slope, intercept, residuals = calculate_salary_residuals(df, df_model)
         
-        A = np.vstack([X.flatten(), np.ones(len(X))]).T
-        slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
-        
-        # 為所有球員計算預期薪資
-        df_clean = df.dropna(subset=['WAR', 'Salary_millions']).copy()
-        df_clean['expected_salary'] = slope * df_clean['WAR'] + intercept
-        df_clean['salary_residual'] = df_clean['Salary_millions'] - df_clean['expected_salary']
-        df_clean['residual_percent'] = (df_clean['salary_residual'] / df_clean['expected_salary']) * 100
-        
-        # 合併回原 DataFrame
-        df = df.merge(
-            df_clean[['expected_salary', 'salary_residual', 'residual_percent']], 
-            left_index=True, 
-            right_index=True, 
-            how='left'
-        )
+        # 直接新增欄位：load_data 每次執行回傳的是快取的複本，不需再 merge 出整個 DataFrame 的新複本
+        for col in residuals.columns:
+            df[col] = residuals[col]
         
         # 閾值設定
         st.markdown("### 偵測設定")
@@ -1734,11 +1519,15 @@ elif analysis_mode == "市場異常偵測":
                 help="排除還在領底薪的年輕球員，避免制度性低估"
             )
         
-        # 篩選數據
-        analysis_df = df[df['WAR'] >= min_war].copy()
+        # 篩選數據（透過篩選索引，新增欄位後的 df 與索引的列順序相同）
+        analysis_ranges = {'WAR': (min_war, None)}
+        
+        if exclude_rookies:
+            analysis_ranges['Salary_millions'] = (min_salary_threshold, None)
+        
+        analysis_df = filter_index.select(df, ranges=analysis_ranges)
         
         if exclude_rookies:
-            analysis_df = analysis_df[analysis_df['Salary_millions'] >= min_salary_threshold]
             st.info(f"🔍 已排除底薪球員，分析 {len(analysis_df)} 位薪資高於 ${min_salary_threshold}M 的球員")
         
         # 確保需要的欄位存在且為數值型別
@@ -1747,8 +1536,7 @@ elif analysis_mode == "市場異常偵測":
                 analysis_df[col] = pd.to_numeric(analysis_df[col], errors='coerce')
         
         # 識別異常值
-        undervalued = analysis_df[analysis_df['residual_percent'] < -threshold].sort_values('residual_percent')
-        overvalued = analysis_df[analysis_df['residual_percent'] > threshold].sort_values('residual_percent', ascending=False)
+        undervalued, overvalued = split_salary_anomalies(analysis_df, threshold)
         
         # 顯示結果摘要
         st.markdown("### 偵測結果")
@@ -1912,14 +1700,17 @@ elif analysis_mode == "進階策略分析":
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                fig_pos = px.bar(
-                    pos_arbitrage,
-                    x='Position',
-                    y='Cost_per_WAR',
-                    color='Cost_per_WAR',
-                    title='各守備位置的購買成本 (每1 WAR價格)',
-                    labels={'Cost_per_WAR': '每單位WAR成本($M)', 'Position': '守備位置'},
-                    color_continuous_scale='RdYlGn_r' # 成本越低越綠
+                fig_pos = figure_cache.get_or_build(
+                    dataset_version, 'position_arbitrage_bar', None,
+                    lambda: px.bar(
+                        pos_arbitrage,
+                        x='Position',
+                        y='Cost_per_WAR',
+                        color='Cost_per_WAR',
+                        title='各守備位置的購買成本 (每1 WAR價格)',
+                        labels={'Cost_per_WAR': '每單位WAR成本($M)', 'Position': '守備位置'},
+                        color_continuous_scale='RdYlGn_r' # 成本越低越綠
+                    )
                 )
                 st.plotly_chart(fig_pos, use_container_width=True)  # 保留原始參數
                 
@@ -1983,6 +1774,8 @@ elif analysis_mode == "進階策略分析":
                         st.success(f"✅ 變數 **{x_col}** 對 **{y_col}** 有顯著影響 (P < 0.05)")
                     else:
                         st.warning(f"⚠️ 變數 **{x_col}** 對 **{y_col}** 的影響不顯著 (P >= 0.05)")
+                else:
+                    st.warning("手動回歸計算錯誤")
             else:
                 st.error("樣本數不足，無法進行回歸分析")
 
@@ -2019,27 +1812,15 @@ elif analysis_mode == "原創財務指標":
             """)
             
             # --- 提前計算 PCA 客觀權重與分數 ---
-            from sklearn.decomposition import PCA
-            from sklearn.preprocessing import StandardScaler
-            
-            comp_cols = ['WAR_norm', 'VR_norm', 'P_WAR', 'P_Salary_inv']
+            comp_cols = WVPI_COMPONENTS
             comp_names = ['絕對表現(WAR)', '效率(VR)', '相對表現(P_WAR)', '相對成本(P_Salary)']
             
-            if all(col in df.columns for col in comp_cols):
-                # 用乾淨的資料訓練 PCA
+            pca_weights, correlation = precompute.get(
+                dataset_version, 'wvpi_pca', lambda: calculate_wvpi_pca_weights(df)
+            )
+            if pca_weights is not None:
                 df_valid = df.dropna(subset=comp_cols + ['Name', 'Team']).copy()
-                data = df_valid[comp_cols]
-                
-                scaler = StandardScaler()
-                scaled_data = scaler.fit_transform(data)
-                
-                pca = PCA()
-                pca.fit(scaled_data)
-                
-                loadings = np.abs(pca.components_[0])
-                pca_weights = loadings / np.sum(loadings)
-                original_weights = np.array([0.35, 0.30, 0.20, 0.15])
-                correlation = np.corrcoef(original_weights, pca_weights)[0, 1]
+                original_weights = WVPI_WEIGHTS
                 
                 # 計算全聯盟的 PCA 客觀分數
                 df['WVPI_PCA'] = (
@@ -2211,14 +1992,19 @@ elif analysis_mode == "原創財務指標":
             | Q4 | < 50 | < 50 | 球隊冗員 |
             """)
             
-            # 繪製 TPM 矩陣
-            tpm_fig, tpm_df = plot_tpm_matrix(df)
-            if tpm_fig is not None:
+            # 繪製 TPM 矩陣（背景預先計算的圖表存於圖表快取）
+            tpm_category_counts = precompute.get(
+                dataset_version, 'tpm', lambda: tpm_counts(df, dataset_version, figure_cache)
+            )
+            if tpm_category_counts is not None:
+                tpm_fig = figure_cache.get_or_build(
+                    dataset_version, 'tpm_matrix', None, lambda: plot_tpm_matrix(df)[0]
+                )
                 st.plotly_chart(tpm_fig, use_container_width=True)  # 保留原始參數
                 
                 # 顯示各象限統計
                 st.markdown("#### 各象限球員分佈")
-                quadrant_counts = tpm_df['TPM_category'].value_counts().reset_index()
+                quadrant_counts = tpm_category_counts.reset_index()
                 quadrant_counts.columns = ['類別', '人數']
                 
                 col1, col2, col3, col4 = st.columns(4)
@@ -2246,26 +2032,11 @@ elif analysis_mode == "原創財務指標":
             其中 $\\bar{e}_{\\text{league}}$ 為聯盟平均效率，$\\sigma_{\\text{WAR}}^{\\text{team}}$ 為球隊內部風險。
             """)
             
-            # 計算聯盟平均效率
-            league_efficiency = df['WAR'].sum() / df['Salary_millions'].sum()
-            
             # 計算各球隊 PSI
-            team_psi_data = []
-            for team in df['Team'].unique():
-                team_data = df[df['Team'] == team]
-                if len(team_data) >= 3:
-                    psi = calculate_team_psi(team_data, league_efficiency)
-                    team_psi_data.append({
-                        'Team': team,
-                        'PSI': psi,
-                        '總WAR': team_data['WAR'].sum(),
-                        '總薪資': team_data['Salary_millions'].sum(),
-                        '球員數': len(team_data)
-                    })
-            
-            if team_psi_data:
-                team_psi_df = pd.DataFrame(team_psi_data).sort_values('PSI', ascending=False)
-                
+            # 共用的預先計算結果不可修改，取複本後再新增欄位
+            team_psi_df = precompute.get(dataset_version, 'team_psi', lambda: calculate_all_team_psi(df)).copy()
+            
+            if not team_psi_df.empty:
                 col1, col2 = st.columns([1, 1])
                 
                 with col1:
@@ -2277,15 +2048,7 @@ elif analysis_mode == "原創財務指標":
                 
                 with col2:
                     # PSI 分類
-                    conditions = [
-                        team_psi_df['PSI'] > 1.5,
-                        (team_psi_df['PSI'] > 0.5) & (team_psi_df['PSI'] <= 1.5),
-                        (team_psi_df['PSI'] > -0.5) & (team_psi_df['PSI'] <= 0.5),
-                        (team_psi_df['PSI'] > -1.5) & (team_psi_df['PSI'] <= -0.5),
-                        team_psi_df['PSI'] <= -1.5
-                    ]
-                    categories = ['卓越管理', '良好管理', '平庸管理', '效率不佳', '糟糕管理']
-                    team_psi_df['管理評價'] = np.select(conditions, categories, default='未知')
+                    team_psi_df['管理評價'] = classify_psi(team_psi_df['PSI'])
                     
                     eval_counts = team_psi_df['管理評價'].value_counts()
                     fig = px.pie(
@@ -2297,16 +2060,20 @@ elif analysis_mode == "原創財務指標":
                     st.plotly_chart(fig, use_container_width=True)  # 保留原始參數
                 
                 # PSI 排名圖
-                fig = px.bar(
-                    team_psi_df,
-                    x='Team',
-                    y='PSI',
-                    color='PSI',
-                    color_continuous_scale='RdYlGn',
-                    title='各球隊 PSI 排名',
-                    labels={'PSI': '投資組合夏普指數'}
-                )
-                fig.add_hline(y=0, line_dash="dash", line_color="gray")
+                def build_league_psi_bar():
+                    fig = px.bar(
+                        team_psi_df,
+                        x='Team',
+                        y='PSI',
+                        color='PSI',
+                        color_continuous_scale='RdYlGn',
+                        title='各球隊 PSI 排名',
+                        labels={'PSI': '投資組合夏普指數'}
+                    )
+                    fig.add_hline(y=0, line_dash="dash", line_color="gray")
+                    return fig
+                
+                fig = figure_cache.get_or_build(dataset_version, 'league_psi_bar', None, build_league_psi_bar)
                 st.plotly_chart(fig, use_container_width=True)  # 保留原始參數
         
         with tab6:
@@ -2320,7 +2087,7 @@ elif analysis_mode == "原創財務指標":
             """)
             
             # 計算 SEI
-            correlation, gini, sei = calculate_sei(df)
+            correlation, gini, sei = precompute.get(dataset_version, 'sei', lambda: calculate_sei(df))
             
             col1, col2, col3 = st.columns(3)
             
@@ -2407,6 +2174,115 @@ elif analysis_mode == "原創財務指標":
             - **混亂市場 (左下)**: 表現與薪資無關，且分配極端
             """)
 
+# 背景工作：耗時的分析送入工作佇列，頁面只讀取進度與結果，不在重新執行中計算
+elif analysis_mode == "背景工作":
+    st.markdown('<h2 class="section-title">背景工作</h2>', unsafe_allow_html=True)
+    st.info("耗時的分析送入背景工作佇列執行，不會卡住頁面：送出後可以切換頁面或重新整理，進度與部分結果會持續更新；"
+            "相同資料與參數已完成的工作直接取用結果，不重新計算。")
+    
+    job_queue = get_job_queue()
+    job_kind = st.selectbox("分析", list(JOB_KINDS), format_func=lambda kind: JOB_KINDS[kind].label)
+    with st.form("job_form"):
+        if job_kind == 'permutation':
+            job_col1, job_col2, job_col3 = st.columns(3)
+            with job_col1:
+                job_permutations = st.select_slider("置換次數", options=[10000, 20000, 50000, 100000], value=10000)
+            with job_col2:
+                job_bootstrap = st.select_slider("拔靴次數（0 = 不計算信賴區間）", options=[0, 2000, 5000, 10000], value=2000)
+            with job_col3:
+                job_by_season = st.checkbox("各球季分別檢定", value=True)
+            job_params = {'n_permutations': job_permutations, 'n_bootstrap': job_bootstrap, 'by_season': job_by_season}
+        else:
+            st.caption("匯出全部球員與所有衍生表（球隊PSI、位置套利、市場異常、OLS 回歸），完成後提供下載")
+            job_params = {}
+        job_force = st.checkbox("忽略已完成的結果，重新計算", value=False)
+        job_submitted = st.form_submit_button("送出工作")
+    
+    if job_submitted:
+        job_id, job_created = job_queue.submit(job_kind, job_params, df.attrs['data_path'], force=job_force)
+        # 選取的工作記錄在網址參數中，重新整理後仍顯示同一項工作
+        st.query_params['job'] = str(job_id)
+        if job_created:
+            st.success(f"🚀 已送出工作 #{job_id}")
+        else:
+            st.success(f"✅ 已有相同條件的工作 #{job_id}，直接取用其結果")
+    
+    job_active = job_queue.has_active()
+    
+    # 有未結束的工作時定期重新執行此區塊（只更新工作清單與進度，不重新執行整頁）
+    @st.fragment(run_every=JOB_POLL_SECONDS if job_active else None)
+    def job_panel():
+        recent_jobs = job_queue.list_jobs()
+        if not recent_jobs:
+            st.caption("目前沒有背景工作")
+            return
+        
+        st.markdown("### 最近的工作")
+        jobs_df = pd.DataFrame([{
+            '編號': job['id'],
+            '分析': JOB_KINDS[job['kind']].label if job['kind'] in JOB_KINDS else job['kind'],
+            '狀態': JOB_STATES.get(job['state'], job['state']),
+            '進度': job['progress'] * 100,
+            '訊息': job['error'] or job['message'] or '',
+            '參數': job['params'],
+            '送出時間': datetime.fromtimestamp(job['created_at']).strftime('%m-%d %H:%M:%S'),
+            '耗時 (秒)': round((job['finished_at'] or time.time()) - job['started_at'], 1) if job['started_at'] else None,
+        } for job in recent_jobs])
+        st.dataframe(jobs_df, use_container_width=True, hide_index=True, column_config={
+            '進度': st.column_config.ProgressColumn('進度', min_value=0, max_value=100, format="%.0f%%"),
+        })
+        
+        job_ids = [job['id'] for job in recent_jobs]
+        requested_job = st.query_params.get('job', '')
+        default_job = int(requested_job) if requested_job.isdigit() and int(requested_job) in job_ids else job_ids[0]
+        selected_job = st.selectbox("檢視工作", job_ids, index=job_ids.index(default_job),
+                                    format_func=lambda job_id: f"#{job_id}")
+        st.query_params['job'] = str(selected_job)
+        job = job_queue.get(selected_job)
+        
+        st.progress(job['progress'], text=f"{JOB_STATES.get(job['state'], job['state'])}：{job['message'] or ''}")
+        if job['state'] in ACTIVE_STATES:
+            if job['cancel_requested'] or st.button("取消工作", key=f"cancel_job_{selected_job}"):
+                job_queue.cancel(selected_job)
+                st.caption("已要求取消，工作將在下一次回報進度時停止")
+            job_partial = job_queue.partial(selected_job)
+            if isinstance(job_partial, pd.DataFrame):
+                st.markdown("**部分結果**")
+                st.dataframe(job_partial.style.format(
+                    {col: "{:.4f}" for col in job_partial.select_dtypes('float').columns}
+                ), use_container_width=True, hide_index=True)
+        elif job['state'] == 'done':
+            job_result = job_queue.result(selected_job)
+            if isinstance(job_result, pd.DataFrame):
+                st.dataframe(job_result.style.format(
+                    {col: "{:.4f}" for col in job_result.select_dtypes('float').columns}
+                ), use_container_width=True, hide_index=True)
+                st.download_button(
+                    label="📥 下載結果 (CSV)",
+                    data=job_result.to_csv(index=False),
+                    file_name=f"mlb_job_{selected_job}.csv",
+                    mime="text/csv",
+                    key=f"download_job_{selected_job}"
+                )
+            elif isinstance(job_result, dict) and os.path.exists(job_result['path']):
+                st.caption("，".join(f"{name} {rows:,} 列" for name, rows in job_result['sheets'].items()))
+                with open(job_result['path'], 'rb') as f:
+                    st.download_button(
+                        label="📥 下載 Excel 報表",
+                        data=f.read(),
+                        file_name=job_result['file_name'],
+                        mime=job_result['mime'],
+                        key=f"download_job_{selected_job}"
+                    )
+        elif job['state'] == 'failed':
+            st.error(f"❌ 工作失敗：{job['error']}")
+        
+        # 所有工作都已結束：重新執行整頁，停止定期更新
+        if job_active and not job_queue.has_active():
+            st.rerun()
+    
+    job_panel()
+
 elif analysis_mode == "公式與變數說明":
     st.markdown('<h2 class="section-title">公式與變數說明</h2>', unsafe_allow_html=True)
     
@@ -2764,6 +2640,8 @@ elif analysis_mode == "公式與變數說明":
         """)
         st.markdown('</div>', unsafe_allow_html=True)
 
+mode_span.finish()
+
 # ============================================================
 # 頁尾
 # ============================================================
@@ -2776,11 +2654,123 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# ============================================================
+# 啟動時間報告
+# ============================================================
+mark_startup_complete()
 
+@st.cache_resource(show_spinner="量測啟動 import 時間...")
+def fresh_import_times():
+    """本腳本頂層 import 在新的直譯器中的載入時間（伺服器行程已載入這些模組，無法在腳本內計時）"""
+    return measure_fresh_imports(eager_modules(__file__))
 
+# 設定環境變數 MLB_STARTUP_REPORT=1 或網址參數 ?startup_report=1 時顯示
+if os.environ.get("MLB_STARTUP_REPORT") == "1" or st.query_params.get("startup_report") == "1":
+    report = startup_report(fresh_import_times())
+    check_import_budget(report['eager_seconds'])
+    
+    with st.sidebar.expander("⏱️ 啟動時間報告", expanded=False):
+        ready = report['ready_seconds']
+        st.metric("行程啟動至第一次渲染", f"{ready:.2f}s" if ready is not None else "N/A")
+        st.metric("啟動 import 時間", f"{report['eager_seconds']:.2f}s",
+                  delta=f"預算 {report['budget_seconds']:.2f}s", delta_color="off")
+        
+        if report['over_budget']:
+            st.warning("⚠️ 啟動 import 時間超過預算")
+        
+        import_rows = report['eager_imports'] + report['lazy_imports']
+        if import_rows:
+            import_df = pd.DataFrame(import_rows)[['module', 'seconds', 'lazy']]
+            import_df.columns = ['模組', '秒數', '延遲載入']
+            st.dataframe(import_df.round(3), use_container_width=True, hide_index=True)
 
+# ============================================================
+# 效能分析輸出
+# ============================================================
+if PROFILE_ENABLED:
+    active_profiler = st.session_state.pop('_profiler', None)
+    if active_profiler is not None:
+        collapsed_path, speedscope_path = active_profiler.stop().write(profiler.output_dir())
+        st.sidebar.caption(f"🔬 效能分析 ({active_profiler.n_samples} 個樣本): {speedscope_path}")
 
+# ============================================================
+# DataFrame 複本追蹤面板
+# ============================================================
+if COPY_TRACK_ENABLED:
+    active_tracker = copy_tracker.stop_tracking(st.session_state.pop('_copy_tracker', None))
+    if active_tracker is not None:
+        copy_totals = active_tracker.totals()
+        
+        # 累計本工作階段各分析模式複製的位元組
+        copy_mode_totals = st.session_state.setdefault('_copy_mode_totals', {})
+        totals = copy_mode_totals.setdefault(active_tracker.labels.get('mode', '?'), {'互動次數': 0, '新配置 (MB)': 0.0})
+        totals['互動次數'] += 1
+        totals['新配置 (MB)'] += copy_totals['new_bytes'] / 1024 / 1024
+        
+        with st.sidebar.expander("📦 DataFrame 複本", expanded=False):
+            st.metric(
+                "本次互動新配置",
+                f"{copy_totals['new_bytes'] / 1024 / 1024:.1f} MB",
+                help=f"{copy_totals['frames']} 個超過 {active_tracker.min_bytes // 1024} KB 的 DataFrame"
+            )
+            
+            locations = active_tracker.summary()
+            if locations:
+                copy_df = pd.DataFrame(locations)
+                copy_df['新配置 (MB)'] = copy_df['new_bytes'] / 1024 / 1024
+                copy_df['總計 (MB)'] = copy_df['bytes'] / 1024 / 1024
+                copy_df = copy_df.rename(columns={
+                    'location': '位置', 'code': '程式碼', 'frames': '次數',
+                    'mean_lifetime_ms': '平均存活 (ms)', 'alive_at_end': '仍存活'
+                })
+                st.dataframe(
+                    copy_df[['位置', '程式碼', '次數', '新配置 (MB)', '總計 (MB)', '平均存活 (ms)', '仍存活']].round(2),
+                    use_container_width=True, hide_index=True
+                )
+            
+            if len(copy_mode_totals) > 1:
+                st.markdown("**本工作階段各模式累計**")
+                copy_mode_df = pd.DataFrame.from_dict(copy_mode_totals, orient='index')
+                st.dataframe(copy_mode_df.sort_values('新配置 (MB)', ascending=False).round(2), use_container_width=True)
 
+# ============================================================
+# 效能量測面板
+# ============================================================
+if INSTRUMENT_ENABLED:
+    instrument_run = instrumentation.finish_run(run=st.session_state.pop('_instrument_run', None))
+    
+    # 累計本工作階段各分析模式的耗用時間（找出最耗 CPU 的頁面）
+    mode_totals = st.session_state.setdefault('_instrument_mode_totals', {})
+    for record in instrument_run.records if instrument_run is not None else []:
+        if record['name'].startswith('mode:'):
+            totals = mode_totals.setdefault(record['name'][len('mode:'):], {'執行次數': 0, '牆鐘 (ms)': 0.0, 'CPU (ms)': 0.0})
+            totals['執行次數'] += 1
+            totals['牆鐘 (ms)'] += record['wall_ms']
+            totals['CPU (ms)'] += record['cpu_ms']
+    
+    if INSTRUMENT_PANEL and instrument_run is not None:
+        with st.sidebar.expander("🔍 效能量測", expanded=False):
+            records = instrument_run.records
+            st.metric("本次執行 CPU 時間", f"{sum(r['cpu_ms'] for r in records if r['depth'] == 0):.0f} ms")
+            
+            if records:
+                span_df = pd.DataFrame(records).sort_values('seq')
+                span_df['區段'] = ['　' * depth + name for depth, name in zip(span_df['depth'], span_df['name'])]
+                span_df['記憶體峰值 (MB)'] = span_df['alloc_peak_bytes'].astype(float) / 1024 / 1024
+                span_df = span_df.rename(columns={'wall_ms': '牆鐘 (ms)', 'cpu_ms': 'CPU (ms)', 'status': '狀態'})
+                st.dataframe(
+                    span_df[['區段', '牆鐘 (ms)', 'CPU (ms)', '記憶體峰值 (MB)', '狀態']].round(2),
+                    use_container_width=True, hide_index=True
+                )
+            
+            if mode_totals:
+                st.markdown("**本工作階段各模式累計**")
+                mode_df = pd.DataFrame.from_dict(mode_totals, orient='index').sort_values('CPU (ms)', ascending=False)
+                st.dataframe(mode_df.round(1), use_container_width=True)
 
-
-
+# ============================================================
+# 執行指標
+# ============================================================
+_rerun_started = st.session_state.pop('_rerun_started', None)
+if _rerun_started is not None:
+    telemetry.observe_rerun(analysis_mode, time.perf_counter() - _rerun_started)
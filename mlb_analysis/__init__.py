@@ -0,0 +1,2 @@
+# mlb_analysis - MLB薪資表現分析的共用模組
+"""儀表板之外可重複使用的資料處理、快取與效能工具"""
@@ -0,0 +1,574 @@
+# api.py - 財務指標 HTTP/JSON API
+"""獨立的 ASGI 服務：啟動時載入並預處理資料集一次，以 JSON 提供球員指標 (WVPI/RAV/MERI)、球隊 PSI、
+SEI、羅倫茲曲線與基尼係數、OLS 回歸結果與市場異常名單，不需經過 Streamlit 的 rerun。
+
+- 篩選與分頁：以查詢參數篩選，limit/offset 分頁，回應附上 total 與 next_offset
+- ETag：回應內容只由資料集版本與請求決定；查詢參數通過驗證後，If-None-Match 相符時回 304
+- 非同步：計算在執行緒池中進行 (asyncio.to_thread)，事件迴圈持續處理其他請求；計算結果以依位元組大小淘汰的 LRU 快取保存
+
+有安裝 uvicorn 時以 uvicorn 執行，否則使用內建的 asyncio HTTP/1.1 伺服器（支援 keep-alive）。
+
+用法：
+    python -m mlb_analysis.api --port 8008
+    curl 'http://127.0.0.1:8008/players?team=NYY&sort=WVPI&limit=10'
+    curl 'http://127.0.0.1:8008/anomalies?kind=undervalued&threshold=30'
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import math
+import os
+import sys
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote, urlencode
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis.dataset import BUNDLED_DATA, REPO_ROOT, file_version
+from mlb_analysis.figure_cache import FigureCache
+from mlb_analysis.metrics import (
+    calculate_all_team_psi, calculate_gini, calculate_lorenz_curve, calculate_salary_residuals,
+    calculate_sei, classify_psi, manual_ols_regression, preprocess_data, salary_model_data,
+    split_salary_anomalies
+)
+
+logger = logging.getLogger(__name__)
+
+# 與儀表板相同的資料檔搜尋順序；環境變數 MLB_DATA_PATH 優先
+DATA_PATHS = [
+    os.path.join(REPO_ROOT, "data", "merged_performance_salary.csv"),
+    BUNDLED_DATA,
+    os.path.join(REPO_ROOT, "merged_performance_salary.csv"),
+]
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+CACHE_CONTROL = b"public, max-age=60"
+
+# 球員端點輸出的欄位（資料中沒有的欄位略過）
+PLAYER_FIELDS = [
+    'Name', 'Team', 'Position', 'Age', 'WAR', 'Salary_millions', 'value_ratio',
+    'WVPI', 'WVPI_category', 'RAV', 'RAV_category', 'MERI', 'MERI_category',
+]
+CATEGORY_FILTERS = {'position': 'Position', 'wvpi_category': 'WVPI_category',
+                    'rav_category': 'RAV_category', 'meri_category': 'MERI_category'}
+RANGE_FILTERS = {'war': 'WAR', 'salary': 'Salary_millions', 'wvpi': 'WVPI', 'rav': 'RAV', 'meri': 'MERI'}
+# 與儀表板「進階策略分析」相同的回歸變數
+REGRESSION_X = ['WAR', 'HR', 'RBI', 'ERA']
+REGRESSION_Y = ['Salary_millions', 'value_ratio']
+ANOMALY_FIELDS = ['Name', 'Team', 'Position', 'WAR', 'Salary_millions',
+                  'expected_salary', 'salary_residual', 'residual_percent']
+MIN_SALARY_THRESHOLD = 1.0  # 與市場異常偵測頁相同的底薪門檻
+
+
+class BadRequest(ValueError):
+    """查詢參數錯誤（回應 400）"""
+
+
+def find_data_path():
+    """資料檔路徑：MLB_DATA_PATH 或第一個存在的預設路徑"""
+    candidates = ([os.environ["MLB_DATA_PATH"]] if os.environ.get("MLB_DATA_PATH") else []) + DATA_PATHS
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("找不到數據檔案：" + ", ".join(candidates))
+
+
+# ============================================================
+# 查詢參數
+# ============================================================
+def _number(params, name, default=None, cast=float, minimum=None, maximum=None):
+    raw = params.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise BadRequest(f"{name} 必須是數字: {raw!r}")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise BadRequest(f"{name} 必須是有限數值: {raw!r}")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise BadRequest(f"{name} 必須介於 {minimum} 與 {maximum} 之間: {raw!r}")
+    return value
+
+
+def _boolean(params, name, default):
+    raw = params.get(name)
+    if raw is None or raw == '':
+        return default
+    if raw.lower() in ('1', 'true', 'yes'):
+        return True
+    if raw.lower() in ('0', 'false', 'no'):
+        return False
+    raise BadRequest(f"{name} 必須是 true 或 false: {raw!r}")
+
+
+def _choice(params, name, choices, default):
+    value = params.get(name) or default
+    if value not in choices:
+        raise BadRequest(f"{name} 必須是 {', '.join(map(str, choices))} 之一: {value!r}")
+    return value
+
+
+def _list(params, name):
+    raw = params.get(name)
+    return [item for item in raw.split(',') if item] if raw else []
+
+
+def _page(params):
+    return (_number(params, 'limit', DEFAULT_LIMIT, int, 1, MAX_LIMIT),
+            _number(params, 'offset', 0, int, 0))
+
+
+def records(frame):
+    """DataFrame 轉為 JSON 可序列化的 list[dict]（NaN 轉為 null）"""
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
+
+
+def paginate(frame, params):
+    limit, offset = _page(params)
+    total = len(frame)
+    page = frame.iloc[offset:offset + limit]
+    return {
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if offset + limit < total else None,
+        'data': records(page),
+    }
+
+
+# ============================================================
+# 資料與計算
+# ============================================================
+class MetricsStore:
+    """載入一次的預處理資料集與預先計算的表格（建立後不再修改，可在多個執行緒中讀取）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = file_version(path)
+        df = preprocess_data(pd.read_csv(path))
+        self.df = df
+        self.players = df[[col for col in PLAYER_FIELDS if col in df.columns]]
+
+        self.correlation, self.gini, self.sei = calculate_sei(df)
+        self.salary_model = None
+        self.anomaly_frame = None
+        df_model = salary_model_data(df, MIN_SALARY_THRESHOLD)
+        if len(df_model) >= 10:
+            slope, intercept, residuals = calculate_salary_residuals(df, df_model)
+            self.salary_model = {'slope': slope, 'intercept': intercept, 'n': len(df_model)}
+            # 與市場異常偵測頁相同，以此模型的 expected_salary 取代 MERI 預處理的同名欄位
+            base = [col for col in ANOMALY_FIELDS if col in df.columns and col not in residuals.columns]
+            self.anomaly_frame = df[base].join(residuals)
+
+        self._lock = threading.Lock()
+        self._team_psi = {}
+        self._regressions = {}
+
+    def team_psi(self, min_players):
+        with self._lock:
+            table = self._team_psi.get(min_players)
+        if table is None:
+            table = calculate_all_team_psi(self.df, min_players=min_players).reset_index(drop=True)
+            table['管理評價'] = classify_psi(table['PSI'])
+            with self._lock:
+                self._team_psi[min_players] = table
+        return table
+
+    def regression(self, x_col, y_col):
+        key = (x_col, y_col)
+        with self._lock:
+            result = self._regressions.get(key)
+        if result is None:
+            data_reg = self.df[[x_col, y_col]].dropna()
+            if len(data_reg) <= 10:
+                raise BadRequest("樣本數不足，無法進行回歸分析")
+            result = manual_ols_regression(data_reg[x_col].values, data_reg[y_col].values)
+            if result is None:
+                raise BadRequest("回歸計算錯誤")
+            result = {k: v for k, v in result.items() if k != 'residuals'}
+            with self._lock:
+                self._regressions[key] = result
+        return result
+
+
+def get_health(store, params):
+    return {'status': 'ok', 'dataset_version': store.version, 'rows': len(store.df), 'columns': len(store.df.columns)}
+
+
+def get_players(store, params):
+    """球員指標：依球隊、位置、分類、數值範圍與姓名篩選，可排序與分頁"""
+    frame = store.players
+    mask = np.ones(len(frame), dtype=bool)
+
+    teams = _list(params, 'team')
+    if teams and 'Team' in frame.columns:
+        mask &= frame['Team'].isin(teams).to_numpy()
+    for param, col in CATEGORY_FILTERS.items():
+        values = _list(params, param)
+        if values and col in frame.columns:
+            mask &= frame[col].astype(str).isin(values).to_numpy()
+    for param, col in RANGE_FILTERS.items():
+        low = _number(params, f'min_{param}')
+        high = _number(params, f'max_{param}')
+        if col in frame.columns and (low is not None or high is not None):
+            values = frame[col].to_numpy(dtype=float)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+    name = params.get('name')
+    if name and 'Name' in frame.columns:
+        mask &= frame['Name'].str.contains(name, case=False, na=False, regex=False).to_numpy()
+
+    result = frame[mask]
+    sortable = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])]
+    sort = params.get('sort')
+    if sort:
+        if sort not in sortable:
+            raise BadRequest(f"sort 必須是 {', '.join(sortable)} 之一: {sort!r}")
+        ascending = _choice(params, 'order', ['asc', 'desc'], 'desc') == 'asc'
+        result = result.sort_values(sort, ascending=ascending, kind='stable')
+
+    fields = _list(params, 'fields')
+    if fields:
+        unknown = [f for f in fields if f not in frame.columns]
+        if unknown:
+            raise BadRequest(f"未知的欄位: {', '.join(unknown)}")
+        result = result[fields]
+    return paginate(result, params)
+
+
+def get_team_psi(store, params):
+    """各球隊 PSI 與管理評價（依 PSI 由高到低）"""
+    min_players = _number(params, 'min_players', 3, int, 1)
+    table = store.team_psi(min_players)
+    return {'league_efficiency': float(store.df['WAR'].sum() / store.df['Salary_millions'].sum()),
+            'data': records(table)}
+
+
+def get_sei(store, params):
+    return {'correlation': store.correlation, 'gini': store.gini, 'sei': store.sei}
+
+
+def get_lorenz(store, params):
+    """羅倫茲曲線（依 points 重新取樣）與基尼係數，可指定球隊"""
+    team = params.get('team')
+    frame = store.df
+    if team:
+        frame = frame[frame['Team'] == team]
+        if frame.empty:
+            raise BadRequest(f"找不到球隊: {team!r}")
+    points = _number(params, 'points', 101, int, 2, 1001)
+
+    x_axis, lorenz_curve = calculate_lorenz_curve(frame['Salary_millions'])
+    if x_axis is None:
+        return {'team': team, 'gini': 0, 'points': []}
+    grid = np.linspace(0, 1, points)
+    return {
+        'team': team,
+        'players': len(x_axis) - 1,
+        'gini': calculate_gini(frame['Salary_millions']),
+        'points': np.column_stack([grid, np.interp(grid, x_axis, lorenz_curve)]).tolist(),
+    }
+
+
+def get_regression(store, params):
+    """OLS 回歸（X 對 Y）的係數與檢定統計量"""
+    x_col = _choice(params, 'x', REGRESSION_X, 'WAR')
+    y_col = _choice(params, 'y', REGRESSION_Y, 'Salary_millions')
+    if x_col not in store.df.columns or y_col not in store.df.columns:
+        raise BadRequest(f"資料中沒有 {x_col} 或 {y_col} 欄位")
+    return {'x': x_col, 'y': y_col, **store.regression(x_col, y_col)}
+
+
+def get_anomalies(store, params):
+    """市場異常：實際薪資與 WAR 回歸預期薪資差異超過閾值的球員（同市場異常偵測頁）"""
+    if store.anomaly_frame is None:
+        raise BadRequest(f"薪資高於 ${MIN_SALARY_THRESHOLD}M 的球員樣本不足，無法建立回歸模型")
+    kind = _choice(params, 'kind', ['undervalued', 'overvalued', 'all'], 'all')
+    threshold = _number(params, 'threshold', 30.0, float, 0)
+    min_war = _number(params, 'min_war', 1.0)
+    exclude_rookies = _boolean(params, 'exclude_rookies', True)
+
+    frame = store.anomaly_frame
+    mask = frame['WAR'] >= min_war
+    if exclude_rookies:
+        mask &= frame['Salary_millions'] >= MIN_SALARY_THRESHOLD
+    frame = frame[mask]
+
+    undervalued, overvalued = split_salary_anomalies(frame, threshold)
+    if kind == 'undervalued':
+        result = undervalued.assign(kind='undervalued')
+    elif kind == 'overvalued':
+        result = overvalued.assign(kind='overvalued')
+    else:
+        result = pd.concat([undervalued.assign(kind='undervalued'), overvalued.assign(kind='overvalued')])
+    return {'model': store.salary_model, **paginate(result, params)}
+
+
+ROUTES = {
+    '/health': get_health,
+    '/players': get_players,
+    '/teams/psi': get_team_psi,
+    '/sei': get_sei,
+    '/lorenz': get_lorenz,
+    '/regression': get_regression,
+    '/anomalies': get_anomalies,
+}
+
+
+# ============================================================
+# ASGI 應用程式
+# ============================================================
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.bool_):
+        return bool(value)
+    raise TypeError(f"無法序列化 {type(value).__name__}")
+
+
+def _clean_floats(value):
+    """JSON 不允許 NaN/Infinity，轉為 null"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _clean_floats(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clean_floats(v) for v in value]
+    return value
+
+
+def encode(payload):
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    if 'NaN' in text or 'Infinity' in text:
+        text = json.dumps(_clean_floats(json.loads(text)), ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+class MetricsAPI:
+    """ASGI 應用程式；資料集在 lifespan startup（或第一個請求）時載入一次"""
+
+    def __init__(self, data_path=None, cache_bytes=RESPONSE_CACHE_BYTES):
+        self.data_path = data_path
+        self.store = None
+        # 只存放成功的回應，因此快取中的鍵值都是驗證過的請求
+        self._responses = FigureCache(max_bytes=cache_bytes)
+        self._load_lock = None
+
+    async def load(self):
+        """載入資料集（只載入一次）"""
+        if self.store is not None:
+            return self.store
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self.store is None:
+                path = self.data_path or find_data_path()
+                self.store = await asyncio.to_thread(MetricsStore, path)
+                logger.info("已載入 %s（%d 筆，版本 %s）", path, len(self.store.df), self.store.version)
+        return self.store
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.load()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _etag(self, store, key):
+        digest = hashlib.sha1(f"{store.version}|{key[0]}?{key[1]}".encode('utf-8')).hexdigest()[:24]
+        return f'"{digest}"'.encode('ascii')
+
+    async def _http(self, scope, send):
+        method = scope['method']
+        if method not in ('GET', 'HEAD'):
+            await self._send(send, 405, encode({'error': '只支援 GET'}), extra=[(b'allow', b'GET, HEAD')])
+            return
+
+        path = scope['path'].rstrip('/') or '/'
+        handler = ROUTES.get(path)
+        if handler is None:
+            await self._send(send, 404, encode({'error': f'找不到路徑 {path}', 'routes': sorted(ROUTES)}))
+            return
+
+        params = dict(parse_qsl(scope['query_string'].decode('utf-8', 'replace')))
+        key = (path, urlencode(sorted(params.items())))
+        store = await self.load()
+        etag = self._etag(store, key)
+        headers = [(b'etag', etag), (b'cache-control', CACHE_CONTROL)]
+
+        # 先確認請求有效（快取命中或計算成功），參數錯誤時即使 ETag 相符也回 400
+        body = self._responses.get(key)
+        if body is None:
+            try:
+                body = encode(await asyncio.to_thread(handler, store, params))
+            except BadRequest as e:
+                await self._send(send, 400, encode({'error': str(e)}))
+                return
+            self._responses.put(key, body)
+
+        for name, value in scope['headers']:
+            if name == b'if-none-match' and (value.strip() == b'*' or etag in [v.strip() for v in value.split(b',')]):
+                await self._send(send, 304, b'', extra=headers, head=True)
+                return
+        await self._send(send, 200, body, extra=headers, head=method == 'HEAD')
+
+    async def _send(self, send, status, body, extra=(), head=False):
+        headers = [] if status == 304 else [(b'content-type', b'application/json; charset=utf-8'),
+                                            (b'content-length', str(len(body)).encode('ascii'))]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers + list(extra)})
+        await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+# ============================================================
+# 內建 HTTP/1.1 伺服器（沒有安裝 uvicorn 時使用）
+# ============================================================
+async def _serve_connection(app, reader, writer, server_address):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+            except ValueError:
+                writer.write(b"HTTP/1.1 400 Bad Request\r\ncontent-length: 0\r\nconnection: close\r\n\r\n")
+                break
+
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            header_map = dict(headers)
+            length = int(header_map.get(b'content-length', b'0') or 0)
+            body = await reader.readexactly(length) if length else b''
+
+            connection = header_map.get(b'connection', b'').lower()
+            keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0', 'spec_version': '2.3'},
+                'http_version': version.partition('/')[2] or '1.1', 'method': method.upper(),
+                'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+                'client': writer.get_extra_info('peername'), 'server': server_address,
+            }
+            response = {'status': 500, 'headers': [], 'body': []}
+
+            async def receive(body=body):
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message, response=response):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                    response['headers'] = message.get('headers', [])
+                elif message['type'] == 'http.response.body':
+                    response['body'].append(message.get('body', b''))
+
+            try:
+                await app(scope, receive, send)
+            except Exception:
+                logger.exception("處理請求失敗: %s %s", method, target)
+                response = {'status': 500, 'headers': [(b'content-length', b'0')], 'body': []}
+
+            status = response['status']
+            head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}".encode('latin-1')]
+            head += [name + b': ' + value for name, value in response['headers']]
+            head.append(b'connection: keep-alive' if keep_alive else b'connection: close')
+            writer.write(b'\r\n'.join(head) + b'\r\n\r\n' + b''.join(response['body']))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_builtin(app, host, port):
+    """以 asyncio 執行 ASGI 應用程式（含 lifespan startup/shutdown）"""
+    lifespan = asyncio.Queue()
+    started = asyncio.get_running_loop().create_future()
+
+    async def lifespan_send(message):
+        if message['type'] in ('lifespan.startup.complete', 'lifespan.startup.failed') and not started.done():
+            started.set_result(message)
+
+    await lifespan.put({'type': 'lifespan.startup'})
+    lifespan_task = asyncio.create_task(app({'type': 'lifespan', 'asgi': {'version': '3.0'}}, lifespan.get, lifespan_send))
+    message = await started
+    if message['type'] == 'lifespan.startup.failed':
+        raise RuntimeError(message.get('message', '啟動失敗'))
+
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(app, r, w, (host, port)), host, port, backlog=1024
+    )
+    print(f"✅ API 已啟動: http://{host}:{port}/  （路徑: {', '.join(sorted(ROUTES))}）")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await lifespan.put({'type': 'lifespan.shutdown'})
+        await lifespan_task
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="財務指標 HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1", help="綁定位址")
+    parser.add_argument("--port", type=int, default=8008, help="連接埠")
+    parser.add_argument("--data", default=None, help="資料檔路徑（預設同儀表板）")
+    parser.add_argument("--server", choices=["auto", "builtin", "uvicorn"], default="auto",
+                        help="auto: 有安裝 uvicorn 時使用 uvicorn，否則使用內建伺服器")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = MetricsAPI(data_path=args.data)
+
+    use_uvicorn = args.server == "uvicorn" or (
+        args.server == "auto" and importlib.util.find_spec("uvicorn") is not None
+    )
+    if use_uvicorn:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+        return 0
+
+    try:
+        asyncio.run(serve_builtin(app, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
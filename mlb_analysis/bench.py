@@ -0,0 +1,320 @@
+# bench.py - 效能基準測試
+"""以多種大小的合成資料量測資料載入、預處理與各原創財務指標的執行時間與記憶體峰值，
+結果存成 JSON（含 commit 與套件版本），供不同 commit 之間比較。
+
+用法：
+    python -m mlb_analysis.bench run --sizes 1000 10000 100000 --repeat 5
+    python -m mlb_analysis.bench run --stages calculate_meri calculate_team_psi_all --out result.json
+    python -m mlb_analysis.bench compare base.json new.json --time-threshold 1.25
+    python -m mlb_analysis.bench compare base.json new.json --allow-missing   # 刻意移除或改名階段時
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib import metadata
+
+import pandas as pd
+
+from mlb_analysis import synthetic
+from mlb_analysis.charts import plot_tpm_matrix
+from mlb_analysis.dataset import REPO_ROOT
+from mlb_analysis.metrics import (
+    calculate_all_team_psi, calculate_gini, calculate_meri, calculate_rav, calculate_sei,
+    calculate_wvpi, calculate_wvpi_pca_weights, preprocess_data
+)
+
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, ".benchmarks")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+SCHEMA_VERSION = 1
+
+# 記錄在結果中的套件版本
+TRACKED_PACKAGES = ['numpy', 'pandas', 'plotly', 'scipy', 'scikit-learn', 'streamlit', 'pyarrow']
+
+# 回歸判定的預設門檻：中位數變慢超過 25% 且統計上顯著，或記憶體峰值成長超過 50%
+DEFAULT_TIME_THRESHOLD = 1.25
+DEFAULT_MEMORY_THRESHOLD = 1.5
+DEFAULT_ALPHA = 0.05
+# 差異小於此值視為雜訊（微秒級的階段比例容易失真）
+MIN_TIME_DELTA_SECONDS = 0.001
+MIN_MEMORY_DELTA_BYTES = 1024 * 1024
+
+
+# ============================================================
+# 量測階段
+# ============================================================
+# 每個階段：(名稱, setup(ctx) -> 參數 tuple, 被量測的函數)；setup 的時間不計入量測
+STAGES = [
+    ('load_csv', lambda ctx: (ctx['csv_path'],), pd.read_csv),
+    ('preprocess', lambda ctx: (ctx['raw'].copy(),), preprocess_data),
+    ('calculate_wvpi', lambda ctx: (ctx['df'].copy(),), calculate_wvpi),
+    ('calculate_rav', lambda ctx: (ctx['df'].copy(),), calculate_rav),
+    ('calculate_meri', lambda ctx: (ctx['df'].copy(),), calculate_meri),
+    ('calculate_team_psi_all', lambda ctx: (ctx['df'],), calculate_all_team_psi),
+    ('calculate_sei', lambda ctx: (ctx['df'],), calculate_sei),
+    ('calculate_gini', lambda ctx: (ctx['df']['Salary_millions'],), calculate_gini),
+    ('plot_tpm_matrix', lambda ctx: (ctx['df'],), plot_tpm_matrix),
+    ('wvpi_pca_weights', lambda ctx: (ctx['df'],), calculate_wvpi_pca_weights),
+]
+STAGE_NAMES = [name for name, _, _ in STAGES]
+
+
+def dataset_path(rows, seasons, seed, data_dir):
+    """取得（必要時產生）指定大小的合成資料 CSV；相同參數重複使用同一個檔案"""
+    path = os.path.join(data_dir, f"synthetic_{rows}_{seasons}s_{seed}.csv")
+    if not os.path.exists(path):
+        profile = synthetic.SyntheticProfile.from_csv()
+        chunks = synthetic.generate_chunks(profile, rows, seasons, seed)
+        synthetic.write_outputs(chunks, path[:-len('.csv')], formats=('csv',))
+    return path
+
+
+def build_context(rows, seasons, seed, data_dir):
+    """準備某個資料大小的量測環境：CSV 路徑、原始資料與預處理後的資料"""
+    csv_path = dataset_path(rows, seasons, seed, data_dir)
+    raw = pd.read_csv(csv_path)
+    return {'csv_path': csv_path, 'raw': raw, 'df': preprocess_data(raw.copy())}
+
+
+def measure(setup, fn, ctx, repeat, warmup=1):
+    """量測一個階段：warmup 後重複執行 repeat 次，另外以 tracemalloc 單獨量測一次記憶體峰值"""
+    for _ in range(warmup):
+        fn(*setup(ctx))
+
+    samples = []
+    for _ in range(repeat):
+        args = setup(ctx)
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+        del args
+
+    # tracemalloc 會拖慢執行，因此與計時分開量測
+    args = setup(ctx)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(*args)
+        peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return {**summarize_samples(samples), 'peak_bytes': peak_bytes}
+
+
+def summarize_samples(samples):
+    """樣本（秒）的統計摘要，結果檔中每個階段共用的欄位"""
+    return {
+        'samples': samples,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+# ============================================================
+# 執行環境資訊
+# ============================================================
+def _git(*args):
+    try:
+        return subprocess.run(
+            ['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_meta(params):
+    """結果檔的 meta：commit、執行環境、套件版本與量測參數"""
+    versions = {}
+    for package in TRACKED_PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'schema': SCHEMA_VERSION,
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+        'params': params,
+    }
+
+
+def default_output_path(meta, prefix=''):
+    """預設結果檔名：<前綴><UTC 時間>_<commit 前 7 碼>.json"""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    commit = (meta['commit'] or 'nogit')[:7]
+    return os.path.join(DEFAULT_RESULTS_DIR, f"{prefix}{stamp}_{commit}.json")
+
+
+# ============================================================
+# 子命令
+# ============================================================
+def run(args):
+    """依資料大小與階段執行所有量測並寫出 JSON"""
+    stages = [s for s in STAGES if not args.stages or s[0] in args.stages]
+    meta = collect_meta({
+        'sizes': args.sizes,
+        'seasons': args.seasons,
+        'seed': args.seed,
+        'repeat': args.repeat,
+    })
+    results = []
+
+    for rows in args.sizes:
+        ctx = build_context(rows, args.seasons, args.seed, args.data_dir)
+        print(f"\n📏 {rows:,} 筆")
+        for name, setup, fn in stages:
+            result = measure(setup, fn, ctx, args.repeat)
+            results.append({'stage': name, 'rows': rows, **result})
+            print(f"   {name:<24} median {result['median'] * 1000:10.2f} ms"
+                  f"   peak {result['peak_bytes'] / 1024 / 1024:8.1f} MB")
+        del ctx
+
+    out = args.out or default_output_path(meta)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已寫入 {out}")
+    return 0
+
+
+def load_results(path):
+    """讀取結果 JSON，回傳 (meta, {(階段, 筆數): 結果})"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    results = {(r['stage'], r.get('rows')): r for r in data.get('results', [])}
+    return data.get('meta', {}), results
+
+
+def compare_result(base, new, time_threshold=DEFAULT_TIME_THRESHOLD,
+                   memory_threshold=DEFAULT_MEMORY_THRESHOLD, alpha=DEFAULT_ALPHA):
+    """比較同一階段的兩次量測：以 Mann-Whitney U 檢定判斷變慢是否顯著，再套用比例門檻"""
+    time_ratio = new['median'] / base['median'] if base['median'] > 0 else float('inf')
+    time_delta = new['median'] - base['median']
+
+    # 樣本數太少時無法檢定，只看比例
+    p_value = None
+    if len(base['samples']) >= 3 and len(new['samples']) >= 3:
+        from scipy.stats import mannwhitneyu
+        p_value = float(mannwhitneyu(new['samples'], base['samples'], alternative='greater').pvalue)
+    significant = p_value is None or p_value < alpha
+
+    slower = time_ratio > time_threshold and time_delta > MIN_TIME_DELTA_SECONDS and significant
+    faster = time_ratio < 1 / time_threshold and -time_delta > MIN_TIME_DELTA_SECONDS
+
+    memory_ratio = memory_regression = None
+    if base.get('peak_bytes') is not None and new.get('peak_bytes') is not None:
+        memory_ratio = new['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] > 0 else float('inf')
+        memory_regression = (memory_ratio > memory_threshold
+                             and new['peak_bytes'] - base['peak_bytes'] > MIN_MEMORY_DELTA_BYTES)
+
+    if slower or memory_regression:
+        status = 'REGRESSION'
+    elif faster:
+        status = 'faster'
+    else:
+        status = 'ok'
+
+    return {
+        'time_ratio': time_ratio,
+        'p_value': p_value,
+        'slower': slower,
+        'memory_ratio': memory_ratio,
+        'memory_regression': bool(memory_regression),
+        'status': status,
+    }
+
+
+def compare(args):
+    """比較兩個結果檔；有回歸或比較結果缺少基準中的階段時回傳非零結束碼"""
+    base_meta, base_results = load_results(args.base)
+    new_meta, new_results = load_results(args.new)
+
+    print(f"基準: {(base_meta.get('commit') or '?')[:7]}  →  比較: {(new_meta.get('commit') or '?')[:7]}")
+    if base_meta.get('versions') != new_meta.get('versions'):
+        print("⚠️ 兩次量測的套件版本不同，差異可能來自環境")
+    if base_meta.get('platform') != new_meta.get('platform'):
+        print("⚠️ 兩次量測的執行平台不同，差異可能來自環境")
+
+    print(f"\n   {'階段':<26}{'筆數':>10}{'基準 ms':>12}{'比較 ms':>12}{'倍數':>8}{'p 值':>8}{'記憶體':>8}  結果")
+    regressions = []
+    for key in sorted(base_results.keys() & new_results.keys(), key=lambda k: (k[0], k[1] or 0)):
+        base, new = base_results[key], new_results[key]
+        result = compare_result(base, new, args.time_threshold, args.memory_threshold, args.alpha)
+        if result['status'] == 'REGRESSION':
+            regressions.append((key, result))
+
+        p_text = f"{result['p_value']:.3f}" if result['p_value'] is not None else '-'
+        memory_text = f"{result['memory_ratio']:.2f}x" if result['memory_ratio'] is not None else '-'
+        flag = {'REGRESSION': '❌ 回歸', 'faster': '🚀 變快', 'ok': '✅'}[result['status']]
+        print(f"   {key[0]:<26}{key[1] or '':>10}{base['median'] * 1000:>12.2f}{new['median'] * 1000:>12.2f}"
+              f"{result['time_ratio']:>7.2f}x{p_text:>8}{memory_text:>8}  {flag}")
+
+    # 改名或執行失敗的階段不能讓比較通過
+    missing = sorted(base_results.keys() - new_results.keys(), key=str)
+    for key in missing:
+        print(f"   {'⚠️' if args.allow_missing else '❌'} 比較結果缺少 {key[0]} ({key[1]})")
+
+    failed = False
+    if regressions:
+        print(f"\n❌ {len(regressions)} 個階段效能回歸"
+              f"（時間門檻 {args.time_threshold}x、記憶體門檻 {args.memory_threshold}x、alpha {args.alpha}）")
+        failed = True
+    if missing and not args.allow_missing:
+        print(f"\n❌ 比較結果缺少 {len(missing)} 個基準中的階段（刻意移除時請加上 --allow-missing）")
+        failed = True
+    if failed:
+        return 1
+    print("\n✅ 沒有效能回歸")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MLB 分析效能基準測試")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="執行基準測試並寫出 JSON 結果")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="合成資料筆數")
+    run_parser.add_argument("--seasons", type=int, default=1, help="合成資料賽季數")
+    run_parser.add_argument("--seed", type=int, default=0, help="合成資料亂數種子")
+    run_parser.add_argument("--repeat", type=int, default=5, help="每個階段的量測次數")
+    run_parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, help="只量測指定階段")
+    run_parser.add_argument("--data-dir", default=os.path.join(DEFAULT_RESULTS_DIR, "data"),
+                            help="合成資料快取目錄")
+    run_parser.add_argument("--out", help="結果 JSON 路徑（預設為 .benchmarks/<時間>_<commit>.json）")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="比較兩個結果檔，有效能回歸或缺少階段時結束碼為 1")
+    compare_parser.add_argument("base", help="基準結果 JSON")
+    compare_parser.add_argument("new", help="要比較的結果 JSON")
+    compare_parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD,
+                                help="中位數時間倍數門檻")
+    compare_parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                                help="記憶體峰值倍數門檻")
+    compare_parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="顯著水準")
+    compare_parser.add_argument("--allow-missing", action="store_true",
+                                help="比較結果缺少基準中的階段時只警告，不視為失敗")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
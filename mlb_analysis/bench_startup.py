@@ -0,0 +1,301 @@
+# bench_startup.py - 啟動時間與第一次渲染基準測試
+"""量測所有分析模式從行程啟動到第一次渲染內容（first paint）與完整渲染的時間，分冷啟動與熱快取兩種情況：
+
+- 冷啟動：每次量測都啟動新的 Python 行程，以 AppTest 執行儀表板一次（import、資料載入、快取全部從零開始）
+- 熱快取：同一行程中以新的工作階段再執行同一模式（模組已載入、st.cache_data 與圖表快取已建立）
+
+每次執行的時間拆分為 import、腳本編譯、load_data、指標計算、圖表建立、圖表序列化 (st.plotly_chart) 與其餘腳本時間，
+結果寫成與 mlb_analysis.bench 相同格式的 JSON，可用 `bench compare` 比較兩次量測。
+
+Streamlit 伺服器只在第一個工作階段編譯（magic 轉換）腳本，AppTest 則每個工作階段都重新編譯；
+因此熱快取的 first paint 與總時間從腳本開始執行起算，編譯時間另外列在 script_compile。
+
+用法：
+    python -m mlb_analysis.bench_startup --repeat 3
+    python -m mlb_analysis.bench_startup --modes 綜合儀表板 球隊分析 --warm-runs 5 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mlb_analysis import instrumentation
+from mlb_analysis.dataset import REPO_ROOT
+from mlb_analysis.lazy_imports import IMPORT_BUDGET_SECONDS, lazy_import
+from mlb_analysis.modes import ANALYSIS_MODES as MODES
+
+# 子行程只需要標準函式庫；bench 會載入 pandas 等套件，延後到主行程使用時才載入，以免算進冷啟動
+bench = lazy_import("mlb_analysis.bench")
+
+DASHBOARD_PATH = os.path.join(REPO_ROOT, "dashboard.py")
+
+# 量測區段名稱 → 時間類別（區段內未歸類的子區段沿用外層類別）
+METRIC_PREFIXES = ('preprocess_data', 'calculate_', 'manual_ols_regression')
+FIGURE_PREFIXES = ('figure:', 'px.', 'plot_')
+# 冷啟動與熱快取共同的時間拆分項目（秒）
+COMPONENTS = ['script_compile', 'load_data', 'metrics', 'figure_build', 'figure_serialization', 'script_other']
+
+
+# ============================================================
+# 子行程：執行一次冷啟動與數次熱快取
+# ============================================================
+def span_category(name):
+    """量測區段的時間類別（None 代表沿用外層類別）"""
+    if name == 'load_data':
+        return 'load_data'
+    if name.startswith(METRIC_PREFIXES):
+        return 'metrics'
+    if name.startswith(FIGURE_PREFIXES):
+        return 'figure_build'
+    return None
+
+
+def attribute_spans(records):
+    """將量測區段的牆鐘時間分配到各類別（每段時間只算一次：子區段的時間從外層扣除）"""
+    totals = {}
+    roots = []
+    stack = []
+    for record in sorted(records, key=lambda r: r['seq']):
+        node = {'record': record, 'children': []}
+        del stack[record['depth']:]
+        (stack[-1]['children'] if stack else roots).append(node)
+        stack.append(node)
+
+    def visit(node, inherited):
+        category = span_category(node['record']['name']) or inherited
+        children_ms = sum(child['record']['wall_ms'] for child in node['children'])
+        totals[category] = totals.get(category, 0.0) + max(node['record']['wall_ms'] - children_ms, 0.0) / 1000
+        for child in node['children']:
+            visit(child, category)
+
+    for root in roots:
+        visit(root, 'script_other')
+    return totals
+
+
+class _RenderProbe:
+    """記錄本次執行腳本開始送出訊息與第一個畫面元素送出的時間，以及 st.plotly_chart 的累計時間"""
+
+    def __init__(self):
+        self.reset()
+
+    def install(self):
+        import streamlit
+        from streamlit.delta_generator import DeltaGenerator
+        from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+        probe = self
+        original_enqueue = ScriptRunContext.enqueue
+        original_chart = DeltaGenerator.plotly_chart
+
+        def enqueue(ctx, msg):
+            if probe.first_message is None:
+                probe.first_message = time.time()
+            if probe.first_delta is None and msg.HasField("delta"):
+                probe.first_delta = time.time()
+            return original_enqueue(ctx, msg)
+
+        def plotly_chart(dg, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_chart(dg, *args, **kwargs)
+            finally:
+                probe.chart_seconds += time.perf_counter() - start
+
+        ScriptRunContext.enqueue = enqueue
+        DeltaGenerator.plotly_chart = plotly_chart
+        # st.plotly_chart 是 import 時綁定的方法，需另外替換
+        streamlit.plotly_chart = plotly_chart.__get__(streamlit._main)
+
+    def reset(self):
+        self.first_message = None
+        self.first_delta = None
+        self.chart_seconds = 0.0
+
+
+def _read_new_records(path, offset):
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, encoding='utf-8') as f:
+        f.seek(offset)
+        lines = f.read()
+        offset = f.tell()
+    return [json.loads(line) for line in lines.splitlines() if line.strip()], offset
+
+
+def _render_once(AppTest, mode, probe, log_path, offset, timeout):
+    """以新的工作階段執行一次指定模式，回傳 (時間點, 時間拆分, 新的記錄檔位置)
+
+    時間點包含 started（呼叫 run）、script（腳本送出第一個訊息）、first_delta 與 finished。
+    """
+    probe.reset()
+    at = AppTest.from_file(DASHBOARD_PATH, default_timeout=timeout)
+    at.session_state["analysis_mode"] = mode
+    started = time.time()
+    at.run()
+    finished = time.time()
+    if at.exception:
+        raise RuntimeError(f"{mode}: {at.exception[0].value}")
+
+    records, offset = _read_new_records(log_path, offset)
+    components = {name: 0.0 for name in COMPONENTS}
+    components.update(attribute_spans(records))
+    components['figure_serialization'] = probe.chart_seconds
+    moments = {
+        'started': started,
+        'script': probe.first_message or finished,
+        'first_delta': probe.first_delta or finished,
+        'finished': finished,
+    }
+    return moments, components, offset
+
+
+def _fill_remainder(components, total, measured):
+    """其餘腳本時間 = 總時間 − 其他已歸類項目（st.plotly_chart 等不在量測區段內的時間都歸入此項）"""
+    components['script_other'] = max(total - sum(components[name] for name in measured), 0.0)
+
+
+def child_main(mode, warm_runs, spawned_at, timeout):
+    """子行程進入點：輸出一行 JSON（冷啟動一次、熱快取 warm_runs 次）"""
+    entered = time.time()
+    log_path = os.environ[instrumentation.LOG_PATH_ENV]
+
+    from mlb_analysis.lazy_imports import eager_modules, startup_report, time_imports
+
+    # 子行程是新的直譯器：先依序載入測試工具（真實伺服器同樣要先載入 streamlit）與儀表板頂層 import 的模組，
+    # 量測冷啟動的 import 成本；之後腳本中的這些 import 都已載入，不再花時間
+    eager = time_imports(["streamlit.testing.v1"] + eager_modules(DASHBOARD_PATH))
+    from streamlit.testing.v1 import AppTest
+
+    probe = _RenderProbe()
+    probe.install()
+
+    moments, cold, offset = _render_once(AppTest, mode, probe, log_path, 0, timeout)
+    report = startup_report(eager)
+    cold['interpreter'] = entered - spawned_at
+    cold['imports'] = report['eager_seconds']
+    # 腳本送出第一個訊息前：編譯腳本
+    cold['script_compile'] = max(moments['script'] - moments['started'], 0.0)
+    # 延遲載入在第一次使用時發生，時間已包含在所屬區段中，只列出供參考
+    cold['lazy_imports'] = report['lazy_seconds']
+    cold['first_paint'] = moments['first_delta'] - spawned_at
+    cold['total'] = moments['finished'] - spawned_at
+    _fill_remainder(cold, cold['total'], ['interpreter', 'imports'] + COMPONENTS[:-1])
+
+    warm = []
+    for _ in range(warm_runs):
+        moments, components, offset = _render_once(AppTest, mode, probe, log_path, offset, timeout)
+        components['script_compile'] = moments['script'] - moments['started']
+        components['first_paint'] = moments['first_delta'] - moments['script']
+        components['total'] = moments['finished'] - moments['script']
+        _fill_remainder(components, components['total'], COMPONENTS[1:-1])
+        warm.append(components)
+
+    print(json.dumps({'mode': mode, 'cold': cold, 'warm': warm}, ensure_ascii=False))
+    return 0
+
+
+# ============================================================
+# 主行程
+# ============================================================
+def run_child(mode, warm_runs, timeout, data_path=None):
+    """啟動一個全新的子行程量測一次冷啟動，回傳子行程輸出的 JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env[instrumentation.LOG_PATH_ENV] = os.path.join(tmp, "spans.jsonl")
+        # tracemalloc 會大幅拖慢執行，啟動時間量測只記錄時間
+        env[instrumentation.MEMORY_ENV] = "0"
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+        if data_path:
+            env["MLB_DATA_PATH"] = data_path
+
+        spawned_at = time.time()
+        proc = subprocess.run(
+            [sys.executable, "-m", "mlb_analysis.bench_startup", "--child", mode,
+             "--warm-runs", str(warm_runs), "--spawned-at", repr(spawned_at), "--timeout", str(timeout)],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=timeout * (warm_runs + 2)
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} 子行程失敗:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(args):
+    """依模式執行冷啟動與熱快取量測並寫出 JSON"""
+    modes = args.modes or MODES
+    data_path = bench.dataset_path(args.rows, 1, 0, args.data_dir) if args.rows else None
+    meta = bench.collect_meta({
+        'modes': modes,
+        'repeat': args.repeat,
+        'warm_runs': args.warm_runs,
+        'rows': args.rows,
+    })
+
+    results = []
+    for mode in modes:
+        print(f"\n🚀 {mode}")
+        samples = {}
+        for i in range(args.repeat):
+            output = run_child(mode, args.warm_runs, args.timeout, data_path)
+            for key, value in output['cold'].items():
+                samples.setdefault(('cold', key), []).append(value)
+            for warm in output['warm']:
+                for key, value in warm.items():
+                    samples.setdefault(('warm', key), []).append(value)
+            print(f"   冷啟動 #{i + 1}: first paint {output['cold']['first_paint'] * 1000:7.0f} ms"
+                  f"   完整 {output['cold']['total'] * 1000:7.0f} ms")
+
+        for (kind, component), values in samples.items():
+            results.append({
+                'stage': f"startup_{kind}:{mode}:{component}",
+                'rows': args.rows,
+                **bench.summarize_samples(values),
+                'peak_bytes': None,
+            })
+        _print_breakdown(mode, samples)
+
+    out = args.out or bench.default_output_path(meta, prefix='startup_')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已寫入 {out}")
+    return 0
+
+
+def _print_breakdown(mode, samples):
+    def median_ms(kind, component):
+        values = samples.get((kind, component))
+        return statistics.median(values) * 1000 if values else float('nan')
+
+    print(f"   {'項目':<22}{'冷啟動 ms':>12}{'熱快取 ms':>12}")
+    for component in ['interpreter', 'imports'] + COMPONENTS + ['first_paint', 'total']:
+        print(f"   {component:<22}{median_ms('cold', component):>12.1f}{median_ms('warm', component):>12.1f}")
+    if median_ms('cold', 'imports') > IMPORT_BUDGET_SECONDS * 1000:
+        print(f"   ⚠️ 啟動 import 時間超過預算 {IMPORT_BUDGET_SECONDS * 1000:.0f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="各分析模式的啟動時間與第一次渲染基準測試")
+    parser.add_argument("--modes", nargs="+", choices=MODES, help="只量測指定模式（預設全部）")
+    parser.add_argument("--repeat", type=int, default=3, help="每個模式的冷啟動次數")
+    parser.add_argument("--warm-runs", type=int, default=3, help="每次冷啟動後的熱快取執行次數")
+    parser.add_argument("--rows", type=int, default=None, help="改用指定筆數的合成資料（預設為內附資料）")
+    parser.add_argument("--data-dir", default=os.path.join(REPO_ROOT, ".benchmarks", "data"), help="合成資料快取目錄")
+    parser.add_argument("--timeout", type=float, default=300, help="單次執行逾時秒數")
+    parser.add_argument("--out", default=None, help="結果 JSON 路徑")
+    # 子行程內部使用
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--spawned-at", type=float, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+    if args.child:
+        return child_main(args.child, args.warm_runs, args.spawned_at, args.timeout)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
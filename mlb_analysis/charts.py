@@ -0,0 +1,83 @@
+# charts.py - 與 Streamlit 無關的圖表建構函數
+"""儀表板與基準測試共用的 Plotly 圖表函數"""
+from mlb_analysis.instrumentation import traced
+from mlb_analysis.lazy_imports import lazy_import
+from mlb_analysis.metrics import assign_tpm_categories, calculate_gini, calculate_lorenz_curve
+
+go = lazy_import("plotly.graph_objects")
+px = lazy_import("plotly.express")
+
+
+@traced()
+def plot_tpm_matrix(df):
+    """繪製雙因子績效矩陣 (TPM)"""
+    if 'war_percentile' not in df.columns or 'value_ratio' not in df.columns:
+        return None, None
+    
+    # 計算性價比百分位與象限分類
+    df_temp = df.copy()
+    tpm = assign_tpm_categories(df_temp)
+    df_temp['value_percentile'] = tpm['value_percentile']
+    df_temp['TPM_category'] = tpm['TPM_category']
+    
+    # 創建散點圖
+    fig = px.scatter(
+        df_temp,
+        x='war_percentile',
+        y='value_percentile',
+        color='TPM_category',
+        hover_name='Name' if 'Name' in df_temp.columns else None,
+        hover_data=['Team', 'Position', 'WAR', 'Salary_millions'],
+        title='雙因子績效矩陣 (TPM)',
+        labels={'war_percentile': 'WAR百分位 (%)', 'value_percentile': '性價比百分位 (%)'},
+        color_discrete_map={
+            '明星價值': '#2E7D32',  # 綠色
+            '溢價球星': '#C62828',  # 紅色
+            '潛力新秀': '#FF8F00',  # 橙色
+            '球隊冗員': '#757575',   # 灰色
+            '未分類': '#000000'      # 黑色
+        }
+    )
+    
+    # 添加象限分隔線
+    fig.add_hline(y=50, line_dash="dash", line_color="black", opacity=0.5)
+    fig.add_vline(x=50, line_dash="dash", line_color="black", opacity=0.5)
+    
+    fig.update_layout(
+        xaxis_range=[0, 100],
+        yaxis_range=[0, 100],
+        height=600
+    )
+    
+    return fig, df_temp
+
+
+@traced()
+def plot_lorenz_curve(df, team_name="All Teams"):
+    """繪製羅倫茲曲線"""
+    x_axis, lorenz_curve = calculate_lorenz_curve(df['Salary_millions'])
+    if x_axis is None: return go.Figure(), 0
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=x_axis, y=lorenz_curve,
+        mode='lines', name='實際分配',
+        fill='tozeroy', fillcolor='rgba(26, 35, 126, 0.2)',
+        line=dict(color='#1a237e', width=2)
+    ))
+    fig.add_trace(go.Scatter(
+        x=[0, 1], y=[0, 1],
+        mode='lines', name='完全平等線',
+        line=dict(dash='dash', color='#ef5350')
+    ))
+    
+    gini = calculate_gini(df['Salary_millions'])
+    
+    fig.update_layout(
+        title=f'{team_name} 薪資不平等分析 (Gini: {gini:.3f})',
+        xaxis_title='球員累積百分比',
+        yaxis_title='薪資累積百分比',
+        height=400,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    return fig, gini
@@ -0,0 +1,145 @@
+# columnar.py - Parquet / Arrow IPC 欄式匯出
+"""供資料科學團隊使用的欄式匯出：篩選後的球員資料與所有衍生表（球隊PSI、位置套利、市場異常、OLS回歸），
+格式為 Parquet 或 Arrow IPC（檔案格式 .arrow / 串流格式 .arrows），預設以 zstd 壓縮。
+
+完整資料集每個版本只轉換一次為 Arrow 資料表 (ColumnarDataset，儀表板中跨工作階段共用)；
+篩選後的檢視直接以篩選索引的列編號在 Arrow 資料表上 take，不經過中間的 pandas 複本。
+寫出時以 record batch 為單位逐批寫入（Parquet 每批為一個 row group），串流格式可由讀取端逐批讀取。
+
+用法：
+    python -m mlb_analysis.columnar --out-dir exports
+    python -m mlb_analysis.columnar --format arrows --team NYY --war 1 10 --out-dir exports
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+
+from mlb_analysis.dataset import BUNDLED_DATA
+from mlb_analysis.export import REGRESSION_X, REGRESSION_Y, analysis_tables
+from mlb_analysis.filter_index import FilterIndex
+from mlb_analysis.lazy_imports import lazy_import
+from mlb_analysis.metrics import preprocess_data
+
+pa = lazy_import("pyarrow")
+pa_ipc = lazy_import("pyarrow.ipc")
+pq = lazy_import("pyarrow.parquet")
+
+# 格式 → (副檔名, MIME 類型)
+FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+    'arrows': ('.arrows', 'application/vnd.apache.arrow.stream'),
+}
+COMPRESSIONS = ['zstd', 'lz4', 'none']
+# 每個 record batch / row group 的列數
+BATCH_ROWS = 64 * 1024
+# 計算衍生表所需的欄位
+DERIVED_COLUMNS = ['Name', 'Team', 'Position', 'WAR', 'Salary_millions'] + REGRESSION_X + REGRESSION_Y
+
+
+class ColumnarDataset:
+    """完整資料集的 Arrow 資料表（每個資料集版本建立一次）；篩選後的檢視以列編號 take 取得"""
+
+    def __init__(self, df):
+        self.table = pa.Table.from_pandas(df, preserve_index=False)
+
+    @property
+    def num_rows(self):
+        return self.table.num_rows
+
+    def view(self, row_ids=None, columns=None):
+        """篩選後的檢視；row_ids 為 FilterIndex.query 的結果（None 表示所有列，不複製）"""
+        table = self.table if row_ids is None else self.table.take(pa.array(row_ids))
+        return table.select(columns) if columns else table
+
+
+# ============================================================
+# 寫出
+# ============================================================
+def write_table(table, sink, fmt='parquet', compression='zstd', batch_rows=BATCH_ROWS):
+    """以 batch_rows 列為一批逐批寫出 Arrow 資料表；sink 為檔案路徑或可寫入的二進位串流"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的格式: {fmt}")
+    codec = None if compression == 'none' else compression
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, table.schema, compression=codec or 'none')
+    else:
+        options = pa_ipc.IpcWriteOptions(compression=codec)
+        open_writer = pa_ipc.new_stream if fmt == 'arrows' else pa_ipc.new_file
+        writer = open_writer(sink, table.schema, options=options)
+    with writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+
+
+def export_tables(dataset, row_ids=None):
+    """依序產生 (表格名稱, Arrow 資料表)：篩選後的球員資料，以及由同一批球員計算的衍生表
+
+    衍生表只需少數欄位，只將這些欄位轉為 pandas，不複製整份篩選後的資料
+    """
+    players = dataset.view(row_ids)
+    yield 'players', players
+    columns = [col for col in dict.fromkeys(DERIVED_COLUMNS) if col in players.column_names]
+    view_df = players.select(columns).to_pandas()
+    for name, frame in analysis_tables(view_df, players=False):
+        yield name, pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def write_bundle(tables, sink, fmt='parquet', compression='zstd', batch_rows=BATCH_ROWS):
+    """將所有表格寫入一個 zip（各表已壓縮，zip 本身不再壓縮），回傳 {檔名: 列數}"""
+    ext = FORMATS[fmt][0]
+    written = {}
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for name, table in tables:
+            with zf.open(name + ext, 'w', force_zip64=True) as member:
+                write_table(table, member, fmt, compression, batch_rows)
+            written[name + ext] = table.num_rows
+    return written
+
+
+def bundle_bytes(tables, fmt='parquet', compression='zstd', batch_rows=BATCH_ROWS):
+    """write_bundle 的記憶體版本（供下載按鈕使用）"""
+    buffer = io.BytesIO()
+    write_bundle(tables, buffer, fmt, compression, batch_rows)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以 Parquet / Arrow IPC 匯出篩選後的球員資料與所有衍生表")
+    parser.add_argument("--data", default=BUNDLED_DATA, help="CSV/Parquet 資料檔")
+    parser.add_argument("--out-dir", required=True, help="輸出目錄（每個表格一個檔案）")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet",
+                        help="parquet、arrow（IPC 檔案格式）或 arrows（IPC 串流格式）")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="zstd", help="壓縮方式")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="每個 record batch / row group 的列數")
+    parser.add_argument("--team", default=None, help="只匯出這支球隊")
+    parser.add_argument("--war", nargs=2, type=float, metavar=("MIN", "MAX"), help="WAR 範圍")
+    parser.add_argument("--salary", nargs=2, type=float, metavar=("MIN", "MAX"), help="薪資範圍（百萬美元）")
+    args = parser.parse_args(argv)
+
+    from mlb_analysis.score import read_input
+
+    start = time.perf_counter()
+    df = preprocess_data(read_input(args.data))
+    ranges = {}
+    if args.war:
+        ranges['WAR'] = tuple(args.war)
+    if args.salary:
+        ranges['Salary_millions'] = tuple(args.salary)
+    row_ids = FilterIndex(df).query(ranges=ranges, team=args.team)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    ext = FORMATS[args.format][0]
+    for name, table in export_tables(ColumnarDataset(df), row_ids):
+        path = os.path.join(args.out_dir, name + ext)
+        write_table(table, path, args.format, args.compression, args.batch_rows)
+        print(f"  {name + ext}: {table.num_rows:,} 列，{os.path.getsize(path) / 1024:,.0f} KB")
+    print(f"💾 已匯出至 {args.out_dir}，共 {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+# copy_tracker.py - DataFrame 複本記憶體追蹤
+"""追蹤每次腳本執行 (rerun) 中建立的 DataFrame：記錄超過大小門檻者的來源行、大小與存活時間，
+並依來源行彙總每次互動複製了多少位元組，找出最值得優化的中間複本。
+
+以替換 pandas NDFrame.__init__ 與 __setstate__（反序列化，例如 st.cache_data 回傳的複本）的方式攔截建立，
+只有在目前執行緒有進行中的追蹤 (start_tracking) 時才記錄。
+
+大小為各資料區塊的淺層位元組數（object 欄位只計指標，不含字串本身）。
+資料區塊與先前的 DataFrame 共用同一塊底層陣列時視為檢視 (view)，不計入新配置位元組。
+"""
+import gc
+import json
+import linecache
+import os
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from pandas.core.generic import NDFrame
+
+from mlb_analysis.dataset import REPO_ROOT
+
+PANDAS_DIR = os.path.dirname(pd.__file__)
+NUMPY_DIR = os.path.dirname(np.__file__)
+
+# 小於此大小的 DataFrame 不記錄（可用環境變數 MLB_COPY_TRACK_MIN_BYTES 調整）
+MIN_BYTES_ENV = "MLB_COPY_TRACK_MIN_BYTES"
+DEFAULT_MIN_BYTES = 64 * 1024
+# 設定 MLB_COPY_LOG 時，每次追蹤的彙總結果會附加到該 JSON lines 檔
+LOG_PATH_ENV = "MLB_COPY_LOG"
+
+_local = threading.local()
+# 陣列釋放的回呼可能在持有鎖時因垃圾回收觸發，使用可重入鎖
+_lock = threading.RLock()
+_state = {'installed': False, 'init': None, 'setstate': None}
+# 已看過的底層陣列：id → weakref（陣列釋放時自動移除）
+_known_roots = {}
+
+
+def min_bytes():
+    """記錄門檻位元組數"""
+    return int(os.environ.get(MIN_BYTES_ENV, DEFAULT_MIN_BYTES))
+
+
+def log_path():
+    """JSON lines 記錄檔路徑（未設定時為 None）"""
+    return os.environ.get(LOG_PATH_ENV) or None
+
+
+# ============================================================
+# 底層陣列登記
+# ============================================================
+def _root_array(values):
+    """資料區塊最底層擁有記憶體的 ndarray（擴充型別取其內部陣列；無法判斷時為 None）"""
+    array = values if isinstance(values, np.ndarray) else None
+    if array is None:
+        for attr in ('_ndarray', '_codes', '_data'):
+            inner = getattr(values, attr, None)
+            if isinstance(inner, np.ndarray):
+                array = inner
+                break
+    if array is None:
+        return None
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _forget(key):
+    with _lock:
+        _known_roots.pop(key, None)
+
+
+def _register(root):
+    """登記底層陣列；回傳該陣列是否為第一次出現（即新配置）"""
+    key = id(root)
+    with _lock:
+        ref = _known_roots.get(key)
+        if ref is not None and ref() is root:
+            return False
+        _known_roots[key] = weakref.ref(root, lambda _, key=key: _forget(key))
+        return True
+
+
+def _frame_bytes(frame):
+    """回傳 (總位元組, 新配置位元組)，並登記該 DataFrame 的底層陣列"""
+    total = new = 0
+    for block in getattr(frame._mgr, 'blocks', ()):
+        values = block.values
+        nbytes = getattr(values, 'nbytes', 0)
+        total += nbytes
+        root = _root_array(values)
+        if root is None or _register(root):
+            new += nbytes
+    return total, new
+
+
+# ============================================================
+# 攔截 DataFrame 建立
+# ============================================================
+def _source_location():
+    """呼叫堆疊中第一個專案程式碼的位置（找不到時取第一個非 pandas/numpy 的位置）"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != __file__ and not filename.startswith((PANDAS_DIR, NUMPY_DIR, '<')):
+            if filename.startswith(REPO_ROOT) and 'site-packages' not in filename:
+                return filename, frame.f_lineno, frame.f_code.co_name
+            if fallback is None:
+                fallback = (filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return fallback or ('?', 0, '?')
+
+
+def _observe(frame, kind):
+    tracker = current_tracker()
+    if not isinstance(frame, pd.DataFrame):
+        return
+    total, new = _frame_bytes(frame)
+    if tracker is not None and total >= tracker.min_bytes:
+        tracker.record(frame, kind, total, new)
+
+
+def _tracked_init(self, data):
+    _state['init'](self, data)
+    _observe(self, 'new')
+
+
+def _tracked_setstate(self, state):
+    _state['setstate'](self, state)
+    _observe(self, 'unpickle')
+
+
+def install():
+    """替換 NDFrame 的建構與反序列化方法（只做一次），並登記目前已存在的 DataFrame"""
+    with _lock:
+        if _state['installed']:
+            return
+        _state['init'] = NDFrame.__init__
+        _state['setstate'] = NDFrame.__setstate__
+        NDFrame.__init__ = _tracked_init
+        NDFrame.__setstate__ = _tracked_setstate
+        _state['installed'] = True
+
+    # 追蹤開始前就存在的 DataFrame（例如快取資源）先登記，其檢視才不會被算成新配置
+    for obj in gc.get_objects():
+        if isinstance(obj, pd.DataFrame):
+            _frame_bytes(obj)
+
+
+def uninstall():
+    """還原 NDFrame 原本的方法"""
+    with _lock:
+        if not _state['installed']:
+            return
+        NDFrame.__init__ = _state['init']
+        NDFrame.__setstate__ = _state['setstate']
+        _state['installed'] = False
+        _known_roots.clear()
+
+
+# ============================================================
+# 追蹤
+# ============================================================
+class CopyTracker:
+    """一次腳本執行中超過門檻的 DataFrame 建立記錄"""
+
+    def __init__(self, session=None, threshold=None):
+        self.session = session
+        self.min_bytes = min_bytes() if threshold is None else threshold
+        self.records = []
+        self.labels = {}
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.finished = False
+        self._start = time.perf_counter()
+
+    def annotate(self, **labels):
+        """加上註記（例如分析模式），會寫入記錄檔"""
+        self.labels.update({k: v for k, v in labels.items() if v is not None})
+
+    def record(self, frame, kind, total, new):
+        filename, lineno, function = _source_location()
+        record = {
+            'seq': len(self.records) + 1,
+            'location': f"{os.path.relpath(filename, REPO_ROOT) if filename.startswith(REPO_ROOT) else filename}:{lineno}",
+            'function': function,
+            'code': linecache.getline(filename, lineno).strip(),
+            'kind': kind,
+            'shape': frame.shape,
+            'bytes': total,
+            'new_bytes': new,
+            'created_ms': (time.perf_counter() - self._start) * 1000,
+            'freed_ms': None,
+        }
+        self.records.append(record)
+        weakref.finalize(frame, _mark_freed, record, self._start)
+
+    def stop(self):
+        """結束追蹤（重複呼叫無效）；仍存活的 DataFrame 標記為存活超過本次執行"""
+        if not self.finished:
+            self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+            for record in self.records:
+                record['alive_at_end'] = record['freed_ms'] is None
+            self.finished = True
+            if current_tracker() is self:
+                _local.tracker = None
+        return self
+
+    def totals(self):
+        """本次執行的 DataFrame 數、總位元組與新配置位元組"""
+        return {
+            'frames': len(self.records),
+            'bytes': sum(r['bytes'] for r in self.records),
+            'new_bytes': sum(r['new_bytes'] for r in self.records),
+        }
+
+    def summary(self):
+        """依來源行彙總：建立次數、位元組、新配置位元組、平均存活時間、執行結束時仍存活的數量"""
+        summary = {}
+        for record in self.records:
+            item = summary.setdefault(record['location'], {
+                'location': record['location'], 'function': record['function'], 'code': record['code'],
+                'frames': 0, 'bytes': 0, 'new_bytes': 0, 'alive_at_end': 0, '_lifetimes': [],
+            })
+            item['frames'] += 1
+            item['bytes'] += record['bytes']
+            item['new_bytes'] += record['new_bytes']
+            if record.get('alive_at_end'):
+                item['alive_at_end'] += 1
+            elif record['freed_ms'] is not None:
+                item['_lifetimes'].append(record['freed_ms'] - record['created_ms'])
+
+        for item in summary.values():
+            lifetimes = item.pop('_lifetimes')
+            item['mean_lifetime_ms'] = sum(lifetimes) / len(lifetimes) if lifetimes else None
+        return sorted(summary.values(), key=lambda item: -item['new_bytes'])
+
+
+def _mark_freed(record, start):
+    record['freed_ms'] = (time.perf_counter() - start) * 1000
+
+
+def current_tracker():
+    """目前執行緒進行中的追蹤（沒有時為 None）"""
+    return getattr(_local, 'tracker', None)
+
+
+def start_tracking(session=None, threshold=None):
+    """在目前執行緒開始追蹤；若上一次追蹤未正常結束（例如 st.stop），先將其結束"""
+    install()
+    previous = current_tracker()
+    if previous is not None:
+        stop_tracking(previous, status='aborted')
+    tracker = CopyTracker(session=session, threshold=threshold)
+    _local.tracker = tracker
+    return tracker
+
+
+def stop_tracking(tracker=None, status='ok'):
+    """結束追蹤，寫入 JSON lines 記錄檔並回傳該次追蹤"""
+    tracker = tracker or current_tracker()
+    if tracker is None or tracker.finished:
+        return tracker
+    tracker.stop()
+
+    path = log_path()
+    if path:
+        line = json.dumps({
+            'ts': tracker.started_at,
+            'session': tracker.session,
+            'status': status,
+            **tracker.labels,
+            **tracker.totals(),
+            'locations': tracker.summary(),
+        }, ensure_ascii=False, default=str)
+        with _lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    return tracker
@@ -0,0 +1,30 @@
+# dataset.py - 資料集路徑與版本識別
+"""專案內附資料集的路徑，以及資料集版本：讓各種快取能以 (資料集版本, 參數) 作為鍵值"""
+import hashlib
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 專案內附的資料集：各命令列工具的預設輸入與黃金輸出測試的基準
+BUNDLED_DATA = os.path.join(REPO_ROOT, "data", "processed", "merged_performance_salary.csv")
+
+
+def file_version(path):
+    """以檔案路徑、大小與修改時間產生資料集版本（不需讀取內容）"""
+    stat = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def dataset_version(df):
+    """取得資料集版本；優先使用載入時記錄的版本，否則以內容雜湊計算"""
+    version = df.attrs.get("dataset_version")
+    if version:
+        return version
+
+    # 於函數內匯入：只需要路徑常數的模組（lazy_imports、profiler）不必載入 pandas
+    import pandas as pd
+
+    hashed = pd.util.hash_pandas_object(df, index=True).values
+    digest = hashlib.sha1(hashed.tobytes())
+    digest.update("|".join(map(str, df.columns)).encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,201 @@
+# export.py - Excel 完整分析報表匯出
+"""將完整分析結果匯出為多工作表的 Excel 活頁簿：
+
+    球員           所有球員與全部原創財務指標欄位
+    球隊PSI        各球隊投資組合夏普指數與管理評價
+    位置套利       各守備位置每 1 WAR 的成本
+    被低估球員     實際薪資低於 WAR 回歸預期薪資超過閾值的球員（同市場異常偵測頁的預設條件）
+    被高估球員     實際薪資高於 WAR 回歸預期薪資超過閾值的球員
+    OLS回歸        各自變數 / 依變數組合的手動 OLS 係數表與檢定統計量
+
+以 openpyxl 的 write-only 模式逐列寫入：每個工作表的列寫入後即寫到暫存檔，不在記憶體中保留儲存格物件；
+資料列以區塊轉換，匯出數百萬列時記憶體只與區塊大小有關。
+超過 Excel 單一工作表上限（1,048,576 列）的資料自動接續寫到「球員 (2)」等工作表。
+
+用法：
+    python -m mlb_analysis.export --out mlb_analysis.xlsx
+    python -m mlb_analysis.export --data data/synthetic/mlb_1m.csv --out mlb_1m.xlsx
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from mlb_analysis.dataset import BUNDLED_DATA
+from mlb_analysis.lazy_imports import lazy_import
+from mlb_analysis.metrics import (
+    analyze_positional_arbitrage, calculate_all_team_psi, calculate_salary_residuals, classify_psi,
+    manual_ols_regression, preprocess_data, salary_model_data, split_salary_anomalies,
+)
+
+openpyxl = lazy_import("openpyxl")
+openpyxl_cell = lazy_import("openpyxl.cell")
+openpyxl_styles = lazy_import("openpyxl.styles")
+openpyxl_utils = lazy_import("openpyxl.utils")
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Excel 單一工作表的列數上限（含標題列）
+EXCEL_MAX_ROWS = 1_048_576
+# 每次轉換為儲存格值的列數
+CHUNK_ROWS = 50_000
+# 市場異常：與市場異常偵測頁的預設設定相同
+ANOMALY_THRESHOLD = 30.0
+ANOMALY_MIN_WAR = 1.0
+MIN_SALARY_THRESHOLD = 1.0
+ANOMALY_COLUMNS = ['Name', 'Team', 'Position', 'WAR', 'Salary_millions']
+# OLS 回歸頁可選的自變數與依變數
+REGRESSION_X = ['WAR', 'HR', 'RBI', 'ERA']
+REGRESSION_Y = ['Salary_millions', 'value_ratio']
+# 表格名稱 → Excel 工作表名稱
+TABLE_TITLES = {
+    'players': '球員',
+    'team_psi': '球隊PSI',
+    'position_arbitrage': '位置套利',
+    'undervalued': '被低估球員',
+    'overvalued': '被高估球員',
+    'ols': 'OLS回歸',
+}
+
+
+# ============================================================
+# 工作表內容
+# ============================================================
+def salary_anomaly_lists(df):
+    """WAR→薪資 回歸的被低估 / 被高估球員（樣本不足時為兩個空表）"""
+    df_model = salary_model_data(df, MIN_SALARY_THRESHOLD)
+    if len(df_model) < 10:
+        empty = pd.DataFrame(columns=ANOMALY_COLUMNS)
+        return empty, empty
+    _, _, residuals = calculate_salary_residuals(df, df_model)
+    base = [col for col in ANOMALY_COLUMNS if col in df.columns]
+    frame = df[base].join(residuals)
+    frame = frame[(frame['WAR'] >= ANOMALY_MIN_WAR) & (frame['Salary_millions'] >= MIN_SALARY_THRESHOLD)]
+    return split_salary_anomalies(frame, ANOMALY_THRESHOLD)
+
+
+def ols_table(df):
+    """每個 (X, Y) 組合的截距與斜率各一列：係數、標準誤、t 值、P 值與模型的 R²、F、樣本數"""
+    rows = []
+    for x_col in REGRESSION_X:
+        for y_col in REGRESSION_Y:
+            if x_col not in df.columns or y_col not in df.columns:
+                continue
+            data = df[[x_col, y_col]].dropna()
+            if len(data) <= 10:
+                continue
+            result = manual_ols_regression(data[x_col].values, data[y_col].values)
+            if not result:
+                continue
+            for term, name in (('intercept', '截距 (Intercept)'), ('slope', f'斜率 ({x_col})')):
+                rows.append({
+                    '自變數 (X)': x_col, '依變數 (Y)': y_col, '變數': name,
+                    '係數 (Coef)': result[term], '標準誤 (Std Err)': result[f'std_err_{term}'],
+                    't值 (t-stat)': result[f't_{term}'], 'P值 (P>|t|)': result[f'p_{term}'],
+                    'R²': result['r_squared'], '調整後 R²': result['adj_r_squared'],
+                    'F-Statistic': result['f_value'], '樣本數 (n)': result['n'],
+                })
+    return pd.DataFrame(rows)
+
+
+def analysis_tables(df, players=True):
+    """依序產生 (表格名稱, DataFrame)；每個表寫出後即可釋放，不同時保留所有結果"""
+    if players:
+        yield 'players', df
+
+    team_psi = calculate_all_team_psi(df)
+    if not team_psi.empty:
+        team_psi = team_psi.reset_index(drop=True)
+        team_psi['管理評價'] = classify_psi(team_psi['PSI'])
+    yield 'team_psi', team_psi
+
+    pos_arbitrage = analyze_positional_arbitrage(df)
+    yield 'position_arbitrage', pos_arbitrage if pos_arbitrage is not None else pd.DataFrame()
+
+    undervalued, overvalued = salary_anomaly_lists(df)
+    yield 'undervalued', undervalued
+    yield 'overvalued', overvalued
+
+    yield 'ols', ols_table(df)
+
+
+# ============================================================
+# 寫入
+# ============================================================
+def _cell_rows(chunk):
+    """DataFrame 區塊 → 可寫入的列（NaN 轉為空白儲存格、numpy 型別轉為 Python 型別）"""
+    return chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _header(ws, columns):
+    font = openpyxl_styles.Font(bold=True)
+    cells = []
+    for i, name in enumerate(columns, start=1):
+        cell = openpyxl_cell.WriteOnlyCell(ws, value=str(name))
+        cell.font = font
+        cells.append(cell)
+        ws.column_dimensions[openpyxl_utils.get_column_letter(i)].width = max(10, min(40, len(str(name)) * 1.6))
+    ws.freeze_panes = 'A2'
+    ws.append(cells)
+
+
+def write_sheet(wb, title, frame, max_rows=EXCEL_MAX_ROWS, chunk_rows=CHUNK_ROWS, progress=None):
+    """寫入一個 DataFrame；超過工作表列數上限時接續寫到「名稱 (2)」等工作表，回傳寫入的工作表名稱
+
+    指定 progress 時每寫完一個區塊呼叫 progress(已寫入列數)
+    """
+    per_sheet = max_rows - 1
+    titles = []
+    for part, start in enumerate(range(0, max(len(frame), 1), per_sheet), start=1):
+        ws = wb.create_sheet(title if part == 1 else f"{title} ({part})")
+        titles.append(ws.title)
+        _header(ws, frame.columns)
+        stop = min(start + per_sheet, len(frame))
+        for chunk_start in range(start, stop, chunk_rows):
+            chunk_stop = min(chunk_start + chunk_rows, stop)
+            for row in _cell_rows(frame.iloc[chunk_start:chunk_stop]):
+                ws.append(row)
+            if progress is not None:
+                progress(chunk_stop)
+    return titles
+
+
+def write_workbook(df, target, progress=None):
+    """將分析結果寫入 Excel 活頁簿（target 為檔案路徑或可寫入的二進位串流），回傳 {工作表名稱: 資料列數}
+
+    指定 progress 時每寫完一個區塊呼叫 progress(表格名稱, 已寫入列數, 該表列數)
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    written = {}
+    for name, frame in analysis_tables(df):
+        sheet_progress = None if progress is None else (
+            lambda rows, name=name, total=len(frame): progress(name, rows, total))
+        titles = write_sheet(wb, TABLE_TITLES[name], frame, progress=sheet_progress)
+        rows = len(frame)
+        for name in titles:
+            written[name] = min(rows, EXCEL_MAX_ROWS - 1)
+            rows -= written[name]
+    wb.save(target)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="匯出完整分析結果為多工作表 Excel 活頁簿")
+    parser.add_argument("--data", default=BUNDLED_DATA, help="CSV/Parquet 資料檔")
+    parser.add_argument("--out", required=True, help="輸出的 .xlsx 檔案")
+    args = parser.parse_args(argv)
+
+    from mlb_analysis.score import read_input
+
+    start = time.perf_counter()
+    df = preprocess_data(read_input(args.data))
+    written = write_workbook(df, args.out)
+    for name, rows in written.items():
+        print(f"  {name}: {rows:,} 列")
+    print(f"💾 已匯出 {len(written)} 個工作表，共 {time.perf_counter() - start:.1f}s → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
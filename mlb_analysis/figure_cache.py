@@ -0,0 +1,113 @@
+# figure_cache.py - Plotly 圖表快取
+"""以 (資料集版本, 圖表名稱, 篩選參數) 為鍵值，快取序列化後的圖表 JSON"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from mlb_analysis.instrumentation import span
+
+
+def normalize_params(value):
+    """將篩選參數轉為穩定、可序列化的形式（排序集合、統一數值型別）"""
+    if isinstance(value, dict):
+        return {str(k): normalize_params(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (set, frozenset)):
+        return sorted(normalize_params(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [normalize_params(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        # 避免滑桿浮點誤差讓相同的篩選條件產生不同鍵值
+        return round(value, 6)
+    return value
+
+
+def make_key(dataset_version, chart, params=None):
+    """產生圖表快取鍵值"""
+    payload = json.dumps(normalize_params(params or {}), sort_keys=True, ensure_ascii=False)
+    raw = f"{dataset_version}|{chart}|{payload}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class FigureCache:
+    """依位元組大小進行 LRU 淘汰的圖表快取（多個工作階段共用，執行緒安全）"""
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """取得快取的圖表 JSON，找不到時回傳 None"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        """存入圖表 JSON，超過容量時淘汰最久未使用的圖表"""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+
+            self._entries[key] = payload
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_build(self, dataset_version, chart, params, builder):
+        """取得快取圖表；未命中時呼叫 builder() 建立並存入快取"""
+        key = make_key(dataset_version, chart, params)
+        payload = self.get(key)
+
+        if payload is None:
+            with span(f"figure:{chart}", cache='miss'):
+                fig = builder()
+                if fig is None:
+                    return None
+                payload = fig.to_json()
+                self.put(key, payload)
+                return fig
+
+        # plotly 只在命中時才需要反序列化，延後載入以免拖慢冷啟動
+        with span(f"figure:{chart}", cache='hit'):
+            import plotly.io as pio
+            return pio.from_json(payload)
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """回傳快取統計資訊"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,117 @@
+# filter_index.py - 篩選索引
+"""每個資料集版本建立一次的篩選索引：數值欄位排序排列 + 各球隊列編號位元圖"""
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """以二分搜尋與位元圖交集回答「範圍 + 球隊」篩選，結果為列編號陣列（不複製資料）"""
+
+    def __init__(self, df, range_cols=('WAR', 'Salary_millions'), team_col='Team'):
+        self.n_rows = len(df)
+        self.team_col = team_col
+
+        # 數值欄位：原始值、排序後的值與對應的列編號排列
+        self._values = {}
+        self._sorted_values = {}
+        self._order = {}
+        for col in range_cols:
+            if col in df.columns:
+                values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+                order = np.argsort(values, kind='stable')
+                self._values[col] = values
+                self._sorted_values[col] = values[order]
+                self._order[col] = order
+
+        # 球隊：壓縮位元圖（成員判斷）與遞增列編號（列舉）
+        self._team_bitmaps = {}
+        self._team_rows = {}
+        if team_col in df.columns:
+            codes, teams = pd.factorize(df[team_col])
+            for code, team in enumerate(teams):
+                mask = codes == code
+                self._team_bitmaps[team] = np.packbits(mask)
+                self._team_rows[team] = np.flatnonzero(mask)
+
+    @property
+    def teams(self):
+        """索引中的所有球隊"""
+        return list(self._team_rows)
+
+    def _team_contains(self, team, row_ids):
+        """以位元圖判斷列編號是否屬於指定球隊"""
+        bitmap = self._team_bitmaps.get(team)
+        if bitmap is None:
+            return np.zeros(len(row_ids), dtype=bool)
+        return ((bitmap[row_ids >> 3] >> (7 - (row_ids & 7))) & 1).astype(bool)
+
+    def _range_conditions(self, ranges):
+        """以二分搜尋把範圍條件轉為排序後的區段，略過涵蓋所有列的條件"""
+        conditions = []
+        for col, (low, high) in (ranges or {}).items():
+            if col not in self._sorted_values:
+                raise KeyError(f"篩選索引中沒有欄位: {col}")
+
+            sorted_values = self._sorted_values[col]
+            start = 0 if low is None else int(np.searchsorted(sorted_values, low, side='left'))
+            if high is None:
+                # 只有下限時仍需排除 NaN（NaN 排序在最後）
+                stop = int(np.searchsorted(sorted_values, np.inf, side='right'))
+            else:
+                stop = int(np.searchsorted(sorted_values, high, side='right'))
+
+            # 範圍涵蓋所有列時不構成限制
+            if start == 0 and stop == self.n_rows:
+                continue
+            conditions.append((stop - start, col, start, stop, low, high))
+        return conditions
+
+    def restricts(self, ranges):
+        """範圍條件是否真的排除了部分資料列（只需二分搜尋）"""
+        return bool(self._range_conditions(ranges))
+
+    def query(self, ranges=None, team=None):
+        """回傳符合條件的列編號（依原始順序）；回傳 None 代表所有列皆符合
+
+        ranges: {欄位: (下限, 上限)}，上下限為 None 表示不限制，邊界皆包含
+        team: 球隊名稱，None 表示不限制
+        """
+        conditions = self._range_conditions(ranges)
+
+        if not conditions and team is None:
+            return None
+
+        # 以最小的候選集合為起點，再用其餘條件過濾
+        team_rows = None
+        if team is not None:
+            team_rows = self._team_rows.get(team, np.empty(0, dtype=np.intp))
+
+        conditions.sort(key=lambda c: c[0])
+        if team_rows is not None and (not conditions or len(team_rows) <= conditions[0][0]):
+            row_ids = team_rows
+            remaining = conditions
+            check_team = False
+        else:
+            _, col, start, stop, _, _ = conditions[0]
+            row_ids = self._order[col][start:stop]
+            remaining = conditions[1:]
+            check_team = team_rows is not None
+
+        for _, col, _, _, low, high in remaining:
+            values = self._values[col][row_ids]
+            keep = ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            row_ids = row_ids[keep]
+
+        if check_team:
+            row_ids = row_ids[self._team_contains(team, row_ids)]
+
+        return np.sort(row_ids)
+
+    def select(self, df, ranges=None, team=None):
+        """依篩選條件取出資料列；沒有任何限制時直接回傳原資料（不複製）"""
+        row_ids = self.query(ranges=ranges, team=team)
+        return df if row_ids is None else df.take(row_ids)
@@ -0,0 +1,289 @@
+# golden.py - 黃金輸出比對
+"""為參考資料集保存所有衍生欄位與表格的快照（WVPI/RAV/MERI 與其分類、球隊 PSI 與管理評價、SEI、
+OLS 係數表、WVPI PCA 權重），並在數值容許誤差內檢查目前的實作是否產生相同結果，
+讓向量化改寫等效能優化可以放心合併。
+
+快照以 CSV 存放在 data/golden/<資料集>/，浮點數以完整精度寫出，差異可直接在 git 中檢視。
+
+用法：
+    python -m mlb_analysis.golden check
+    python -m mlb_analysis.golden snapshot            # 刻意改變數值時重新產生快照
+    python -m mlb_analysis.golden check --rtol 1e-6 --datasets bundled
+"""
+import argparse
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis import bench, synthetic
+from mlb_analysis.dataset import BUNDLED_DATA, REPO_ROOT
+from mlb_analysis.metrics import (
+    calculate_all_team_psi, calculate_gini, calculate_sei, calculate_wvpi_pca_weights,
+    classify_psi, manual_ols_regression, preprocess_data
+)
+
+GOLDEN_DIR = os.path.join(REPO_ROOT, "data", "golden")
+
+# 預設容許誤差：只容許浮點運算順序造成的差異
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-12
+
+# 與儀表板「進階策略分析」相同的 OLS 變數組合（資料中沒有的欄位略過）
+OLS_PAIRS = [(x, y) for x in ['WAR', 'HR', 'RBI', 'ERA'] for y in ['Salary_millions', 'value_ratio']]
+OLS_FIELDS = [
+    'intercept', 'slope', 'std_err_intercept', 'std_err_slope', 't_intercept', 't_slope',
+    'p_intercept', 'p_slope', 'r_squared', 'adj_r_squared', 'f_value', 'n'
+]
+# 衍生欄位快照中保留的識別欄位
+ID_COLUMNS = ['Name', 'Team']
+
+
+# ============================================================
+# 參考資料集
+# ============================================================
+def _bundled():
+    return pd.read_csv(BUNDLED_DATA)
+
+
+def _synthetic():
+    # 以內附資料為分布來源的固定種子合成資料，涵蓋更多球隊與極端值
+    return synthetic.generate_frame(2000, n_seasons=2, seed=20240519)
+
+
+REFERENCE_DATASETS = {
+    'bundled': _bundled,
+    'synthetic': _synthetic,
+}
+
+
+# ============================================================
+# 產生輸出
+# ============================================================
+def derived_columns(raw, processed):
+    """預處理新增或改寫的欄位"""
+    columns = []
+    for col in processed.columns:
+        if col not in raw.columns:
+            columns.append(col)
+        elif not processed[col].equals(raw.loc[processed.index, col]):
+            columns.append(col)
+    return columns
+
+
+def ols_table(df):
+    """每組 (X, Y) 的 OLS 統計量"""
+    rows = []
+    for x_col, y_col in OLS_PAIRS:
+        if x_col not in df.columns or y_col not in df.columns:
+            continue
+        data_reg = df[[x_col, y_col]].dropna()
+        if len(data_reg) <= 10:
+            continue
+        result = manual_ols_regression(data_reg[x_col].values, data_reg[y_col].values)
+        if result is None:
+            continue
+        rows.append({'x': x_col, 'y': y_col, **{field: result[field] for field in OLS_FIELDS}})
+    return pd.DataFrame(rows, columns=['x', 'y'] + OLS_FIELDS)
+
+
+def compute_outputs(raw):
+    """計算一個資料集的所有黃金輸出，回傳 {名稱: DataFrame}"""
+    processed = preprocess_data(raw.copy())
+    outputs = {}
+
+    columns = [col for col in ID_COLUMNS if col in processed.columns]
+    columns += [col for col in derived_columns(raw, processed) if col not in columns]
+    derived = processed[columns].copy()
+    for col in derived.columns:
+        if isinstance(derived[col].dtype, pd.CategoricalDtype):
+            derived[col] = derived[col].astype(object)
+    outputs['derived_columns'] = derived
+
+    if 'WAR' in processed.columns and 'Salary_millions' in processed.columns:
+        team_psi = calculate_all_team_psi(processed).reset_index(drop=True)
+        team_psi['管理評價'] = classify_psi(team_psi['PSI'])
+        outputs['team_psi'] = team_psi
+
+        correlation, gini, sei = calculate_sei(processed)
+        outputs['sei'] = pd.DataFrame([{
+            'correlation': correlation, 'gini': gini, 'sei': sei,
+            'salary_gini': calculate_gini(processed['Salary_millions']),
+        }])
+
+        outputs['ols'] = ols_table(processed)
+
+    pca_weights, pca_correlation = calculate_wvpi_pca_weights(processed)
+    if pca_weights is not None:
+        outputs['wvpi_pca'] = pd.DataFrame({'weight': pca_weights, 'correlation': pca_correlation})
+    return outputs
+
+
+# ============================================================
+# 讀寫快照
+# ============================================================
+def _read(path):
+    """讀回快照；空字串保留為空字串，與寫出前的字串欄位一致"""
+    return pd.read_csv(path, index_col=0, keep_default_na=False, na_values=[''])
+
+
+def _read_roundtrip(frame):
+    """將表格寫成 CSV 再讀回"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, float_format='%.17g')
+    buffer.seek(0)
+    return _read(buffer)
+
+
+def snapshot(datasets=None, golden_dir=GOLDEN_DIR):
+    """重新產生黃金快照，回傳寫出的檔案路徑"""
+    written = []
+    for name in datasets or REFERENCE_DATASETS:
+        outputs = compute_outputs(REFERENCE_DATASETS[name]())
+        out_dir = os.path.join(golden_dir, name)
+        os.makedirs(out_dir, exist_ok=True)
+
+        for table, frame in outputs.items():
+            path = os.path.join(out_dir, f"{table}.csv")
+            frame.to_csv(path, float_format='%.17g')
+            written.append(path)
+
+        manifest = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': bench._git('rev-parse', 'HEAD'),
+            'versions': bench.collect_meta({})['versions'],
+            'tables': {table: list(frame.shape) for table, frame in outputs.items()},
+        }
+        with open(os.path.join(out_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        written.append(os.path.join(out_dir, "manifest.json"))
+    return written
+
+
+def compare_frames(expected, actual, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """比較兩個表格，回傳差異說明清單（空清單代表相同）"""
+    problems = []
+    if list(expected.columns) != list(actual.columns):
+        missing = [c for c in expected.columns if c not in actual.columns]
+        extra = [c for c in actual.columns if c not in expected.columns]
+        problems.append(f"欄位不同（缺少 {missing}，多出 {extra}）" if missing or extra else "欄位順序不同")
+    if len(expected) != len(actual):
+        problems.append(f"列數不同：{len(expected)} → {len(actual)}")
+        return problems
+    if not np.array_equal(expected.index.astype(str), actual.index.astype(str)):
+        problems.append("列索引不同（列順序或篩選結果改變）")
+        return problems
+
+    for col in expected.columns:
+        if col not in actual.columns:
+            continue
+        exp = expected[col]
+        act = actual[col]
+        exp_numeric = pd.api.types.is_numeric_dtype(exp) and not pd.api.types.is_bool_dtype(exp)
+        act_numeric = pd.api.types.is_numeric_dtype(act) and not pd.api.types.is_bool_dtype(act)
+
+        if exp_numeric and act_numeric:
+            exp_values = exp.to_numpy(dtype=float)
+            act_values = act.to_numpy(dtype=float)
+            mismatch = ~np.isclose(act_values, exp_values, rtol=rtol, atol=atol, equal_nan=True)
+            if mismatch.any():
+                diff = np.abs(act_values - exp_values)[mismatch]
+                first = np.flatnonzero(mismatch)[0]
+                problems.append(
+                    f"{col}: {mismatch.sum()} 列超出容許誤差（最大差 {np.nanmax(diff) if np.isfinite(diff).any() else 'NaN'}；"
+                    f"第一筆 {expected.index[first]}: {float(exp_values[first])!r} → {float(act_values[first])!r}）"
+                )
+        else:
+            exp_text = exp.astype(object).where(exp.notna(), None).astype(str).to_numpy()
+            act_text = act.astype(object).where(act.notna(), None).astype(str).to_numpy()
+            mismatch = exp_text != act_text
+            if mismatch.any():
+                first = np.flatnonzero(mismatch)[0]
+                problems.append(
+                    f"{col}: {mismatch.sum()} 列不同（第一筆 {expected.index[first]}: "
+                    f"{exp_text[first]!r} → {act_text[first]!r}）"
+                )
+    return problems
+
+
+def check(datasets=None, golden_dir=GOLDEN_DIR, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """以目前的實作重新計算並與快照比較，回傳 {(資料集, 表格): 差異說明清單}"""
+    report = {}
+    for name in datasets or REFERENCE_DATASETS:
+        out_dir = os.path.join(golden_dir, name)
+        if not os.path.isdir(out_dir):
+            report[(name, '*')] = [f"找不到快照目錄 {out_dir}，請先執行 snapshot"]
+            continue
+
+        outputs = compute_outputs(REFERENCE_DATASETS[name]())
+        expected_tables = sorted(f[:-len('.csv')] for f in os.listdir(out_dir) if f.endswith('.csv'))
+        for table in sorted(set(expected_tables) | set(outputs)):
+            if table not in outputs:
+                report[(name, table)] = ["目前的實作沒有產生此表格"]
+                continue
+            if table not in expected_tables:
+                report[(name, table)] = ["快照中沒有此表格（新增的輸出請重新執行 snapshot）"]
+                continue
+            # 經過 CSV 來回轉換後再比較，兩邊的型別推斷一致
+            actual = _read_roundtrip(outputs[table])
+            expected = _read(os.path.join(out_dir, f"{table}.csv"))
+            report[(name, table)] = compare_frames(expected, actual, rtol, atol)
+    return report
+
+
+# ============================================================
+# 命令列
+# ============================================================
+def _snapshot_command(args):
+    for path in snapshot(args.datasets, args.golden_dir):
+        print(f"💾 {os.path.relpath(path, REPO_ROOT)}")
+    return 0
+
+
+def _check_command(args):
+    report = check(args.datasets, args.golden_dir, args.rtol, args.atol)
+    failures = 0
+    for (dataset, table), problems in report.items():
+        if problems:
+            failures += 1
+            print(f"❌ {dataset}/{table}")
+            for problem in problems:
+                print(f"   {problem}")
+        else:
+            print(f"✅ {dataset}/{table}")
+
+    if failures:
+        print(f"\n❌ {failures} 個表格與黃金輸出不同（rtol={args.rtol}, atol={args.atol}）")
+        return 1
+    print("\n✅ 所有表格與黃金輸出相符")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="衍生欄位與表格的黃金輸出比對")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("--datasets", nargs="+", choices=list(REFERENCE_DATASETS), help="只處理指定資料集")
+        sub.add_argument("--golden-dir", default=GOLDEN_DIR, help="快照目錄")
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="重新產生黃金快照")
+    add_common(snapshot_parser)
+    snapshot_parser.set_defaults(func=_snapshot_command)
+
+    check_parser = subparsers.add_parser("check", help="檢查目前實作是否與快照相符，不符時結束碼為 1")
+    add_common(check_parser)
+    check_parser.add_argument("--rtol", type=float, default=DEFAULT_RTOL, help="相對容許誤差")
+    check_parser.add_argument("--atol", type=float, default=DEFAULT_ATOL, help="絕對容許誤差")
+    check_parser.set_defaults(func=_check_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# instrumentation.py - 分段計時與記憶體量測
+"""以具名區段 (span) 記錄資料載入、各指標、各分析模式與各圖表建立的牆鐘時間、CPU 時間與記憶體配置，
+結果可顯示在儀表板側邊欄，或以 JSON lines 寫入記錄檔。
+
+只有在目前執行緒有進行中的量測 (start_run) 時才會記錄；未啟用時 span 幾乎沒有額外成本。
+記憶體以 tracemalloc 量測，多個工作階段同時量測時數值會互相影響。
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# 設定 MLB_INSTRUMENT_LOG 時，所有工作階段的量測結果都會附加到該 JSON lines 檔
+LOG_PATH_ENV = "MLB_INSTRUMENT_LOG"
+# 設為 0 時不以 tracemalloc 量測記憶體（只需要時間且不希望拖慢執行時使用）
+MEMORY_ENV = "MLB_INSTRUMENT_MEMORY"
+
+_local = threading.local()
+_lock = threading.Lock()
+_state = {'active_runs': 0, 'started_tracemalloc': False}
+
+
+def log_path():
+    """JSON lines 記錄檔路徑（未設定時為 None）"""
+    return os.environ.get(LOG_PATH_ENV) or None
+
+
+def memory_enabled():
+    """是否量測記憶體（環境變數 MLB_INSTRUMENT_MEMORY=0 時關閉）"""
+    return os.environ.get(MEMORY_ENV, "1") != "0"
+
+
+class Span:
+    """單一量測區段；以 with 使用，或呼叫 finish() 手動結束"""
+
+    def __init__(self, run, name, attrs):
+        self.run = run
+        self.name = name
+        self.attrs = attrs
+        self.parent = run.stack[-1] if run.stack else None
+        self.depth = len(run.stack)
+        self.seq = run.next_seq()
+        self.finished = False
+        self.max_peak = 0
+
+        if run.track_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.max_peak = max(self.parent.max_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+            self.max_peak = current
+        else:
+            self.start_memory = None
+
+        run.stack.append(self)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.thread_time()
+
+    def finish(self, status='ok'):
+        """結束區段並記錄結果（重複呼叫無效）"""
+        if self.finished:
+            return
+        # 提早結束的子區段（例如 st.stop 中斷）先行結束
+        if self in self.run.stack:
+            while self.run.stack[-1] is not self:
+                self.run.stack[-1].finish(status='aborted')
+
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.thread_time() - self.start_cpu
+        self.finished = True
+
+        alloc_peak = alloc_net = None
+        if self.start_memory is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(self.max_peak, peak)
+            alloc_peak = peak - self.start_memory
+            alloc_net = current - self.start_memory
+            if self.parent is not None:
+                self.parent.max_peak = max(self.parent.max_peak, peak)
+
+        if self.run.stack and self.run.stack[-1] is self:
+            self.run.stack.pop()
+
+        self.run.records.append({
+            'seq': self.seq,
+            'name': self.name,
+            'parent': self.parent.name if self.parent is not None else None,
+            'depth': self.depth,
+            'wall_ms': wall * 1000,
+            'cpu_ms': cpu * 1000,
+            'alloc_peak_bytes': alloc_peak,
+            'alloc_net_bytes': alloc_net,
+            'status': status,
+            'attrs': self.attrs,
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(status='ok' if exc_type is None else exc_type.__name__)
+        return False
+
+
+class _NullSpan:
+    """未啟用量測時使用的空區段"""
+
+    def finish(self, status='ok'):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Run:
+    """一次腳本執行（一次 Streamlit rerun）的所有量測區段"""
+
+    def __init__(self, session=None, track_memory=True):
+        self.session = session
+        self.track_memory = track_memory
+        self.stack = []
+        self.records = []
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.attrs = {}
+        self.finished = False
+        self._seq = 0
+
+    def next_seq(self):
+        """區段開始順序（記錄依結束順序寫入，顯示時可依此排序）"""
+        self._seq += 1
+        return self._seq
+
+
+def current_run():
+    """目前執行緒進行中的量測（沒有時為 None）"""
+    return getattr(_local, 'run', None)
+
+
+def start_run(session=None, track_memory=True, **attrs):
+    """開始一次量測；若同一執行緒上一次量測未正常結束（例如 st.stop），先將其結束"""
+    previous = current_run()
+    if previous is not None:
+        finish_run(status='aborted')
+
+    run = Run(session=session, track_memory=track_memory)
+    run.attrs.update(attrs)
+    _local.run = run
+
+    if track_memory:
+        with _lock:
+            _state['active_runs'] += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _state['started_tracemalloc'] = True
+    return run
+
+
+def annotate_run(**attrs):
+    """為目前執行緒的量測加上屬性（例如分析模式），會寫入每一行 JSON 記錄"""
+    run = current_run()
+    if run is not None:
+        run.attrs.update(attrs)
+
+
+def finish_run(status='ok', run=None):
+    """結束量測（預設為目前執行緒的量測），寫入 JSON lines 記錄檔並回傳該次量測
+
+    Streamlit 每次 rerun 可能在不同執行緒執行，被 st.stop 中斷的量測可由呼叫端傳入 run 補結束。
+    """
+    if run is None:
+        run = current_run()
+    if run is None or run.finished:
+        return run
+    while run.stack:
+        run.stack[-1].finish(status='aborted' if status != 'ok' else 'ok')
+    run.finished = True
+    if current_run() is run:
+        _local.run = None
+
+    if run.track_memory:
+        with _lock:
+            _state['active_runs'] -= 1
+            # 沒有其他進行中的量測時停止 tracemalloc，避免拖慢一般使用
+            if _state['active_runs'] == 0 and _state['started_tracemalloc']:
+                tracemalloc.stop()
+                _state['started_tracemalloc'] = False
+
+    path = log_path()
+    if path:
+        write_jsonl(run, path, status)
+    return run
+
+
+def write_jsonl(run, path, status='ok'):
+    """把一次量測的每個區段寫成一行 JSON"""
+    lines = []
+    for record in run.records:
+        lines.append(json.dumps({
+            'ts': run.started_at,
+            'session': run.session,
+            'run_status': status,
+            **run.attrs,
+            **record,
+        }, ensure_ascii=False, default=str))
+    if not lines:
+        return
+    with _lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def span(name, **attrs):
+    """建立具名量測區段；目前執行緒沒有進行中的量測時回傳空區段"""
+    run = current_run()
+    if run is None:
+        return NULL_SPAN
+    return Span(run, name, attrs)
+
+
+def traced(name=None):
+    """裝飾器：以函數名稱（或指定名稱）建立量測區段"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_run() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedModule:
+    """模組代理：呼叫模組中的函數時建立量測區段（例如 figure:px.scatter）"""
+
+    def __init__(self, module, prefix):
+        self._module = module
+        self._prefix = prefix
+
+    def __getattr__(self, attr):
+        value = getattr(self._module, attr)
+        if not callable(value) or isinstance(value, type):
+            return value
+        return traced(f"{self._prefix}.{attr}")(value)
+
+
+def summarize(records, depth=None):
+    """依區段名稱彙總牆鐘時間、CPU 時間與記憶體峰值（可只取指定深度）"""
+    summary = {}
+    for record in records:
+        if depth is not None and record['depth'] != depth:
+            continue
+        item = summary.setdefault(record['name'], {
+            'name': record['name'], 'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'alloc_peak_bytes': None
+        })
+        item['calls'] += 1
+        item['wall_ms'] += record['wall_ms']
+        item['cpu_ms'] += record['cpu_ms']
+        if record['alloc_peak_bytes'] is not None:
+            item['alloc_peak_bytes'] = max(item['alloc_peak_bytes'] or 0, record['alloc_peak_bytes'])
+    return sorted(summary.values(), key=lambda item: -item['wall_ms'])
@@ -0,0 +1,570 @@
+# jobs.py - 長時間分析的背景工作佇列
+"""耗時的分析（多球季置換檢定與拔靴、完整 Excel 報表匯出）不在 Streamlit 的重新執行中計算，
+而是送入以 SQLite 保存的工作佇列，由背景工作者執行；儀表板只讀取工作的狀態、進度與結果。
+
+    jobs 資料表    每項工作的種類、參數、資料集版本、狀態、進度與訊息、部分結果與最終結果（pickle）
+    files/         產生檔案的工作（例如 Excel 報表）的輸出檔，以工作編號命名
+
+狀態為 queued / running / done / failed / cancelled。工作與結果存放在資料庫中，不屬於任何工作階段：
+頁面重新整理或切換後仍可看到進度，相同種類、參數與資料集版本的工作只計算一次，之後直接取用已完成的結果。
+
+工作者預設為儀表板行程內的背景執行緒（所有工作階段共用）；多個 Streamlit worker 或想把計算移出伺服器行程時，
+設定 MLB_JOBS_WORKER=0 並另外執行 python -m mlb_analysis.jobs worker（可同時執行多個，以資料庫交易認領工作）。
+工作者啟動時，同一台主機上已結束的工作者留下的執行中工作會重新排入佇列。
+
+資料庫位置預設為 .jobs/jobs.sqlite3，可用環境變數 MLB_JOBS_DB 指定（多個行程須指向同一個本機檔案）。
+
+用法：
+    python -m mlb_analysis.jobs submit permutation --set n_permutations=50000 --set n_bootstrap=10000
+    python -m mlb_analysis.jobs worker
+    python -m mlb_analysis.jobs list
+    python -m mlb_analysis.jobs cancel 3
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+import pandas as pd
+
+from mlb_analysis import shared_cache
+from mlb_analysis.dataset import BUNDLED_DATA, REPO_ROOT, file_version
+from mlb_analysis.export import XLSX_MIME, write_workbook
+from mlb_analysis.metrics import preprocess_data
+from mlb_analysis.parallel import GroupExecutor
+from mlb_analysis.permutation import check_counts, permutation_test, summary_table
+
+logger = logging.getLogger(__name__)
+
+DB_ENV = "MLB_JOBS_DB"
+WORKER_ENV = "MLB_JOBS_WORKER"
+DEFAULT_DB = os.path.join(REPO_ROOT, ".jobs", "jobs.sqlite3")
+# 佇列空閒時工作者檢查新工作的間隔（秒）
+POLL_SECONDS = 2.0
+# 進度寫入資料庫的最短間隔（秒）；附帶部分結果或完成時一律寫入
+PROGRESS_SECONDS = 0.5
+# 保留的已結束工作數（超過時刪除最早結束的工作與其輸出檔）
+MAX_FINISHED = 50
+
+STATES = {
+    'queued': '排隊中',
+    'running': '執行中',
+    'done': '已完成',
+    'failed': '失敗',
+    'cancelled': '已取消',
+}
+ACTIVE_STATES = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    data_path TEXT NOT NULL,
+    dataset_version TEXT NOT NULL,
+    state TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    partial BLOB,
+    result BLOB,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+# 不含結果欄位（BLOB）的資料列
+SUMMARY_COLUMNS = ['id', 'kind', 'params', 'data_path', 'dataset_version', 'state', 'progress', 'message',
+                   'error', 'cancel_requested', 'worker', 'created_at', 'started_at', 'finished_at']
+
+
+def db_path():
+    return os.environ.get(DB_ENV) or DEFAULT_DB
+
+
+def in_process_worker():
+    """儀表板行程內是否執行工作者（預設啟用）"""
+    return os.environ.get(WORKER_ENV, "1") != "0"
+
+
+def job_key(kind, params, dataset_version):
+    """同種類、同參數、同資料集版本的工作共用結果"""
+    raw = json.dumps({'kind': kind, 'params': params, 'version': dataset_version}, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# ============================================================
+# 工作種類
+# ============================================================
+class JobCancelled(Exception):
+    """工作執行中被取消（由 JobContext.progress 拋出）"""
+
+
+class JobKind:
+    """登記的工作種類：名稱、顯示名稱、工作函數，以及送出時檢查參數的 validate(params)"""
+
+    def __init__(self, name, label, fn, validate=None):
+        self.name = name
+        self.label = label
+        self.fn = fn
+        self.validate = validate
+        # 工作參數的預設值（fn 在 ctx、df 之後的參數）
+        parameters = list(inspect.signature(fn).parameters.values())[2:]
+        self.defaults = {param.name: param.default for param in parameters}
+
+    def params(self, params=None):
+        """補上預設值的完整參數（相同的有效參數得到相同的工作鍵值）"""
+        params = params or {}
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"{self.name} 沒有參數: {', '.join(sorted(unknown))}")
+        params = {**self.defaults, **params}
+        if self.validate is not None:
+            self.validate(params)
+        return params
+
+
+JOB_KINDS = {}
+
+
+def register(name, label, validate=None):
+    """登記工作種類；工作函數為 fn(ctx, df, **params)，回傳值須可被 pickle。
+    validate(params) 在送出時檢查參數，無效時引發 ValueError，工作不會排入佇列"""
+    def decorator(fn):
+        JOB_KINDS[name] = JobKind(name, label, fn, validate)
+        return fn
+    return decorator
+
+
+class JobContext:
+    """傳給工作函數的執行環境：回報進度與部分結果、取得共用的行程池與輸出檔路徑"""
+
+    def __init__(self, queue, job_id, executor):
+        self.queue = queue
+        self.job_id = job_id
+        self.executor = executor
+        self._last_report = 0.0
+
+    def progress(self, fraction, message=None, partial=None):
+        """回報進度 (0–1) 與訊息；partial 為目前為止的部分結果。工作已被要求取消時拋出 JobCancelled"""
+        now = time.monotonic()
+        if partial is None and fraction < 1 and now - self._last_report < PROGRESS_SECONDS:
+            return
+        self._last_report = now
+        if self.queue._report(self.job_id, fraction, message, partial):
+            raise JobCancelled()
+
+    def output_path(self, suffix):
+        """此工作的輸出檔路徑（刪除工作時一併刪除）"""
+        return self.queue.output_path(self.job_id, suffix)
+
+
+@register('permutation', '各球季置換檢定與拔靴信賴區間',
+          validate=lambda params: check_counts(params['n_permutations'], params['n_bootstrap']))
+def permutation_job(ctx, df, n_permutations=10000, n_bootstrap=2000, by_season=True, seed=0):
+    """每個球季分別執行置換檢定與拔靴；每完成一個球季即更新部分結果"""
+    if by_season and 'Season' in df.columns:
+        groups = list(df.groupby('Season', sort=True))
+    else:
+        groups = [('全部', df)]
+    tables = []
+    for i, (season, frame) in enumerate(groups):
+        def on_blocks(done, total, i=i, season=season):
+            ctx.progress((i + done / total) / len(groups), f"{season} 球季：{done}/{total} 個區塊")
+
+        result = permutation_test(frame, n_permutations, n_bootstrap, seed=seed, executor=ctx.executor,
+                                  progress=on_blocks)
+        table = summary_table(result)
+        table.insert(0, '球季', season)
+        table.insert(1, '球員數', result['n'])
+        tables.append(table)
+        ctx.progress((i + 1) / len(groups), f"完成 {i + 1}/{len(groups)} 個球季",
+                     partial=pd.concat(tables, ignore_index=True))
+    return pd.concat(tables, ignore_index=True)
+
+
+@register('excel', 'Excel 完整分析報表（全部球員）')
+def excel_job(ctx, df):
+    """寫出多工作表 Excel 活頁簿到輸出檔；進度以球員工作表的已寫入列數計算"""
+    path = ctx.output_path('.xlsx')
+
+    def on_rows(name, rows, total):
+        if name == 'players':
+            ctx.progress(0.9 * rows / max(total, 1), f"球員工作表：{rows:,}/{total:,} 列")
+        else:
+            ctx.progress(0.9, f"衍生表：{name}")
+
+    sheets = write_workbook(df, path, progress=on_rows)
+    return {'path': path, 'mime': XLSX_MIME, 'file_name': 'mlb_salary_analysis.xlsx', 'sheets': sheets}
+
+
+# ============================================================
+# 佇列
+# ============================================================
+class JobQueue:
+    """SQLite 保存的工作佇列；每次操作使用獨立的連線，可在多個執行緒與行程中同時使用"""
+
+    def __init__(self, path=None, executor=None):
+        self.path = path or db_path()
+        self.files_dir = os.path.join(os.path.dirname(os.path.abspath(self.path)), "files")
+        self.executor = executor
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._dataset = None  # (資料檔, 資料集版本, DataFrame)：最近一次載入的資料，連續的工作不重複載入
+        os.makedirs(self.files_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 交易：同時只有一個連線能寫入，讀取後修改不會與其他工作者衝突"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def output_path(self, job_id, suffix):
+        return os.path.join(self.files_dir, f"{job_id}{suffix}")
+
+    # ------------------------------------------------------------
+    # 送出與查詢
+    # ------------------------------------------------------------
+    def submit(self, kind, params=None, data_path=BUNDLED_DATA, force=False):
+        """送出工作，回傳 (工作編號, 是否新建)
+
+        相同種類、參數與資料集版本的工作已排隊、執行中或已完成時直接回傳該工作（force=True 時一律新建）
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"未知的工作種類: {kind}")
+        params = JOB_KINDS[kind].params(params)
+        data_path = os.path.abspath(data_path)
+        version = file_version(data_path)
+        key = job_key(kind, params, version)
+        with self._transaction() as conn:
+            if not force:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND state IN ('queued', 'running', 'done') "
+                    "ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+                if row is not None:
+                    return row['id'], False
+            cursor = conn.execute(
+                "INSERT INTO jobs (key, kind, params, data_path, dataset_version, state, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (key, kind, json.dumps(params, sort_keys=True), data_path, version, time.time()))
+            job_id = cursor.lastrowid
+        self._wakeup.set()
+        return job_id, True
+
+    def get(self, job_id):
+        """工作的狀態與進度（不含結果），不存在時回傳 None"""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_jobs(self, limit=20):
+        """最近的工作（新的在前）"""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM jobs ORDER BY id DESC LIMIT ?",
+                                (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def has_active(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM jobs WHERE state IN ('queued', 'running') LIMIT 1").fetchone() is not None
+
+    def _blob(self, job_id, column):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {column} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return pickle.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def result(self, job_id):
+        """已完成工作的結果（未完成時為 None）"""
+        return self._blob(job_id, 'result')
+
+    def partial(self, job_id):
+        """執行中工作最近一次回報的部分結果"""
+        return self._blob(job_id, 'partial')
+
+    def cancel(self, job_id):
+        """取消工作：排隊中的立即取消，執行中的在下一次回報進度時停止；回傳是否為未結束的工作"""
+        with self._transaction() as conn:
+            cancelled = conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)).rowcount
+            requested = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = 'running'", (job_id,)).rowcount
+        return bool(cancelled or requested)
+
+    # ------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------
+    def _report(self, job_id, fraction, message, partial):
+        """寫入進度（與部分結果），回傳是否已被要求取消"""
+        with self._connect() as conn:
+            if partial is None:
+                conn.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+                             (min(max(fraction, 0.0), 1.0), message, job_id))
+            else:
+                conn.execute("UPDATE jobs SET progress = ?, message = ?, partial = ? WHERE id = ?",
+                             (min(max(fraction, 0.0), 1.0), message,
+                              pickle.dumps(partial, protocol=pickle.HIGHEST_PROTOCOL), job_id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def claim(self, worker=None):
+        """認領最早排入的工作（交易中將狀態改為 running），沒有工作時回傳 None"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT id FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET state = 'running', worker = ?, started_at = ?, message = ? WHERE id = ?",
+                         (worker or _worker_name(), time.time(), '載入資料', row['id']))
+        return self.get(row['id'])
+
+    def recover(self):
+        """將同一台主機上已結束的行程留下的執行中工作重新排入佇列，回傳數量"""
+        host = socket.gethostname()
+        with self._transaction() as conn:
+            stale = []
+            for row in conn.execute("SELECT id, worker FROM jobs WHERE state = 'running'").fetchall():
+                worker_host, _, rest = (row['worker'] or '').partition(':')
+                pid = rest.partition(':')[0]
+                if worker_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                    stale.append(row['id'])
+            for job_id in stale:
+                conn.execute("UPDATE jobs SET state = 'queued', progress = 0, message = NULL, partial = NULL, "
+                             "worker = NULL, started_at = NULL WHERE id = ?", (job_id,))
+        return len(stale)
+
+    def _load(self, data_path, version):
+        """載入工作的資料集（與儀表板相同的衍生資料；設定共用快取時直接讀取快取）"""
+        if self._dataset is not None and self._dataset[:2] == (data_path, version):
+            return self._dataset[2]
+        if file_version(data_path) != version:
+            raise RuntimeError("資料檔在送出工作後已變更，請重新送出")
+        from mlb_analysis.score import read_input
+        df, _ = shared_cache.load_derived(data_path, lambda: preprocess_data(read_input(data_path)))
+        self._dataset = (data_path, version, df)
+        return df
+
+    def execute(self, job):
+        """執行已認領的工作並寫入結果或錯誤，回傳最終狀態"""
+        job_id = job['id']
+        ctx = JobContext(self, job_id, self.executor)
+        try:
+            df = self._load(job['data_path'], job['dataset_version'])
+            result = JOB_KINDS[job['kind']].fn(ctx, df, **json.loads(job['params']))
+        except JobCancelled:
+            state, values = 'cancelled', {'message': '已取消'}
+        except Exception as e:
+            logger.exception("背景工作 #%s (%s) 失敗", job_id, job['kind'])
+            state, values = 'failed', {'error': ''.join(traceback.format_exception_only(type(e), e)).strip()}
+        else:
+            state, values = 'done', {'progress': 1.0, 'message': '完成', 'partial': None,
+                                     'result': pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)}
+        assignments = ', '.join(f"{column} = ?" for column in values)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET state = ?, finished_at = ?, {assignments} WHERE id = ?",
+                         (state, time.time(), *values.values(), job_id))
+        self.prune()
+        return state
+
+    def run_next(self, worker=None):
+        """認領並執行一項工作；佇列為空時回傳 None，否則回傳 (工作, 最終狀態)"""
+        job = self.claim(worker)
+        if job is None:
+            return None
+        return job, self.execute(job)
+
+    def work(self, stop=None, poll=POLL_SECONDS, once=False):
+        """工作者迴圈：依序執行佇列中的工作，佇列為空時等待新工作（once=True 時佇列清空即返回）"""
+        stop = stop or threading.Event()
+        self.recover()
+        while not stop.is_set():
+            if self.run_next() is None:
+                if once:
+                    return
+                self._wakeup.wait(poll)
+                self._wakeup.clear()
+
+    def start_worker(self):
+        """在背景執行緒中啟動工作者（同一個佇列物件只啟動一次）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.work, name="mlb-jobs", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    # ------------------------------------------------------------
+    # 清理
+    # ------------------------------------------------------------
+    def delete(self, job_ids):
+        """刪除工作與其輸出檔"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        prefixes = {f"{job_id}." for job_id in job_ids}
+        for name in os.listdir(self.files_dir):
+            if any(name.startswith(prefix) for prefix in prefixes):
+                os.remove(os.path.join(self.files_dir, name))
+
+    def prune(self, keep=MAX_FINISHED):
+        """只保留最近 keep 項已結束的工作，回傳刪除的數量"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE state NOT IN ('queued', 'running') "
+                                "ORDER BY finished_at DESC, id DESC LIMIT -1 OFFSET ?", (keep,)).fetchall()
+        self.delete([row['id'] for row in rows])
+        return len(rows)
+
+
+# ============================================================
+# 命令列
+# ============================================================
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _format_job(job):
+    kind = JOB_KINDS[job['kind']].label if job['kind'] in JOB_KINDS else job['kind']
+    elapsed = ''
+    if job['started_at']:
+        elapsed = f"，{(job['finished_at'] or time.time()) - job['started_at']:.1f}s"
+    detail = job['error'] or job['message'] or ''
+    return (f"#{job['id']:<4} {STATES.get(job['state'], job['state'])} {job['progress']:>4.0%}{elapsed}  "
+            f"{kind} {job['params']}  {detail}")
+
+
+def _worker_command(args, queue):
+    queue.executor = GroupExecutor(workers=args.workers)
+    print(f"🚀 工作者啟動（{queue.path}）" + ("，佇列清空後結束" if args.once else "，Ctrl+C 結束"))
+    recovered = queue.recover()
+    if recovered:
+        print(f"♻️  重新排入 {recovered} 項中斷的工作")
+    try:
+        while True:
+            ran = queue.run_next()
+            if ran is None:
+                if args.once:
+                    break
+                time.sleep(args.poll)
+                continue
+            job, state = ran
+            symbol = {'done': '✅', 'cancelled': '🗑️'}.get(state, '❌')
+            print(f"{symbol} {_format_job(queue.get(job['id']))}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.executor.shutdown()
+    return 0
+
+
+def _submit_command(args, queue):
+    params = {}
+    for item in args.set or []:
+        name, sep, value = item.partition('=')
+        if not sep:
+            print(f"❌ 參數格式應為 名稱=值: {item}")
+            return 2
+        params[name] = _parse_value(value)
+    try:
+        job_id, created = queue.submit(args.kind, params, args.data, force=args.force)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    print(f"{'🚀 已排入' if created else '✅ 已有相同的工作'} #{job_id}")
+    return 0
+
+
+def _list_command(args, queue):
+    jobs = queue.list_jobs(args.limit)
+    if not jobs:
+        print("目前沒有工作")
+    for job in jobs:
+        print(_format_job(job))
+    return 0
+
+
+def _cancel_command(args, queue):
+    if queue.cancel(args.id):
+        print(f"🗑️ 已取消 #{args.id}")
+        return 0
+    print(f"❌ #{args.id} 不存在或已結束")
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="長時間分析的背景工作佇列")
+    parser.add_argument("--db", default=None, help=f"工作資料庫（預設為 {DB_ENV} 或 .jobs/jobs.sqlite3）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="執行佇列中的工作")
+    worker_parser.add_argument("--once", action="store_true", help="佇列清空後結束")
+    worker_parser.add_argument("--workers", type=int, default=None, help="計算用的工作行程數（預設為 CPU 數）")
+    worker_parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="佇列為空時的檢查間隔（秒）")
+    worker_parser.set_defaults(func=_worker_command)
+
+    submit_parser = subparsers.add_parser("submit", help="送出工作")
+    submit_parser.add_argument("kind", choices=list(JOB_KINDS))
+    submit_parser.add_argument("--data", default=BUNDLED_DATA, help="CSV/Parquet 資料檔")
+    submit_parser.add_argument("--set", action="append", metavar="NAME=VALUE", help="工作參數（值以 JSON 解析）")
+    submit_parser.add_argument("--force", action="store_true", help="已有相同的工作時仍重新計算")
+    submit_parser.set_defaults(func=_submit_command)
+
+    list_parser = subparsers.add_parser("list", help="列出最近的工作")
+    list_parser.add_argument("--limit", type=int, default=20)
+    list_parser.set_defaults(func=_list_command)
+
+    cancel_parser = subparsers.add_parser("cancel", help="取消工作")
+    cancel_parser.add_argument("id", type=int)
+    cancel_parser.set_defaults(func=_cancel_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args, JobQueue(args.db))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
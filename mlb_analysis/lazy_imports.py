@@ -0,0 +1,183 @@
+# lazy_imports.py - 延遲載入與啟動時間預算
+"""scipy / sklearn / plotly 等重量級子系統改在第一次使用時才載入，並記錄每個模組的載入時間，
+供冷啟動時間報告與 import 時間預算檢查使用。
+
+腳本頂層（非延遲）import 的時間無法在伺服器行程中量測：streamlit run 執行腳本前已載入 streamlit，
+之後的工作階段也都共用已載入的模組，計時只會得到 0。因此這部分改在新的直譯器中依序 import 量測
+（measure_fresh_imports；啟動基準測試的子行程本身就是新的直譯器，直接呼叫 time_imports）。"""
+import ast
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+
+from mlb_analysis.dataset import REPO_ROOT
+
+logger = logging.getLogger(__name__)
+
+# 啟動階段（非延遲）import 的時間預算，可用環境變數 MLB_IMPORT_BUDGET_MS 調整
+IMPORT_BUDGET_SECONDS = float(os.environ.get("MLB_IMPORT_BUDGET_MS", "3000")) / 1000
+
+_lock = threading.Lock()
+_timings = {}
+_startup = {'ready_seconds': None, 'budget_warned': False}
+
+
+def process_uptime():
+    """目前行程已執行的秒數（讀取 /proc，無法取得時回傳 None）"""
+    # 啟動時間的解析在 telemetry；於函數內匯入，以免量測啟動 import 時提前載入 telemetry
+    from mlb_analysis.telemetry import process_start_since_boot
+
+    since_boot = process_start_since_boot()
+    if since_boot is None:
+        return None
+    try:
+        with open('/proc/uptime') as f:
+            system_uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return system_uptime - since_boot
+
+
+def _record(name, seconds):
+    """記錄延遲載入模組第一次載入的時間"""
+    with _lock:
+        if name not in _timings:
+            _timings[name] = {
+                'module': name,
+                'seconds': seconds,
+                'lazy': True,
+                'process_uptime': process_uptime(),
+            }
+
+
+class LazyModule(types.ModuleType):
+    """模組代理：第一次存取屬性時才真正 import，並記錄載入時間"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            _record(self.__name__, time.perf_counter() - start)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """回傳延遲載入的模組代理；若模組已載入則直接回傳模組本身"""
+    module = sys.modules.get(name)
+    if module is not None and not isinstance(module, LazyModule):
+        return module
+    return LazyModule(name)
+
+
+# ============================================================
+# 啟動階段 import
+# ============================================================
+def eager_modules(script_path):
+    """腳本頂層 import 的模組（依出現順序；函式內、條件式與延遲載入的模組不算）
+
+    `from 套件 import 名稱` 的名稱可能是子模組，一併列為「套件.名稱」，由 time_imports 判斷。
+    """
+    with open(script_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script_path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def time_imports(modules):
+    """依序 import 並回傳各模組的載入時間（秒）；先前已載入的模組（含被前面的模組帶入者）計為 0，
+    只有在新的直譯器中呼叫才代表冷啟動的成本"""
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ModuleNotFoundError as e:
+            # 上層模組已載入、此名稱卻不是子模組：`from 模組 import 函數` 的函數名稱，略過
+            if e.name == name and name.rpartition('.')[0] in sys.modules:
+                continue
+            raise
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def measure_fresh_imports(modules, timeout=120):
+    """在新的 Python 行程中執行 time_imports，不受目前行程已載入模組的影響"""
+    code = ("import json, sys; from mlb_analysis.lazy_imports import time_imports; "
+            "print(json.dumps(time_imports(sys.argv[1:])))")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    proc = subprocess.run([sys.executable, "-c", code, *modules], cwd=REPO_ROOT, env=env,
+                          capture_output=True, text=True, timeout=timeout, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def check_import_budget(eager_seconds):
+    """檢查啟動階段 import 時間是否超過預算，超過時記錄警告（每個行程只警告一次）"""
+    over_budget = eager_seconds > IMPORT_BUDGET_SECONDS
+    with _lock:
+        if over_budget and not _startup['budget_warned']:
+            _startup['budget_warned'] = True
+            logger.warning("啟動 import 時間 %.2fs 超過預算 %.2fs", eager_seconds, IMPORT_BUDGET_SECONDS)
+    return over_budget
+
+
+def mark_startup_complete():
+    """標記第一次完整渲染完成的時間點（只記錄一次）"""
+    with _lock:
+        if _startup['ready_seconds'] is not None:
+            return
+        _startup['ready_seconds'] = process_uptime()
+    logger.info("第一次渲染完成，行程已執行 %s 秒", _startup['ready_seconds'])
+
+
+def startup_report(eager_timings=None):
+    """冷啟動時間報告：各模組載入時間、延遲載入的模組與預算狀態
+
+    eager_timings 為 time_imports / measure_fresh_imports 量測的啟動階段 import 時間（模組 → 秒）。
+    """
+    with _lock:
+        lazy = sorted(_timings.values(), key=lambda t: -t['seconds'])
+        ready_seconds = _startup['ready_seconds']
+
+    eager = sorted(({'module': name, 'seconds': seconds, 'lazy': False}
+                    for name, seconds in (eager_timings or {}).items()), key=lambda t: -t['seconds'])
+    eager_seconds = sum(t['seconds'] for t in eager)
+    return {
+        'eager_imports': eager,
+        'lazy_imports': lazy,
+        'eager_seconds': eager_seconds,
+        'lazy_seconds': sum(t['seconds'] for t in lazy),
+        'budget_seconds': IMPORT_BUDGET_SECONDS,
+        'over_budget': eager_seconds > IMPORT_BUDGET_SECONDS,
+        'ready_seconds': ready_seconds,
+    }
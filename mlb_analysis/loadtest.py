@@ -0,0 +1,318 @@
+# loadtest.py - 無頭負載測試
+"""以 Streamlit AppTest 模擬多位分析師同時操作儀表板（切換分析模式、拖曳 WAR 滑桿、挑選球隊看 PSI、
+搜尋球員），回報每次 rerun 的延遲百分位數與行程記憶體成長。所有工作階段在同一個行程的不同執行緒中執行，
+與 Streamlit 伺服器的執行模型相同，完全離線。
+
+用法：
+    python -m mlb_analysis.loadtest --sessions 8 --actions 20
+    python -m mlb_analysis.loadtest --sessions 4 --rows 100000 --out loadtest.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mlb_analysis import bench
+from mlb_analysis.dataset import REPO_ROOT
+from mlb_analysis.modes import ANALYSIS_MODES as MODES
+from mlb_analysis.telemetry import read_rss
+
+DASHBOARD_PATH = os.path.join(REPO_ROOT, "dashboard.py")
+PSI_ANALYSIS = "投資組合夏普指數 (PSI)"
+SEARCH_FRAGMENTS = ["an", "er", "Jo", "ma", "son", "ez", "Ca", "li"]
+PERCENTILES = [50, 95, 99]
+
+
+# ============================================================
+# 模擬操作
+# ============================================================
+def _by_label(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"找不到元件: {label}")
+
+
+def switch_mode(at, rng, mode=None):
+    """切換分析模式"""
+    at.selectbox(key="analysis_mode").select(mode or rng.choice(MODES)).run()
+
+
+def drag_war_slider(at, rng):
+    """在綜合儀表板拖曳 WAR 範圍滑桿"""
+    if at.selectbox(key="analysis_mode").value != "綜合儀表板":
+        switch_mode(at, rng, "綜合儀表板")
+    slider = _by_label(at.slider, "WAR範圍")
+    low, high = slider.min, slider.max
+    a, b = sorted(rng.uniform(low, high) for _ in range(2))
+    slider.set_value((round(a, 1), round(max(b, a), 1))).run()
+
+
+def pick_psi_teams(at, rng):
+    """在球隊分析挑選 2~6 支球隊並檢視 PSI"""
+    if at.selectbox(key="analysis_mode").value != "球隊分析":
+        switch_mode(at, rng, "球隊分析")
+    _by_label(at.selectbox, "分析類型").select(PSI_ANALYSIS).run()
+    teams = _by_label(at.multiselect, "選擇球隊（可多選）")
+    teams.set_value(rng.sample(teams.options, min(len(teams.options), rng.randint(2, 6)))).run()
+
+
+def search_players(at, rng):
+    """搜尋球員並挑選幾位比較"""
+    if at.selectbox(key="analysis_mode").value != "球員搜尋":
+        switch_mode(at, rng, "球員搜尋")
+    at.text_input(key="player_search").input(rng.choice(SEARCH_FRAGMENTS)).run()
+    if at.multiselect:
+        players = at.multiselect[0]
+        if players.options:
+            players.set_value(rng.sample(players.options, min(len(players.options), rng.randint(2, 5)))).run()
+
+
+# 操作與權重：大部分時間在切換頁面與篩選
+ACTIONS = [
+    (switch_mode, 4),
+    (drag_war_slider, 3),
+    (pick_psi_teams, 2),
+    (search_players, 2),
+]
+
+
+# ============================================================
+# 量測
+# ============================================================
+class RssSampler(threading.Thread):
+    """背景執行緒定期取樣 RSS"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            self.samples.append((time.perf_counter() - start, read_rss()))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append((self.samples[-1][0] if self.samples else 0.0, read_rss()))
+
+
+class TimedAppTest:
+    """包裝 AppTest：記錄每一次 rerun 的延遲（含元件操作觸發的 rerun）"""
+
+    def __init__(self, session_id, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.session_id = session_id
+        self.at = AppTest.from_file(DASHBOARD_PATH, default_timeout=timeout)
+        self.records = []
+        self.action = 'open'
+        original_run = self.at._run
+
+        def timed_run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_run(*args, **kwargs)
+            finally:
+                self.records.append({
+                    'session': self.session_id,
+                    'action': self.action,
+                    'seconds': time.perf_counter() - start,
+                    'error': bool(self.at.exception) if self.at._tree is not None else True,
+                })
+
+        self.at._run = timed_run
+
+
+def run_session(session_id, n_actions, seed, think_time, timeout):
+    """一個模擬分析師：開啟儀表板後依權重隨機執行 n_actions 個操作"""
+    rng = random.Random(seed * 10_007 + session_id)
+    timed = TimedAppTest(session_id, timeout)
+    timed.at.session_state["analysis_mode"] = rng.choice(MODES)
+    timed.at.run()
+
+    actions, weights = zip(*ACTIONS)
+    for _ in range(n_actions):
+        action = rng.choices(actions, weights)[0]
+        timed.action = action.__name__
+        try:
+            action(timed.at, rng)
+        except Exception as e:
+            # 元件找不到或 rerun 逾時都算一次失敗的操作
+            timed.records.append({
+                'session': session_id, 'action': timed.action, 'seconds': None,
+                'error': True, 'message': f"{type(e).__name__}: {e}",
+            })
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+    return timed.records
+
+
+@contextlib.contextmanager
+def shared_runtime():
+    """AppTest 每次執行都會替換全域的 Runtime 實例並在結束時清除，多個工作階段同時執行時
+    會讓其他工作階段找不到 Runtime；負載測試期間讓 Runtime.instance() 退回共用的模擬 Runtime。
+
+    AppTest 也只在執行期間替換 config.get_option 開啟 global.appTest，並行時先結束的工作階段
+    會把設定還原，其他工作階段就不會記錄元件的 format_func（下一次操作出現 KeyError）；
+    因此整個負載測試期間都維持開啟。
+
+    AppTest 每次執行都建立新的 ScriptCache 重新編譯儀表板；多個執行緒同時編譯同一份大型腳本時
+    CPython 3.11 偶爾會拋出 SystemError（AST constructor recursion depth mismatch），
+    整次執行沒有任何輸出。實際的伺服器所有工作階段共用一個 ScriptCache，負載測試也比照辦理"""
+    from unittest.mock import MagicMock, patch
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    script_cache = ScriptCache()
+
+    original = Runtime.__dict__['instance']
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    try:
+        with patch_config_options({"global.appTest": True}), \
+                patch.object(local_script_runner, 'ScriptCache', lambda: script_cache):
+            yield shared
+    finally:
+        Runtime.instance = original
+
+
+def warm_up(timeout):
+    """每個模式各執行一次，讓資料載入與快取在量測前就緒"""
+    timed = TimedAppTest(-1, timeout)
+    for mode in MODES:
+        timed.at.session_state["analysis_mode"] = mode
+        timed.at.run()
+
+
+def latency_summary(records):
+    """延遲百分位數 (ms)"""
+    seconds = np.array([r['seconds'] for r in records if r['seconds'] is not None])
+    summary = {'count': int(len(seconds)), 'errors': sum(1 for r in records if r['error'])}
+    if len(seconds):
+        for p, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+            summary[f'p{p}_ms'] = float(value * 1000)
+        summary['mean_ms'] = float(seconds.mean() * 1000)
+        summary['max_ms'] = float(seconds.max() * 1000)
+    return summary
+
+
+def run_load_test(sessions, n_actions, seed=0, think_time=0.0, timeout=180, warmup=True):
+    """同時執行 sessions 個模擬工作階段，回傳延遲與記憶體統計"""
+    with shared_runtime():
+        if warmup:
+            warm_up(timeout)
+
+        sampler = RssSampler()
+        rss_start = read_rss()
+        sampler.start()
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            futures = [pool.submit(run_session, i, n_actions, seed, think_time, timeout) for i in range(sessions)]
+            records = [record for future in futures for record in future.result()]
+
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+    rss_values = [rss for _, rss in sampler.samples if rss is not None]
+
+    by_action = {}
+    for record in records:
+        by_action.setdefault(record['action'], []).append(record)
+
+    return {
+        'elapsed_seconds': elapsed,
+        'reruns_per_second': sum(1 for r in records if r['seconds'] is not None) / elapsed if elapsed else None,
+        'overall': latency_summary(records),
+        'by_action': {action: latency_summary(items) for action, items in sorted(by_action.items())},
+        'memory': {
+            'rss_start_bytes': rss_start,
+            'rss_peak_bytes': max(rss_values) if rss_values else None,
+            'rss_end_bytes': rss_values[-1] if rss_values else None,
+            'rss_growth_bytes': (rss_values[-1] - rss_start) if rss_values and rss_start else None,
+            'samples': sampler.samples,
+        },
+        'failures': [r for r in records if r.get('message')][:20],
+    }
+
+
+def _print_report(result, sessions):
+    print(f"\n👥 {sessions} 個同時工作階段，耗時 {result['elapsed_seconds']:.1f}s，"
+          f"{result['reruns_per_second']:.2f} reruns/s")
+    header = f"   {'操作':<18}{'次數':>6}{'錯誤':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    rows = list(result['by_action'].items()) + [('(全部)', result['overall'])]
+    for action, summary in rows:
+        print(f"   {action:<18}{summary['count']:>6}{summary['errors']:>6}"
+              f"{summary.get('p50_ms', float('nan')):>10.0f}{summary.get('p95_ms', float('nan')):>10.0f}"
+              f"{summary.get('p99_ms', float('nan')):>10.0f}")
+    memory = result['memory']
+    if memory['rss_start_bytes']:
+        mb = 1024 * 1024
+        print(f"   RSS: 開始 {memory['rss_start_bytes'] / mb:.0f} MB → 峰值 {memory['rss_peak_bytes'] / mb:.0f} MB"
+              f" → 結束 {memory['rss_end_bytes'] / mb:.0f} MB（成長 {memory['rss_growth_bytes'] / mb:+.0f} MB）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以 AppTest 對儀表板進行無頭負載測試")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[4], help="同時工作階段數（可指定多個）")
+    parser.add_argument("--actions", type=int, default=10, help="每個工作階段執行的操作數")
+    parser.add_argument("--seed", type=int, default=0, help="操作序列亂數種子")
+    parser.add_argument("--think-time", type=float, default=0.0, help="操作間平均停頓秒數")
+    parser.add_argument("--timeout", type=float, default=180, help="單次 rerun 逾時秒數")
+    parser.add_argument("--rows", type=int, help="改用指定筆數的合成資料（透過 MLB_DATA_PATH）")
+    parser.add_argument("--no-warmup", action="store_true", help="不預先載入（量測冷快取）")
+    parser.add_argument("--out", help="結果 JSON 路徑")
+    args = parser.parse_args(argv)
+
+    if args.rows:
+        os.environ["MLB_DATA_PATH"] = bench.dataset_path(
+            args.rows, 1, args.seed, os.path.join(bench.DEFAULT_RESULTS_DIR, "data")
+        )
+
+    meta = bench.collect_meta({
+        'sessions': args.sessions,
+        'actions': args.actions,
+        'seed': args.seed,
+        'think_time': args.think_time,
+        'rows': args.rows,
+        'warmup': not args.no_warmup,
+    })
+    results = []
+    for sessions in args.sessions:
+        result = run_load_test(sessions, args.actions, args.seed, args.think_time, args.timeout,
+                               warmup=not args.no_warmup)
+        results.append({'sessions': sessions, **result})
+        _print_report(result, sessions)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果已寫入 {args.out}")
+
+    failed = sum(r['overall']['errors'] for r in results)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
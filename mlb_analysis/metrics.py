@@ -0,0 +1,542 @@
+# metrics.py - 數據預處理與原創財務指標 (依據 new_variables.md)
+"""與 Streamlit 無關的純計算函數，儀表板與基準測試共用"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis.instrumentation import traced
+from mlb_analysis.lazy_imports import lazy_import
+
+sk_decomposition = lazy_import("sklearn.decomposition")
+sk_preprocessing = lazy_import("sklearn.preprocessing")
+stats = lazy_import("scipy.stats")  # 用於統計分佈 (OLS p值)
+
+logger = logging.getLogger(__name__)
+
+# WVPI 原創權重 (依據 new_variables.md 2.3 節) 與 PCA 驗證所用的四個成分
+WVPI_WEIGHTS = np.array([0.35, 0.30, 0.20, 0.15])
+WVPI_COMPONENTS = ['WAR_norm', 'VR_norm', 'P_WAR', 'P_Salary_inv']
+
+# PSI 管理評價分類 (依據 new_variables.md 5.6 節)
+PSI_CATEGORIES = ['卓越管理', '良好管理', '平庸管理', '效率不佳', '糟糕管理']
+
+# TPM 四個象限 (WAR 百分位 ≥ 50, 性價比百分位 ≥ 50)
+TPM_CATEGORIES = ['明星價值', '溢價球星', '潛力新秀', '球隊冗員']
+
+# ============================================================
+# 數據預處理
+# ============================================================
+@traced()
+def preprocess_data(df):
+    """讀入原始資料後的預處理：標準化欄位名稱、位置代碼、百分位與分類，並計算原創財務指標"""
+    # 數據預處理
+    if 'value_ratio' not in df.columns and 'WAR' in df.columns and 'Salary_millions' in df.columns:
+        df['value_ratio'] = df['WAR'] / df['Salary_millions']
+
+    # 標準化欄位名稱
+    column_mapping = {}
+
+    if 'Team' not in df.columns:
+        possible_team_cols = ['Team_performance', 'Team_salary', 'team', 'TEAM']
+        for col in possible_team_cols:
+            if col in df.columns:
+                column_mapping[col] = 'Team'
+                break
+
+    if 'Position' not in df.columns:
+        possible_pos_cols = ['Position_salary', 'position', 'Pos', 'POS']
+        for col in possible_pos_cols:
+            if col in df.columns:
+                column_mapping[col] = 'Position'
+                break
+
+    if 'Name' not in df.columns:
+        possible_name_cols = ['Name_clean', 'Player', 'Player_formatted', 'player']
+        for col in possible_name_cols:
+            if col in df.columns:
+                column_mapping[col] = 'Name'
+                break
+
+    if column_mapping:
+        df = df.rename(columns=column_mapping)
+
+    if 'Team' in df.columns:
+        df = df[df['Team'] != '---']
+        df = df.dropna(subset=['Team'])
+        df['Team'] = df['Team'].astype(str)
+
+    pos_map = {
+        1: 'P', '1': 'P', '1.0': 'P',
+        2: 'C', '2': 'C', '2.0': 'C',
+        3: '1B', '3': '1B', '3.0': '1B',
+        4: '2B', '4': '2B', '4.0': '2B',
+        5: '3B', '5': '3B', '5.0': '3B',
+        6: 'SS', '6': 'SS', '6.0': 'SS',
+        7: 'LF', '7': 'LF', '7.0': 'LF',
+        8: 'CF', '8': 'CF', '8.0': 'CF',
+        9: 'RF', '9': 'RF', '9.0': 'RF',
+        10: 'DH', '10': 'DH', 'O': 'DH'
+    }
+
+    if 'Position' in df.columns:
+        df['Position'] = df['Position'].apply(lambda x: pos_map.get(x, x))
+
+    # 計算財務分析指標
+    if 'Salary_millions' in df.columns:
+        df['salary_percentile'] = df['Salary_millions'].rank(pct=True) * 100
+        df['salary_category'] = pd.qcut(df['Salary_millions'], q=4, 
+                                        labels=['低薪資', '中低薪資', '中高薪資', '高薪資'])
+
+    if 'WAR' in df.columns:
+        df['war_percentile'] = df['WAR'].rank(pct=True) * 100
+        df['war_category'] = pd.qcut(df['WAR'], q=4,
+                                    labels=['低表現', '中低表現', '中高表現', '高表現'])
+
+    # ============================================================
+    # 新增：計算原創財務指標 (依據 new_variables.md)
+    # ============================================================
+    df = calculate_original_financial_metrics(df)
+    
+    return df
+
+# ============================================================
+# 原創財務指標計算函數
+# ============================================================
+@traced()
+def calculate_original_financial_metrics(df):
+    """計算六個原創財務指標：WVPI, RAV, MERI, PSI, TPM, SEI"""
+    
+    # 檢查必要欄位
+    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+        logger.warning("缺少 WAR 或 Salary_millions 欄位，無法計算部分原創指標")
+        return df
+    
+    # 2. 加權綜合價值指數 (WVPI)
+    df = calculate_wvpi(df)
+    
+    # 3. 風險調整後價值 (RAV)
+    df = calculate_rav(df)
+    
+    # 4. 市場效率殘差指數 (MERI)
+    df = calculate_meri(df)
+    
+    # 5. 投資組合夏普指數 (PSI) - 需要球隊層級計算，稍後在球隊分析中進行
+    
+    # 6. 雙因子績效矩陣 (TPM) - 需要百分位，已在計算中
+    
+    # 7. 同步效率指數 (SEI) - 需要全局計算，稍後在綜合儀表板中進行
+    
+    return df
+
+@traced()
+def calculate_wvpi(df):
+    """計算加權綜合價值指數 (WVPI) - 修正版（所有項目標準化到 0-100）"""
+    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+        return df
+    
+    # 定義權重 (依據 new_variables.md 2.3 節)
+    w1, w2, w3, w4 = 0.35, 0.30, 0.20, 0.15
+    
+    # 計算 WAR 百分位
+    df['P_WAR'] = df['WAR'].rank(pct=True) * 100
+    
+    # 計算薪資百分位
+    df['P_Salary'] = df['Salary_millions'].rank(pct=True) * 100
+    
+    # 計算 100 - P_Salary (相對成本項)
+    df['P_Salary_inv'] = 100 - df['P_Salary']
+    
+    # 計算性價比 (WAR/Salary)
+    df['VR'] = df['WAR'] / df['Salary_millions']
+    
+    # ==== 新增：標準化 WAR 和 VR 到 0-100 尺度 ====
+    war_max = df['WAR'].max()
+    vr_max = df['VR'].max()
+    
+    # 標準化 WAR (避免除以零)
+    if war_max > 0:
+        df['WAR_norm'] = (df['WAR'] / war_max) * 100
+    else:
+        df['WAR_norm'] = 0
+    
+    # 標準化 VR (避免除以零)
+    if vr_max > 0:
+        df['VR_norm'] = (df['VR'] / vr_max) * 100
+    else:
+        df['VR_norm'] = 0
+    
+    # 計算 WVPI - 使用標準化後的數值
+    df['WVPI'] = (w1 * df['WAR_norm'] + 
+                  w2 * df['VR_norm'] + 
+                  w3 * df['P_WAR'] + 
+                  w4 * df['P_Salary_inv'])
+    
+    # ==== 修正：根據實際分佈調整分類閾值 ====
+    # 先計算 WVPI 的百分位數，用於調整整體分佈
+    p25 = df['WVPI'].quantile(0.25)
+    p50 = df['WVPI'].quantile(0.50)
+    p75 = df['WVPI'].quantile(0.75)
+    p90 = df['WVPI'].quantile(0.90)
+    p95 = df['WVPI'].quantile(0.95)
+    
+    # 根據實際分佈設定閾值
+    conditions = [
+        df['WVPI'] > p90,                          # 前10% -> 頂級球星
+        (df['WVPI'] > p75) & (df['WVPI'] <= p90),  # 前10-25% -> 優質球員
+        (df['WVPI'] > p50) & (df['WVPI'] <= p75),  # 前25-50% -> 普通球員
+        (df['WVPI'] > p25) & (df['WVPI'] <= p50),  # 後25-50% -> 效率待提升
+        df['WVPI'] <= p25                           # 後25% -> 問題合約
+    ]
+    categories = ['頂級球星', '優質球員', '普通球員', '效率待提升', '問題合約']
+    df['WVPI_category'] = np.select(conditions, categories, default='未知')
+    
+    return df
+
+@traced()
+def calculate_rav(df):
+    """計算風險調整後價值 (RAV)"""
+    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+        return df
+    
+    # 計算 WAR_min (替補球員水準) - 使用薪資低於第25百分位的球員平均WAR
+    low_salary_threshold = df['Salary_millions'].quantile(0.25)
+    bench_players = df[df['Salary_millions'] <= low_salary_threshold]
+    WAR_min = bench_players['WAR'].mean() if len(bench_players) > 0 else 0
+    
+    # 計算 σ_WAR (生涯WAR標準差) - 由於無多年數據，使用近似公式
+    # 使用位置平均WAR的絕對差異作為近似
+    if 'Position' in df.columns:
+        position_avg_war = df.groupby('Position')['WAR'].transform('mean')
+        df['sigma_WAR_approx'] = np.abs(df['WAR'] - position_avg_war)
+    else:
+        df['sigma_WAR_approx'] = df['WAR'].std() if df['WAR'].std() > 0 else 1
+    
+    # 計算薪資中位數
+    median_salary = df['Salary_millions'].median()
+    
+    # 計算 RAV
+    df['RAV'] = ((df['WAR'] - WAR_min) / (df['sigma_WAR_approx'] + 1)) * (median_salary / df['Salary_millions'])
+    
+    # 添加 RAV 分類 (依據 new_variables.md 3.6 節)
+    conditions = [
+        df['RAV'] > 2.0,
+        (df['RAV'] > 1.0) & (df['RAV'] <= 2.0),
+        (df['RAV'] > 0) & (df['RAV'] <= 1.0),
+        df['RAV'] <= 0
+    ]
+    categories = ['低風險高回報', '穩健型球員', '普通球員', '高風險或低於替補']
+    df['RAV_category'] = np.select(conditions, categories, default='未知')
+    
+    return df
+
+@traced()
+def calculate_meri(df):
+    """計算市場效率殘差指數 (MERI)"""
+    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+        return df
+    
+    # 清理數據
+    df_clean = df.dropna(subset=['WAR', 'Salary_millions']).copy()
+    
+    # 建立線性回歸模型 (WAR -> Salary)
+    X = df_clean[['WAR']].values
+    y = df_clean['Salary_millions'].values
+    
+    # 簡單線性回歸 (不使用外部庫)
+    X_mean = np.mean(X)
+    y_mean = np.mean(y)
+    
+    numerator = np.sum((X.flatten() - X_mean) * (y - y_mean))
+    denominator = np.sum((X.flatten() - X_mean) ** 2)
+    
+    beta = numerator / denominator if denominator != 0 else 0
+    alpha = y_mean - beta * X_mean
+    
+    # 計算預期薪資
+    df['expected_salary'] = alpha + beta * df['WAR']
+    
+    # 如果位置數據存在，加入位置調整 (簡化版)
+    if 'Position' in df.columns:
+        position_avg_residual = df.groupby('Position')['Salary_millions'].transform('mean') - \
+                                df.groupby('Position')['expected_salary'].transform('mean')
+        df['expected_salary_position'] = df['expected_salary'] + position_avg_residual
+    else:
+        df['expected_salary_position'] = df['expected_salary']
+    
+    # 計算殘差百分比
+    df['residual_pct'] = (df['Salary_millions'] - df['expected_salary_position']) / df['expected_salary_position']
+    
+    # 計算 MERI = 殘差百分比 × ln(1 + WAR)
+    df['MERI'] = df['residual_pct'] * np.log(1 + np.abs(df['WAR']))
+    
+    # 添加 MERI 分類 (依據 new_variables.md 4.6 節)
+    conditions = [
+        df['MERI'] > 0.5,
+        (df['MERI'] > 0.1) & (df['MERI'] <= 0.5),
+        (df['MERI'] >= -0.1) & (df['MERI'] <= 0.1),
+        (df['MERI'] >= -0.5) & (df['MERI'] < -0.1),
+        df['MERI'] < -0.5
+    ]
+    categories = ['嚴重高估', '稍微高估', '合理定價', '稍微低估', '嚴重低估']
+    df['MERI_category'] = np.select(conditions, categories, default='未知')
+    
+    return df
+
+def calculate_team_psi(team_df, league_efficiency):
+    """計算單一球隊的投資組合夏普指數 (PSI)"""
+    total_war = team_df['WAR'].sum()
+    total_salary = team_df['Salary_millions'].sum()
+    expected_war = total_salary * league_efficiency
+    excess_war = total_war - expected_war
+    team_risk = team_df['WAR'].std() if len(team_df) > 1 else 1
+    
+    # PSI = 超額WAR / 球隊風險
+    psi = excess_war / team_risk if team_risk != 0 else 0
+    return psi
+
+def classify_psi(psi):
+    """依 PSI 數值給予管理評價"""
+    conditions = [
+        psi > 1.5,
+        (psi > 0.5) & (psi <= 1.5),
+        (psi > -0.5) & (psi <= 0.5),
+        (psi > -1.5) & (psi <= -0.5),
+        psi <= -1.5
+    ]
+    return np.select(conditions, PSI_CATEGORIES, default='未知')
+
+def assign_tpm_categories(df):
+    """雙因子績效矩陣 (TPM) 分類，回傳 DataFrame[value_percentile, TPM_category]（列索引與 df 相同）"""
+    value_percentile = df['value_ratio'].rank(pct=True) * 100
+    high_war = df['war_percentile'] >= 50
+    low_war = df['war_percentile'] < 50
+    conditions = [
+        high_war & (value_percentile >= 50),
+        high_war & (value_percentile < 50),
+        low_war & (value_percentile >= 50),
+        low_war & (value_percentile < 50)
+    ]
+    category = np.select(conditions, TPM_CATEGORIES, default='未分類').astype(object)
+    return pd.DataFrame({'value_percentile': value_percentile, 'TPM_category': category}, index=df.index)
+
+@traced()
+def calculate_sei(df):
+    """計算同步效率指數 (SEI)"""
+    if 'WAR' not in df.columns or 'Salary_millions' not in df.columns:
+        return 0, 0, 0
+    
+    # 計算 WAR 與薪資的相關係數
+    df_clean = df.dropna(subset=['WAR', 'Salary_millions'])
+    correlation = df_clean['WAR'].corr(df_clean['Salary_millions'])
+    
+    # 計算薪資的基尼係數
+    salaries = df_clean['Salary_millions'].values
+    salaries = salaries[salaries > 0]
+    
+    if len(salaries) > 0:
+        # 計算基尼係數
+        salaries_sorted = np.sort(salaries)
+        n = len(salaries_sorted)
+        index = np.arange(1, n + 1)
+        gini = ((2 * index - n - 1) * salaries_sorted).sum() / (n * salaries_sorted.sum())
+    else:
+        gini = 0
+    
+    # SEI = ρ × (1 - G)
+    sei = correlation * (1 - gini)
+    
+    return correlation, gini, sei
+
+@traced()
+def calculate_gini(series):
+    """計算基尼係數 (0=完全平等, 1=完全不平等)"""
+    # 確保數值為正
+    incomes = np.sort(series.dropna().values)
+    incomes = incomes[incomes > 0]
+    if len(incomes) == 0: return 0
+    
+    n = len(incomes)
+    index = np.arange(1, n + 1)
+    return ((2 * index - n - 1) * incomes).sum() / (n * incomes.sum())
+
+def calculate_lorenz_curve(series):
+    """羅倫茲曲線座標 (球員累積比例, 薪資累積比例)，起點為 (0, 0)；沒有正值時回傳 (None, None)"""
+    incomes = np.sort(series.dropna().values)
+    incomes = incomes[incomes > 0]
+    if len(incomes) == 0:
+        return None, None
+
+    # 計算累積比例
+    lorenz_curve = np.cumsum(incomes) / incomes.sum()
+    lorenz_curve = np.insert(lorenz_curve, 0, 0)
+    
+    # 理想平等線
+    x_axis = np.linspace(0, 1, len(lorenz_curve))
+    return x_axis, lorenz_curve
+
+@traced()
+def calculate_all_team_psi(df, min_players=3):
+    """計算所有球隊的 PSI（球員數少於 min_players 的球隊略過），依 PSI 由高到低排序"""
+    # 計算聯盟平均效率
+    league_efficiency = df['WAR'].sum() / df['Salary_millions'].sum()
+    
+    team_psi_data = []
+    for team, team_data in df.groupby('Team', sort=False):
+        if len(team_data) >= min_players:
+            psi = calculate_team_psi(team_data, league_efficiency)
+            team_psi_data.append({
+                'Team': team,
+                'PSI': psi,
+                '總WAR': team_data['WAR'].sum(),
+                '總薪資': team_data['Salary_millions'].sum(),
+                '球員數': len(team_data)
+            })
+    
+    if not team_psi_data:
+        return pd.DataFrame(columns=['Team', 'PSI', '總WAR', '總薪資', '球員數'])
+    return pd.DataFrame(team_psi_data).sort_values('PSI', ascending=False)
+
+@traced()
+def calculate_wvpi_pca_weights(df):
+    """以 PCA 第一主成分萃取 WVPI 四個成分的客觀權重，回傳 (PCA 權重, 與原創權重的相關係數)"""
+    if not all(col in df.columns for col in WVPI_COMPONENTS):
+        return None, None
+    
+    # 用乾淨的資料訓練 PCA
+    data = df.dropna(subset=WVPI_COMPONENTS + ['Name', 'Team'])[WVPI_COMPONENTS]
+    
+    scaler = sk_preprocessing.StandardScaler()
+    scaled_data = scaler.fit_transform(data)
+    
+    pca = sk_decomposition.PCA()
+    pca.fit(scaled_data)
+    
+    loadings = np.abs(pca.components_[0])
+    pca_weights = loadings / np.sum(loadings)
+    correlation = np.corrcoef(WVPI_WEIGHTS, pca_weights)[0, 1]
+    return pca_weights, correlation
+
+# ============================================================
+# 迴歸
+# ============================================================
+def salary_model_data(df, min_salary_threshold=1.0):
+    """建立薪資模型用的資料：薪資高於底薪門檻的球員的 WAR 與薪資（只取兩欄，不複製整個 DataFrame）"""
+    return df.loc[df['Salary_millions'] > min_salary_threshold, ['WAR', 'Salary_millions']].dropna()
+
+@traced()
+def calculate_salary_residuals(df, df_model):
+    """以 df_model 建立 WAR→薪資 線性模型，計算所有球員的預期薪資與殘差
+
+    回傳 (斜率, 截距, DataFrame[expected_salary, salary_residual, residual_percent])，
+    WAR 或薪資缺值的球員為 NaN，列索引與 df 相同。
+    """
+    X = df_model[['WAR']].values
+    y = df_model['Salary_millions'].values
+    
+    A = np.vstack([X.flatten(), np.ones(len(X))]).T
+    slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
+    
+    valid = df['WAR'].notna() & df['Salary_millions'].notna()
+    expected_salary = (slope * df['WAR'] + intercept).where(valid)
+    salary_residual = (df['Salary_millions'] - expected_salary).where(valid)
+    residuals = pd.DataFrame({
+        'expected_salary': expected_salary,
+        'salary_residual': salary_residual,
+        'residual_percent': (salary_residual / expected_salary) * 100,
+    }, index=df.index)
+    return slope, intercept, residuals
+
+def analyze_positional_arbitrage(df):
+    """位置套利分析"""
+    if 'Position' not in df.columns or 'WAR' not in df.columns:
+        return None
+        
+    # 計算各位置平均數據
+    pos_stats = df.groupby('Position').agg({
+        'Salary_millions': 'mean',
+        'WAR': 'mean',
+        'Name': 'count'
+    }).reset_index()
+    
+    # 過濾樣本過少的位置
+    pos_stats = pos_stats[pos_stats['Name'] >= 5]
+    
+    # 計算每1 WAR的成本 (Cost per WAR)
+    pos_stats['Cost_per_WAR'] = pos_stats['Salary_millions'] / pos_stats['WAR']
+    pos_stats = pos_stats.sort_values('Cost_per_WAR')
+    
+    return pos_stats
+
+def split_salary_anomalies(df, threshold):
+    """依殘差百分比挑出被低估（< -threshold，由低到高）與被高估（> threshold，由高到低）的球員"""
+    undervalued = df[df['residual_percent'] < -threshold].sort_values('residual_percent')
+    overvalued = df[df['residual_percent'] > threshold].sort_values('residual_percent', ascending=False)
+    return undervalued, overvalued
+
+@traced()
+def manual_ols_regression(x, y):
+    """手動實現OLS回歸，避免依賴statsmodels，並提供完整統計量"""
+    try:
+        # 添加常數項
+        X = np.column_stack([np.ones(len(x)), x])
+        
+        # OLS公式: β = (X'X)^{-1}X'y
+        XTX = np.dot(X.T, X)
+        XTX_inv = np.linalg.inv(XTX)
+        beta = np.dot(XTX_inv, np.dot(X.T, y))
+        
+        # 計算預測值和殘差
+        y_pred = np.dot(X, beta)
+        residuals = y - y_pred
+        
+        # 計算統計量
+        n = len(x)
+        k = 2  # 截距 + 斜率
+        
+        # 殘差平方和
+        ss_res = np.sum(residuals**2)
+        
+        # 總平方和
+        ss_tot = np.sum((y - np.mean(y))**2)
+        
+        # R²
+        r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
+        
+        # 調整後R²
+        adj_r_squared = 1 - (1 - r_squared) * (n - 1) / (n - k) if n > k else r_squared
+        
+        # 標準誤
+        sigma2 = ss_res / (n - k)
+        var_beta = sigma2 * np.diag(XTX_inv)
+        std_err = np.sqrt(var_beta)
+        
+        # t統計量
+        t_values = beta / std_err
+        
+        # p值（使用t分布）
+        p_values = [2 * (1 - stats.t.cdf(np.abs(t), df=n-k)) for t in t_values]
+        
+        # F統計量
+        msr = (ss_tot - ss_res) / (k - 1)
+        mse = ss_res / (n - k)
+        f_value = msr / mse if mse != 0 else 0
+        
+        return {
+            'intercept': beta[0],
+            'slope': beta[1],
+            'r_squared': r_squared,
+            'adj_r_squared': adj_r_squared,
+            'std_err_intercept': std_err[0],
+            'std_err_slope': std_err[1],
+            't_intercept': t_values[0],
+            't_slope': t_values[1],
+            'p_intercept': p_values[0],
+            'p_slope': p_values[1],
+            'f_value': f_value,
+            'n': n,
+            'residuals': residuals
+        }
+    except Exception as e:
+        logger.warning("手動回歸計算錯誤: %s", e)
+        return None
@@ -0,0 +1,14 @@
+# modes.py - 儀表板的分析模式
+"""儀表板側邊欄的分析模式清單；儀表板、啟動基準測試 (bench_startup) 與負載測試 (loadtest) 共用，
+新增模式時只需修改這裡，量測工具自動涵蓋新的頁面"""
+
+ANALYSIS_MODES = [
+    "綜合儀表板",
+    "球員搜尋",
+    "球隊分析",
+    "市場異常偵測",
+    "進階策略分析",
+    "原創財務指標",
+    "背景工作",
+    "公式與變數說明",
+]
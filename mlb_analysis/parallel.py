@@ -0,0 +1,372 @@
+# parallel.py - 以行程池平行執行分組計算
+"""將彼此獨立的分組計算（每支球隊、每個球季 × 球隊）分散到行程池，依分組鍵的順序收集結果。
+
+DataFrame 不經過 pickle 傳給工作行程：先依分組鍵重新排列後寫入一塊共享記憶體，每組對應連續的列範圍，
+工作行程附加 (attach) 同一塊記憶體後直接以切片建立該組的 DataFrame，每個任務只傳送 (鍵, 起點, 終點)。
+數值欄位原樣存放；字串、類別等其他欄位以定長 unicode 陣列存放，在工作行程中還原為 object 欄位。
+
+資料量小（少於 min_rows 列）或只有一個工作行程時直接在目前行程中以 groupby 執行，不啟動行程池。
+
+用法：
+    python -m mlb_analysis.parallel report --data data/synthetic/mlb_100k.csv --by Season Team --compare
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis.metrics import calculate_gini, classify_psi
+
+# 少於此列數時在目前行程中執行（行程池的啟動與傳送成本高於計算本身）
+MIN_PARALLEL_ROWS = 50_000
+# 工作行程數（預設為 CPU 數）
+WORKERS_ENV = "MLB_PARALLEL_WORKERS"
+# 每個工作行程平均分到的任務批次數，讓各組大小不均時仍能平衡負載
+CHUNKS_PER_WORKER = 4
+_ALIGN = 64
+
+
+def default_workers():
+    return int(os.environ.get(WORKERS_ENV, 0)) or os.cpu_count() or 1
+
+
+# ============================================================
+# 共享記憶體中的分組資料
+# ============================================================
+def _normalize_key(key, by):
+    return key if isinstance(by, (list, tuple)) else (key[0] if isinstance(key, tuple) else key)
+
+
+class SharedFrame:
+    """將 DataFrame 依分組鍵重新排列後放入共享記憶體；每組為連續的列範圍"""
+
+    def __init__(self, df, by, columns=None):
+        columns = list(columns) if columns is not None else list(df.columns)
+        grouper = df.groupby(by, sort=True, observed=True, dropna=True)
+        codes = grouper.ngroup().to_numpy()
+        sizes = grouper.size()
+        keep = codes >= 0
+        order = np.flatnonzero(keep)[np.argsort(codes[keep], kind='stable')]
+        bounds = np.concatenate([[0], np.cumsum(sizes.to_numpy())])
+        self.groups = [(_normalize_key(key, by), int(bounds[i]), int(bounds[i + 1]))
+                       for i, key in enumerate(sizes.index)]
+
+        # 先決定每個陣列的型別與位移，再配置一整塊共享記憶體
+        arrays = []
+        index = df.index.to_numpy() if pd.api.types.is_integer_dtype(df.index) else np.arange(len(df))
+        arrays.append(('__index__', index.astype(np.int64, copy=False).take(order), None))
+        for col in columns:
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype) \
+                    and series.dtype != object:
+                arrays.append((col, series.to_numpy().take(order), None))
+            else:
+                values = series.to_numpy(dtype=object).take(order)
+                missing = pd.isna(values)
+                text = np.where(missing, '', values).astype(str)
+                arrays.append((col, text, missing))
+
+        layout, offset = [], 0
+        for col, values, missing in arrays:
+            value_offset = offset
+            offset = -(-(offset + values.nbytes) // _ALIGN) * _ALIGN
+            mask_offset = None
+            if missing is not None:
+                mask_offset = offset
+                offset = -(-(offset + missing.nbytes) // _ALIGN) * _ALIGN
+            layout.append((col, values.dtype.str, value_offset, mask_offset))
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (col, values, missing), (_, _, value_offset, mask_offset) in zip(arrays, layout):
+            np.ndarray(values.shape, values.dtype, self.shm.buf, value_offset)[:] = values
+            if missing is not None:
+                np.ndarray(missing.shape, bool, self.shm.buf, mask_offset)[:] = missing
+        self.spec = {'name': self.shm.name, 'rows': len(order), 'layout': layout}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 工作行程中已附加的共享記憶體：{名稱: (SharedMemory, 陣列)}；新的資料到來時關閉舊的
+_attached = {}
+
+
+def _attach(spec):
+    name = spec['name']
+    if name not in _attached:
+        for old_name in list(_attached):
+            shm, arrays = _attached.pop(old_name)
+            arrays.clear()
+            try:
+                shm.close()
+            except BufferError:
+                pass  # 仍有切片被引用，等待行程結束時釋放
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for col, dtype, value_offset, mask_offset in spec['layout']:
+            values = np.ndarray((spec['rows'],), np.dtype(dtype), shm.buf, value_offset)
+            values.flags.writeable = False
+            mask = None if mask_offset is None else np.ndarray((spec['rows'],), bool, shm.buf, mask_offset)
+            arrays[col] = (values, mask)
+        _attached[name] = (shm, arrays)
+    return _attached[name][1]
+
+
+def _group_frame(arrays, start, stop):
+    """由共享記憶體切片建立一組的 DataFrame（數值欄位為唯讀檢視）"""
+    data = {}
+    for col, (values, mask) in arrays.items():
+        if col == '__index__':
+            continue
+        part = values[start:stop]
+        if mask is not None:
+            part = part.astype(object)
+            part[mask[start:stop]] = np.nan
+        data[col] = part
+    return pd.DataFrame(data, index=pd.Index(arrays['__index__'][0][start:stop]), copy=False)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _run_chunk(spec, func, args, chunk):
+    arrays = _attach(spec)
+    return [func(key, _group_frame(arrays, start, stop), *args) for key, start, stop in chunk]
+
+
+# ============================================================
+# 執行器
+# ============================================================
+class GroupExecutor:
+    """分組計算的行程池；工作行程在第一次需要時啟動，之後重複使用"""
+
+    def __init__(self, workers=None, min_rows=MIN_PARALLEL_ROWS):
+        self.workers = workers or default_workers()
+        self.min_rows = min_rows
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # 不從多執行緒的行程 (例如 Streamlit 伺服器) 直接 fork
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def warm_up(self):
+        """預先啟動所有工作行程並載入模組，回傳所花秒數"""
+        start = time.perf_counter()
+        pool = self._executor()
+        for future in [pool.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        return time.perf_counter() - start
+
+    def map_groups(self, df, by, func, columns=None, args=(), keys=None):
+        """對 df 依 by 分組，每組呼叫 func(鍵, 該組 DataFrame, *args)，回傳 [(鍵, 結果)]
+
+        結果依分組鍵排序；指定 keys 時只計算這些鍵並依 keys 的順序回傳（沒有資料的鍵略過）。
+        func 必須是模組層級的函數（可被 pickle），且不可修改傳入的 DataFrame。
+        """
+        by_cols = list(by) if isinstance(by, (list, tuple)) else [by]
+        if keys is not None:
+            if len(by_cols) == 1:
+                df = df[df[by_cols[0]].isin(keys)]
+            else:
+                wanted = pd.MultiIndex.from_tuples([tuple(k) for k in keys], names=by_cols)
+                df = df[pd.MultiIndex.from_frame(df[by_cols]).isin(wanted)]
+        columns = list(columns) if columns is not None else [c for c in df.columns if c not in by_cols]
+
+        if len(df) < self.min_rows or self.workers <= 1:
+            results = [(_normalize_key(key, by), func(_normalize_key(key, by), frame, *args))
+                       for key, frame in df.groupby(by, sort=True, observed=True)[columns]]
+        else:
+            with SharedFrame(df, by, columns) as shared:
+                groups = shared.groups
+                size = max(1, math.ceil(len(groups) / (self.workers * CHUNKS_PER_WORKER)))
+                chunks = [groups[i:i + size] for i in range(0, len(groups), size)]
+                futures = [self._executor().submit(_run_chunk, shared.spec, func, args, chunk) for chunk in chunks]
+                values = [value for future in futures for value in future.result()]
+            results = [(key, value) for (key, _, _), value in zip(groups, values)]
+
+        if keys is None:
+            return results
+        by_key = dict(results)
+        return [(key, by_key[key]) for key in keys if key in by_key]
+
+    def map_tasks(self, func, tasks, progress=None):
+        """在行程池中執行彼此獨立的任務 func(*task)（不需分組資料時使用），依 tasks 的順序回傳結果
+
+        指定 progress 時每收集一個結果呼叫 progress(完成數, 任務數)；progress 拋出例外時取消尚未開始的任務
+        """
+        pool = self._executor()
+        futures = [pool.submit(func, *task) for task in tasks]
+        results = []
+        try:
+            for future in futures:
+                results.append(future.result())
+                if progress is not None:
+                    progress(len(results), len(futures))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+_default_executor = None
+
+
+def get_executor():
+    """行程內共用的執行器"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = GroupExecutor()
+    return _default_executor
+
+
+# ============================================================
+# 球隊報表
+# ============================================================
+def team_summary(key, frame, league_efficiency):
+    """單一球隊（或球季 × 球隊）的彙總指標與 PSI（同球隊分析頁的公式）
+
+    資料沒有 WAR 欄位時（league_efficiency 為 None）只計算薪資相關指標，WAR 相關欄位為 NaN
+    """
+    if isinstance(league_efficiency, dict):
+        league_efficiency = league_efficiency[key[:-1]]
+    total_salary = frame['Salary_millions'].sum()
+    if league_efficiency is None:
+        total_war = expected_war = excess_war = team_risk = psi = np.nan
+    else:
+        total_war = frame['WAR'].sum()
+        expected_war = total_salary * league_efficiency
+        excess_war = total_war - expected_war
+        team_risk = frame['WAR'].std()
+        psi = excess_war / team_risk if team_risk > 0 else 0
+    return {
+        '球員數': len(frame),
+        '總WAR': total_war,
+        '總薪資(M)': total_salary,
+        '平均薪資': frame['Salary_millions'].mean(),
+        '效率': total_war / total_salary if total_salary > 0 else np.nan,
+        '預期WAR': expected_war,
+        '超額WAR': excess_war,
+        '球隊風險': team_risk,
+        'PSI': psi,
+        'Gini': calculate_gini(frame['Salary_millions']),
+    }
+
+
+def team_report(df, by='Team', keys=None, league_df=None, executor=None):
+    """各球隊的彙總指標、PSI、管理評價與薪資基尼係數
+
+    by 的最後一欄為球隊，其餘欄位（例如 Season）視為聯盟範圍：聯盟平均效率在每個範圍內分別計算。
+    league_df 為計算聯盟平均效率的資料（預設為 df）。
+    資料沒有 WAR 欄位時只需要 Salary_millions：PSI 等 WAR 相關欄位為 NaN，基尼係數照常計算。
+    """
+    executor = executor or get_executor()
+    by_cols = list(by) if isinstance(by, (list, tuple)) else [by]
+    league_df = df if league_df is None else league_df
+    columns = ['WAR', 'Salary_millions'] if 'WAR' in df.columns and 'WAR' in league_df.columns else ['Salary_millions']
+    if 'WAR' not in columns:
+        league_efficiency = None
+    elif len(by_cols) == 1:
+        league_efficiency = league_df['WAR'].sum() / league_df['Salary_millions'].sum()
+    else:
+        totals = league_df.groupby(by_cols[:-1], observed=True)[['WAR', 'Salary_millions']].sum()
+        league_efficiency = {(k if isinstance(k, tuple) else (k,)): war / salary
+                             for k, war, salary in zip(totals.index, totals['WAR'], totals['Salary_millions'])}
+
+    results = executor.map_groups(df, by, team_summary, columns=columns, args=(league_efficiency,), keys=keys)
+    key_frame = pd.DataFrame([key if isinstance(key, tuple) else (key,) for key, _ in results], columns=by_cols)
+    report = pd.concat([key_frame, pd.DataFrame([value for _, value in results])], axis=1)
+    if len(report):
+        report['管理評價'] = classify_psi(report['PSI'])
+    return report
+
+
+# ============================================================
+# 命令列
+# ============================================================
+def _report_command(args):
+    from mlb_analysis.metrics import preprocess_data
+    from mlb_analysis.score import read_input
+
+    df = preprocess_data(read_input(args.data))
+    missing = [col for col in args.by if col not in df.columns]
+    if missing:
+        print(f"❌ 資料中沒有分組欄位: {', '.join(missing)}")
+        return 2
+    print(f"📂 {len(df):,} 列，分組 {args.by}")
+
+    executor = GroupExecutor(workers=args.workers, min_rows=0)
+    try:
+        print(f"⚙️  啟動 {executor.workers} 個工作行程：{executor.warm_up():.2f}s")
+        start = time.perf_counter()
+        report = team_report(df, by=args.by, executor=executor)
+        elapsed = time.perf_counter() - start
+        print(f"✅ {len(report)} 組，{executor.workers} 個工作行程：{elapsed:.2f}s")
+
+        if args.compare:
+            start = time.perf_counter()
+            serial = team_report(df, by=args.by, executor=GroupExecutor(workers=1))
+            serial_elapsed = time.perf_counter() - start
+            same = serial.equals(report)
+            print(f"{'✅' if same else '❌'} 單一行程：{serial_elapsed:.2f}s（加速 {serial_elapsed / elapsed:.1f}×，"
+                  f"結果{'相同' if same else '不同'}）")
+            if not same:
+                return 1
+    finally:
+        executor.shutdown()
+
+    if args.out:
+        report.to_csv(args.out, index=False, encoding='utf-8-sig')
+        print(f"💾 {args.out}")
+    else:
+        print(report.head(args.show).to_string(index=False))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以行程池平行執行分組計算")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="各球隊（或球季 × 球隊）的彙總指標、PSI 與基尼係數")
+    report_parser.add_argument("--data", required=True, help="CSV/Parquet 資料檔")
+    report_parser.add_argument("--by", nargs="+", default=["Team"], help="分組欄位，最後一欄為球隊")
+    report_parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 數）")
+    report_parser.add_argument("--compare", action="store_true", help="另以單一行程執行並比較時間與結果")
+    report_parser.add_argument("--out", default=None, help="輸出 CSV（未指定時印出前幾列）")
+    report_parser.add_argument("--show", type=int, default=20, help="印出的列數")
+    report_parser.set_defaults(func=_report_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+# permutation.py - 市場效率的置換檢定與拔靴信賴區間
+"""檢驗「市場效率指標」的各項結論是否可能只是隨機造成：在「薪資與表現無關」的虛無假設下，
+將薪資在球員之間隨機重排數千次，比較觀察值與虛無分布，得到置換檢定 p 值；
+另以重抽球員（拔靴法）估計各統計量的 95% 信賴區間。
+
+檢定的統計量：
+    correlation          WAR 與薪資的相關係數（雙尾）
+    r_squared            單一自變數回歸 WAR → 薪資的 R²（右尾）
+    cost_per_war_spread  各守備位置每 1 WAR 成本的差距（最高 − 最低，同位置套利分析，右尾）
+    psi_dispersion       各球隊 PSI 的標準差（同球隊 PSI 公式，右尾）
+
+重抽以區塊向量化：每個區塊一次產生 B × n 的薪資矩陣，以 np.bincount 一次計算所有重抽的分組總和。
+區塊的亂數種子由 SeedSequence 衍生，結果與工作行程數無關；
+計算量大時分散到共用的行程池 (parallel.GroupExecutor)，否則在目前行程中執行。
+
+用法：
+    python -m mlb_analysis.permutation --permutations 10000 --bootstrap 2000
+    python -m mlb_analysis.permutation --data data/synthetic/mlb_100k.csv --workers 4
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis.parallel import CHUNKS_PER_WORKER, GroupExecutor
+
+# 統計量 → (名稱, 對立假設)
+STATISTICS = {
+    'correlation': ('WAR 與薪資相關係數', 'two-sided'),
+    'r_squared': ('R² (WAR → 薪資)', 'greater'),
+    'cost_per_war_spread': ('位置 Cost_per_WAR 差距', 'greater'),
+    'psi_dispersion': ('球隊 PSI 標準差', 'greater'),
+}
+# 與位置套利分析、calculate_all_team_psi 相同的最少球員數
+MIN_POSITION_PLAYERS = 5
+MIN_TEAM_PLAYERS = 3
+# 每個區塊的元素數（重抽次數 × 球員數），限制單一區塊的暫存記憶體
+BLOCK_ELEMENTS = 1_000_000
+# 總元素數少於此值時在目前行程中計算
+MIN_PARALLEL_ELEMENTS = 50_000_000
+
+
+# ============================================================
+# 區塊向量化的統計量
+# ============================================================
+def prepare(df):
+    """取出檢定所需的陣列：薪資、WAR，以及位置與球隊代碼（缺失值歸入最後一組，不參與計算）"""
+    data = df[['WAR', 'Salary_millions']].join(df[[col for col in ('Position', 'Team') if col in df.columns]])
+    data = data.dropna(subset=['WAR', 'Salary_millions'])
+    arrays = {
+        'salary': data['Salary_millions'].to_numpy(np.float64),
+        'war': data['WAR'].to_numpy(np.float64),
+    }
+    for col, name in (('Position', 'pos'), ('Team', 'team')):
+        if col in data.columns:
+            codes, labels = pd.factorize(data[col])
+        else:
+            codes, labels = np.full(len(data), -1), []
+        arrays[name] = np.where(codes < 0, len(labels), codes).astype(np.intp)
+        arrays[f'n_{name}'] = len(labels)
+    return arrays
+
+
+def _sums(values, codes, groups):
+    """各組總和；values 或 codes 為二維 (B, n) 時回傳 (B, groups)，否則為 (groups,)。values 為 None 時計算組內個數"""
+    k = groups + 1
+    if (values is None or values.ndim == 1) and codes.ndim == 1:
+        return np.bincount(codes, weights=values, minlength=k)[:groups]
+    rows = (values if values is not None else codes).shape[0]
+    index = codes + k * np.arange(rows)[:, None]
+    weights = None if values is None else values.ravel()
+    return np.bincount(index.ravel(), weights=weights, minlength=rows * k).reshape(rows, k)[:, :groups]
+
+
+def _nanrange(values):
+    valid = ~np.isnan(values)
+    high = np.where(valid, values, -np.inf).max(axis=1)
+    low = np.where(valid, values, np.inf).min(axis=1)
+    return np.where(valid.any(axis=1), high - low, np.nan)
+
+
+def block_statistics(salary, war, pos, team, n_pos, n_team, permuted=False):
+    """一個區塊所有重抽的統計量 {名稱: (B,) 陣列}
+
+    salary 為 (B, n)；war、pos、team 為 (n,)（置換：固定不變）或 (B, n)（拔靴：隨重抽改變）。
+    permuted=True 表示每列都是同一組薪資的重排：薪資的總和與平方和不變，只需由第一列計算
+    """
+    salary = np.atleast_2d(salary)
+    centered_w = war - war.mean(axis=-1, keepdims=True)
+    if permuted:
+        # centered_w 總和為 0，共變異數不需先將薪資置中
+        covariance = salary @ centered_w
+        salary_ss = np.sum((salary[0] - salary[0].mean()) ** 2)
+        salary_total = salary[0].sum()
+        war_ss = centered_w @ centered_w
+    else:
+        centered_s = salary - salary.mean(axis=1, keepdims=True)
+        salary_ss = (centered_s ** 2).sum(axis=1)
+        salary_total = salary.sum(axis=1)
+        if war.ndim == 1:
+            covariance = centered_s @ centered_w
+            war_ss = centered_w @ centered_w
+        else:
+            covariance = (centered_s * centered_w).sum(axis=1)
+            war_ss = (centered_w ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = covariance / np.sqrt(salary_ss * war_ss)
+
+        # 位置：每 1 WAR 成本 = 平均薪資 / 平均 WAR = 薪資總和 / WAR 總和
+        pos_salary = _sums(salary, pos, n_pos)
+        pos_war = np.broadcast_to(_sums(war, pos, n_pos), pos_salary.shape)
+        pos_count = np.broadcast_to(_sums(None, pos, n_pos), pos_salary.shape)
+        cost = np.where(pos_count >= MIN_POSITION_PLAYERS, pos_salary / pos_war, np.nan)
+
+        # 球隊 PSI = (總WAR − 總薪資 × 聯盟效率) / 球隊 WAR 標準差
+        team_salary = _sums(salary, team, n_team)
+        team_war = np.broadcast_to(_sums(war, team, n_team), team_salary.shape)
+        team_war2 = np.broadcast_to(_sums(war ** 2, team, n_team), team_salary.shape)
+        team_count = np.broadcast_to(_sums(None, team, n_team), team_salary.shape)
+        efficiency = war.sum(axis=-1) / salary_total
+        variance = np.maximum(team_war2 - team_war ** 2 / team_count, 0) / (team_count - 1)
+        risk = np.where(team_count > 1, np.sqrt(variance), 1.0)
+        excess = team_war - team_salary * np.reshape(efficiency, (-1, 1))
+        psi = np.where(risk > 1e-12, excess / np.where(risk > 1e-12, risk, 1.0), 0.0)
+        counted = team_count >= MIN_TEAM_PLAYERS
+        teams = counted.sum(axis=1)
+        mean_psi = np.where(counted, psi, 0).sum(axis=1) / teams
+        squares = np.where(counted, (psi - mean_psi[:, None]) ** 2, 0).sum(axis=1)
+        dispersion = np.where(teams > 1, np.sqrt(squares / (teams - 1)), np.nan)
+
+    return {
+        'correlation': r,
+        'r_squared': r ** 2,
+        'cost_per_war_spread': _nanrange(cost),
+        'psi_dispersion': dispersion,
+    }
+
+
+def _run_blocks(arrays, blocks):
+    """在工作行程中計算多個區塊；blocks 為 [(種類, 重抽次數, SeedSequence)]"""
+    results = []
+    n = len(arrays['salary'])
+    groups = {'n_pos': arrays['n_pos'], 'n_team': arrays['n_team']}
+    for kind, size, seed in blocks:
+        rng = np.random.default_rng(seed)
+        if kind == 'permutation':
+            salary = rng.permuted(np.tile(arrays['salary'], (size, 1)), axis=1)
+            stats = block_statistics(salary, arrays['war'], arrays['pos'], arrays['team'], **groups, permuted=True)
+        else:
+            index = rng.integers(0, n, size=(size, n))
+            stats = block_statistics(arrays['salary'][index], arrays['war'][index],
+                                     arrays['pos'][index], arrays['team'][index], **groups)
+        results.append((kind, stats))
+    return results
+
+
+# ============================================================
+# 檢定
+# ============================================================
+def check_counts(n_permutations, n_bootstrap):
+    """置換與拔靴次數必須是非負整數，否則引發 ValueError"""
+    for name, value in (('n_permutations', n_permutations), ('n_bootstrap', n_bootstrap)):
+        if isinstance(value, bool) or not isinstance(value, (int, np.integer)) or value < 0:
+            raise ValueError(f"{name} 必須是非負整數: {value!r}")
+
+
+def _plan(kind, total, n, seed_seq):
+    size = max(1, min(total, BLOCK_ELEMENTS // max(n, 1)))
+    count = math.ceil(total / size) if total else 0
+    seeds = seed_seq.spawn(count)
+    return [(kind, min(size, total - i * size), seeds[i]) for i in range(count)]
+
+
+def _p_value(null, observed, alternative):
+    null = null[~np.isnan(null)]
+    if np.isnan(observed) or len(null) == 0:
+        return np.nan
+    tolerance = 1e-12 * max(1.0, abs(observed))
+    if alternative == 'two-sided':
+        extreme = np.abs(null) >= abs(observed) - tolerance
+    else:
+        extreme = null >= observed - tolerance
+    return (extreme.sum() + 1) / (len(null) + 1)
+
+
+def permutation_test(df, n_permutations=2000, n_bootstrap=0, seed=0, executor=None,
+                     min_parallel=MIN_PARALLEL_ELEMENTS, progress=None):
+    """置換檢定與拔靴信賴區間；指定 executor 且計算量達 min_parallel 個元素時分散到其行程池
+
+    指定 progress 時每完成一個區塊（平行計算時為一批區塊）呼叫 progress(完成區塊數, 總區塊數)
+
+    回傳 dict：observed / p_values / null / bootstrap（{統計量: 值或陣列}）、ci（{統計量: (下限, 上限)}）、
+    n、n_permutations、n_bootstrap、blocks、workers，以及各階段秒數 timing
+    """
+    check_counts(n_permutations, n_bootstrap)
+    start = time.perf_counter()
+    arrays = prepare(df)
+    n = len(arrays['salary'])
+    groups = {'n_pos': arrays['n_pos'], 'n_team': arrays['n_team']}
+    observed = {name: float(values[0]) for name, values in block_statistics(
+        arrays['salary'], arrays['war'], arrays['pos'], arrays['team'], **groups).items()}
+    observed_seconds = time.perf_counter() - start
+
+    permutation_seq, bootstrap_seq = np.random.SeedSequence(seed).spawn(2)
+    blocks = _plan('permutation', n_permutations, n, permutation_seq) + _plan('bootstrap', n_bootstrap, n, bootstrap_seq)
+
+    run_start = time.perf_counter()
+    elements = (n_permutations + n_bootstrap) * n
+    if executor is not None and executor.workers > 1 and elements >= min_parallel and len(blocks) > 1:
+        used_workers = executor.workers
+        size = max(1, math.ceil(len(blocks) / (used_workers * CHUNKS_PER_WORKER)))
+        chunks = [blocks[i:i + size] for i in range(0, len(blocks), size)]
+        chunk_progress = None if progress is None else (
+            lambda done, total: progress(min(done * size, len(blocks)), len(blocks)))
+        results = [item for part in executor.map_tasks(_run_blocks, [(arrays, chunk) for chunk in chunks],
+                                                       progress=chunk_progress)
+                   for item in part]
+    else:
+        used_workers = 1
+        results = []
+        for done, block in enumerate(blocks, start=1):
+            results.extend(_run_blocks(arrays, [block]))
+            if progress is not None:
+                progress(done, len(blocks))
+    run_seconds = time.perf_counter() - run_start
+
+    def collect(kind):
+        return {name: np.concatenate([stats[name] for k, stats in results if k == kind] or [np.empty(0)])
+                for name in STATISTICS}
+
+    null, bootstrap = collect('permutation'), collect('bootstrap')
+    p_values = {name: _p_value(null[name], observed[name], alternative)
+                for name, (_, alternative) in STATISTICS.items()}
+    ci = {name: tuple(np.nanpercentile(values, [2.5, 97.5])) if np.isfinite(values).any() else (np.nan, np.nan)
+          for name, values in bootstrap.items()} if n_bootstrap else {}
+
+    return {
+        'observed': observed,
+        'p_values': p_values,
+        'null': null,
+        'bootstrap': bootstrap,
+        'ci': ci,
+        'n': n,
+        'n_permutations': n_permutations,
+        'n_bootstrap': n_bootstrap,
+        'blocks': len(blocks),
+        'workers': used_workers,
+        'timing': {'observed': observed_seconds, 'resampling': run_seconds,
+                   'total': time.perf_counter() - start},
+    }
+
+
+def summary_table(result):
+    """檢定結果表：統計量、觀察值、虛無分布平均與標準差、p 值、拔靴 95% 信賴區間"""
+    rows = []
+    for name, (label, alternative) in STATISTICS.items():
+        null = result['null'][name]
+        row = {
+            '統計量': label,
+            '觀察值': result['observed'][name],
+            '虛無分布平均': np.nanmean(null) if len(null) else np.nan,
+            '虛無分布標準差': np.nanstd(null) if len(null) else np.nan,
+            '對立假設': '雙尾' if alternative == 'two-sided' else '右尾',
+            'p 值': result['p_values'][name],
+        }
+        if result['ci']:
+            row['95% CI 下限'], row['95% CI 上限'] = result['ci'][name]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _count(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"必須是非負整數: {text}")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="市場效率指標的置換檢定與拔靴信賴區間")
+    parser.add_argument("--data", default=None, help="CSV/Parquet 資料檔（預設為專案資料）")
+    parser.add_argument("--permutations", type=_count, default=10000, help="置換次數")
+    parser.add_argument("--bootstrap", type=_count, default=2000, help="拔靴次數（0 表示不計算信賴區間）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（指定時一律平行計算；預設為 CPU 數，計算量大時才平行）")
+    args = parser.parse_args(argv)
+
+    from mlb_analysis.dataset import BUNDLED_DATA
+    from mlb_analysis.metrics import preprocess_data
+    from mlb_analysis.score import read_input
+
+    df = preprocess_data(read_input(args.data or BUNDLED_DATA))
+    executor = GroupExecutor(workers=args.workers)
+    try:
+        result = permutation_test(df, args.permutations, args.bootstrap, seed=args.seed, executor=executor,
+                                  min_parallel=0 if args.workers else MIN_PARALLEL_ELEMENTS)
+    finally:
+        executor.shutdown()
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        print(summary_table(result).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    timing = result['timing']
+    print(f"\n✅ {result['n']:,} 位球員，{result['n_permutations']:,} 次置換 + {result['n_bootstrap']:,} 次拔靴，"
+          f"{result['blocks']} 個區塊 / {result['workers']} 個行程，重抽 {timing['resampling']:.2f}s，"
+          f"共 {timing['total']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# precompute.py - 資料載入後於背景預先計算耗時的衍生結果
+"""資料集載入後，在背景執行緒依優先順序預先計算各分析頁耗時的衍生結果
+（WVPI 的 PCA 驗證、TPM 矩陣、各球隊 PSI、SEI），結果以 (資料集版本, 名稱) 為鍵值存放，所有工作階段共用。
+
+頁面取用結果時：
+- 已完成：直接回傳（命中）
+- 背景計算中：等待該次計算完成，不重複計算
+- 尚未開始：從佇列中取消，改在目前執行緒立即計算（不必排隊等其他結果）
+
+載入新的資料集版本時，超過保留數量的舊版本中尚未開始的計算會被取消。
+計算在背景執行緒中執行，同一時間只計算一項；設定 MLB_PRECOMPUTE=0 可停用背景計算。
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from mlb_analysis.charts import plot_tpm_matrix
+from mlb_analysis.figure_cache import make_key
+from mlb_analysis.metrics import calculate_all_team_psi, calculate_sei, calculate_wvpi_pca_weights
+
+logger = logging.getLogger(__name__)
+
+ENABLED_ENV = "MLB_PRECOMPUTE"
+# 保留結果的資料集版本數
+MAX_VERSIONS = 2
+
+
+def enabled():
+    """是否啟用背景預先計算（預設啟用）"""
+    return os.environ.get(ENABLED_ENV, "1") != "0"
+
+
+class Task:
+    """一項衍生結果的計算；state 為 queued / running / done / failed / cancelled"""
+
+    def __init__(self, version, name, fn, priority):
+        self.version = version
+        self.name = name
+        self.fn = fn
+        self.priority = priority
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.seconds = None
+        self.background = True
+        self.done = threading.Event()
+
+
+class PrecomputeScheduler:
+    """依優先順序（數字小者優先）在背景執行緒計算衍生結果，結果供所有工作階段共用（執行緒安全）"""
+
+    def __init__(self, max_versions=MAX_VERSIONS):
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._versions = OrderedDict()  # 資料集版本 → {名稱: Task}
+        self._thread = None
+        self._stats = {'hits': 0, 'waits': 0, 'misses': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+    # ------------------------------------------------------------
+    # 排程
+    # ------------------------------------------------------------
+    def _tasks(self, version):
+        """取得版本的任務表（需持有鎖）；新版本超過保留數量時淘汰最舊的版本"""
+        tasks = self._versions.get(version)
+        if tasks is None:
+            tasks = self._versions[version] = {}
+            while len(self._versions) > self.max_versions:
+                _, old = self._versions.popitem(last=False)
+                for task in old.values():
+                    self._cancel(task)
+        else:
+            self._versions.move_to_end(version)
+        return tasks
+
+    def _cancel(self, task):
+        if task.state == 'queued':
+            task.state = 'cancelled'
+            task.done.set()
+            self._stats['cancelled'] += 1
+
+    def scheduled(self, version):
+        """該資料集版本是否已排程"""
+        with self._lock:
+            return version in self._versions
+
+    def submit(self, version, name, fn, priority=0):
+        """排入背景計算；同一版本的同名結果已排入、計算中或已完成時不重複排入"""
+        with self._lock:
+            tasks = self._tasks(version)
+            task = tasks.get(name)
+            if task is not None and task.state not in ('cancelled', 'failed'):
+                return task
+            task = tasks[name] = Task(version, name, fn, priority)
+            self._queue.put((priority, next(self._order), task))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="mlb-precompute", daemon=True)
+                self._thread.start()
+        return task
+
+    def cancel(self, version=None, name=None):
+        """取消尚未開始的計算（未指定時取消全部），回傳取消的數量"""
+        cancelled = 0
+        with self._lock:
+            for task_version, tasks in self._versions.items():
+                if version is not None and task_version != version:
+                    continue
+                for task in tasks.values():
+                    if (name is None or task.name == name) and task.state == 'queued':
+                        self._cancel(task)
+                        cancelled += 1
+        return cancelled
+
+    # ------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------
+    def _worker(self):
+        while True:
+            _, _, task = self._queue.get()
+            with self._lock:
+                if task.state != 'queued':
+                    continue
+                task.state = 'running'
+            self._execute(task, task.fn)
+
+    def _execute(self, task, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            with self._lock:
+                task.state, task.error = 'failed', e
+                self._stats['failed'] += 1
+            if not task.background:
+                raise
+            # 背景執行緒不能因單一任務失敗而結束，否則之後排入的任務都不會執行
+            logger.exception("背景計算 %s 失敗", task.name)
+        else:
+            with self._lock:
+                task.state, task.result = 'done', result
+                self._stats['done'] += 1
+            return result
+        finally:
+            task.seconds = time.perf_counter() - start
+            task.done.set()
+
+    def get(self, version, name, fn):
+        """取得結果：已完成直接回傳；背景計算中則等待；尚未開始或沒有排程則在目前執行緒以 fn 計算"""
+        with self._lock:
+            task = self._versions.get(version, {}).get(name)
+            if task is not None and task.state == 'done':
+                self._stats['hits'] += 1
+                return task.result
+            wait = task is not None and task.state == 'running'
+            if not wait:
+                # 由目前執行緒接手；佇列中的同一項目輪到時會因狀態已改變而略過
+                if task is None or task.state != 'queued':
+                    task = self._tasks(version)[name] = Task(version, name, fn, priority=None)
+                task.state, task.background = 'running', False
+                self._stats['misses'] += 1
+
+        if wait:
+            task.done.wait()
+            with self._lock:
+                self._stats['waits'] += 1
+            if task.state == 'done':
+                return task.result
+            # 背景計算失敗時在目前執行緒重新計算，讓錯誤在頁面上呈現
+            return fn()
+        return self._execute(task, fn)
+
+    # ------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------
+    def stats(self):
+        """取用次數（命中 / 等待背景計算 / 在目前執行緒計算）與任務數"""
+        with self._lock:
+            states = [task.state for tasks in self._versions.values() for task in tasks.values()]
+            return {
+                **self._stats,
+                'queued': states.count('queued'),
+                'running': states.count('running'),
+                'versions': len(self._versions),
+            }
+
+    def timings(self, version):
+        """該版本各項結果的狀態、計算秒數，以及是否在背景計算"""
+        with self._lock:
+            return {name: {'state': task.state, 'seconds': task.seconds, 'background': task.background}
+                    for name, task in self._versions.get(version, {}).items()}
+
+
+# ============================================================
+# 儀表板的衍生結果
+# ============================================================
+def tpm_counts(df, version, figure_cache=None):
+    """TPM 各象限人數；同時把 TPM 矩陣圖存入圖表快取（鍵值 tpm_matrix）"""
+    fig, tpm_df = plot_tpm_matrix(df)
+    if fig is None:
+        return None
+    if figure_cache is not None:
+        figure_cache.put(make_key(version, 'tpm_matrix', None), fig.to_json())
+    return tpm_df['TPM_category'].value_counts()
+
+
+def dataset_artifacts(df, version, figure_cache=None):
+    """{名稱: (優先順序, 計算函數)}；依計算成本排序，最耗時的先算"""
+    return {
+        'wvpi_pca': (0, lambda: calculate_wvpi_pca_weights(df)),
+        'tpm': (1, lambda: tpm_counts(df, version, figure_cache)),
+        'team_psi': (2, lambda: calculate_all_team_psi(df)),
+        'sei': (3, lambda: calculate_sei(df)),
+    }
+
+
+def schedule_dataset(scheduler, version, df, figure_cache=None):
+    """資料集載入後排入所有衍生結果的背景計算（每個版本只排一次），回傳是否有新排程"""
+    if not enabled() or scheduler.scheduled(version):
+        return False
+    # 背景執行緒使用自己的複本，頁面之後對 df 新增欄位不會與計算互相干擾
+    snapshot = df.copy()
+    for name, (priority, fn) in dataset_artifacts(snapshot, version, figure_cache).items():
+        scheduler.submit(version, name, fn, priority)
+    return True
@@ -0,0 +1,255 @@
+# profiler.py - 取樣式效能分析
+"""對單一次腳本執行 (rerun) 進行取樣式效能分析：背景執行緒定期讀取腳本執行緒的呼叫堆疊，
+輸出 collapsed stack（flamegraph.pl / inferno 可讀）與 speedscope JSON。
+
+每個樣本的最外層會加上目前的分析模式 (mode:...) 與所在分頁 (tab:...) 虛擬框架；
+分頁由腳本原始碼的 `tab1, tab2 = st.tabs([...])` 與 `with tab1:` 區塊行號推得，不必修改儀表板程式。
+"""
+import ast
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from mlb_analysis.dataset import REPO_ROOT
+
+DEFAULT_OUTPUT_DIR = os.path.join(REPO_ROOT, ".profiles")
+DEFAULT_INTERVAL_MS = 5.0
+STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+_section_cache = {}
+
+
+# ============================================================
+# 分頁區段
+# ============================================================
+def _tab_labels(node):
+    """若為 `a, b = st.tabs([...])` 形式的指派，回傳 {變數名稱: 分頁標籤}"""
+    if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Call):
+        return {}
+    func = node.value.func
+    if not (isinstance(func, ast.Attribute) and func.attr == 'tabs') or not node.value.args:
+        return {}
+    labels_node = node.value.args[0]
+    if not isinstance(labels_node, (ast.List, ast.Tuple)):
+        return {}
+    target = node.targets[0]
+    if not isinstance(target, (ast.Tuple, ast.List)):
+        return {}
+
+    labels = {}
+    for name, label in zip(target.elts, labels_node.elts):
+        if isinstance(name, ast.Name) and isinstance(label, ast.Constant):
+            labels[name.id] = str(label.value)
+    return labels
+
+
+def script_sections(path):
+    """解析腳本，回傳各 `with <分頁>:` 區塊的 (起始行, 結束行, 分頁標籤)；依檔案修改時間快取"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    cached = _section_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    # 分頁變數名稱可能在不同模式重複使用（tab1, tab2 ...），依出現順序對應最近一次指派
+    assignments = []
+    for node in ast.walk(tree):
+        labels = _tab_labels(node)
+        if labels:
+            assignments.append((node.lineno, labels))
+    assignments.sort()
+
+    sections = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.With):
+            continue
+        for item in node.items:
+            expr = item.context_expr
+            if not isinstance(expr, ast.Name):
+                continue
+            label = None
+            for lineno, labels in assignments:
+                if lineno > node.lineno:
+                    break
+                label = labels.get(expr.id, label)
+            if label is not None:
+                sections.append((node.lineno, node.end_lineno, label))
+
+    sections.sort()
+    _section_cache[path] = (mtime, sections)
+    return sections
+
+
+def sections_for_line(sections, lineno):
+    """包含該行的所有分頁標籤（由外到內）"""
+    return [label for start, end, label in sections if start <= lineno <= end]
+
+
+# ============================================================
+# 取樣式分析器
+# ============================================================
+def _short_path(filename):
+    """縮短檔案路徑：套件取 site-packages 之後，專案檔與標準函式庫取相對路徑"""
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(REPO_ROOT):
+        return os.path.relpath(filename, REPO_ROOT)
+    if filename.startswith(STDLIB_DIR):
+        return os.path.relpath(filename, STDLIB_DIR)
+    return filename
+
+
+class SamplingProfiler:
+    """以背景執行緒定期取樣指定執行緒的呼叫堆疊"""
+
+    def __init__(self, script_path=None, interval_ms=DEFAULT_INTERVAL_MS, thread_id=None):
+        self.script_path = os.path.abspath(script_path) if script_path else None
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id or threading.get_ident()
+        self.labels = {}
+        self.stacks = Counter()
+        self.weights = Counter()
+        self.n_samples = 0
+        self.finished = False
+        self._sections = script_sections(self.script_path) if self.script_path else []
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mlb-profiler", daemon=True)
+        self._frame_labels = {}
+
+    def annotate(self, **labels):
+        """加上註記（例如分析模式），會成為樣本最外層的虛擬框架並寫入輸出檔"""
+        self.labels.update({k: v for k, v in labels.items() if v is not None})
+
+    def start(self):
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _frame_label(self, code):
+        label = self._frame_labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_labels[code] = label
+        return label
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return None
+
+        stack = []
+        script_line = None
+        while frame is not None:
+            code = frame.f_code
+            if self.script_path and code.co_filename == self.script_path and code.co_name == '<module>':
+                script_line = frame.f_lineno
+            stack.append(self._frame_label(code))
+            frame = frame.f_back
+        stack.reverse()
+
+        # 最外層加上模式與分頁虛擬框架
+        prefix = [f"{key}:{value}" for key, value in self.labels.items()]
+        if script_line is not None:
+            prefix += [f"tab:{label}" for label in sections_for_line(self._sections, script_line)]
+        return tuple(prefix + stack)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            stack = self._sample()
+            now = time.perf_counter()
+            if stack is not None:
+                self.stacks[stack] += 1
+                self.weights[stack] += now - last
+                self.n_samples += 1
+            last = now
+
+    def stop(self):
+        """停止取樣（重複呼叫無效）"""
+        if not self.finished:
+            self._stop_event.set()
+            if self._thread.is_alive():
+                self._thread.join()
+            self.elapsed = time.perf_counter() - self._start
+            self.finished = True
+        return self
+
+    # ---------- 輸出 ----------
+    def collapsed(self):
+        """collapsed stack 格式：每行「框架;框架;... 樣本數」"""
+        lines = [';'.join(frame.replace(';', ',') for frame in stack) + f" {count}"
+                 for stack, count in self.stacks.most_common()]
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self):
+        """speedscope sampled profile（權重為實際經過的毫秒數）"""
+        frame_index = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, seconds in self.weights.items():
+            indices = []
+            for name in stack:
+                if name not in frame_index:
+                    frame_index[name] = len(frames)
+                    frames.append({'name': name})
+                indices.append(frame_index[name])
+            samples.append(indices)
+            weights.append(seconds * 1000)
+
+        title = ' '.join(f"{k}={v}" for k, v in self.labels.items()) or 'rerun'
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': title,
+            'exporter': 'mlb_analysis.profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': title,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+        }
+
+    def write(self, output_dir=DEFAULT_OUTPUT_DIR, status='ok'):
+        """寫出 collapsed stack 與 speedscope 檔，回傳兩個檔案路徑"""
+        os.makedirs(output_dir, exist_ok=True)
+        tag = '_'.join(str(v) for v in self.labels.values()).replace(os.sep, '-').replace(' ', '')
+        stem = f"{self.started_at:%Y%m%dT%H%M%S}_{self.thread_id % 100000}_{tag or 'rerun'}"
+        if status != 'ok':
+            stem += f"_{status}"
+
+        collapsed_path = os.path.join(output_dir, stem + '.collapsed')
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+
+        speedscope_path = os.path.join(output_dir, stem + '.speedscope.json')
+        with open(speedscope_path, 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(), f, ensure_ascii=False)
+        return collapsed_path, speedscope_path
+
+
+def output_dir():
+    """輸出目錄，可用環境變數 MLB_PROFILE_DIR 指定"""
+    return os.environ.get("MLB_PROFILE_DIR") or DEFAULT_OUTPUT_DIR
+
+
+def interval_ms():
+    """取樣間隔毫秒數，可用環境變數 MLB_PROFILE_INTERVAL_MS 指定"""
+    return float(os.environ.get("MLB_PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS))
@@ -0,0 +1,401 @@
+# report.py - 靜態 HTML 報表
+"""為每個球季與每支球隊預先產生靜態 HTML 報表（內嵌 Plotly 圖表），以靜態檔案提供，瀏覽時不需任何計算。
+
+- 球季頁：各球隊效率排名、PSI 排名、全聯盟羅倫茲曲線、市場異常（被低估 / 被高估）名單
+- 球隊頁：效率與 PSI 排名、管理評價、基尼係數與羅倫茲曲線、球員列表、該隊的市場異常球員
+
+頁面以行程池平行產生（mlb_analysis.parallel 的共享記憶體分組執行器）。
+每個頁面記錄其輸入（該組資料列、球季排名與異常名單、版面版本）的指紋於 manifest.json，
+重新執行時只產生輸入有變更的頁面，並移除已不存在的球隊或球季的頁面。
+
+Plotly.js 預設寫成報表目錄中的一個檔案 (plotly.min.js) 供所有頁面引用，整個目錄可離線使用；
+--plotlyjs inline 則將其內嵌於每一頁（每頁約 3.5 MB）。
+
+用法：
+    python -m mlb_analysis.report --out-dir data/reports
+    python -m mlb_analysis.report --data data/synthetic/mlb_100k.csv --workers 8
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from mlb_analysis.charts import plot_lorenz_curve
+from mlb_analysis.dataset import BUNDLED_DATA, REPO_ROOT, file_version
+from mlb_analysis.lazy_imports import lazy_import
+from mlb_analysis.metrics import (
+    calculate_gini, calculate_salary_residuals, preprocess_data, salary_model_data, split_salary_anomalies,
+)
+from mlb_analysis.parallel import GroupExecutor, team_report
+
+plotly = lazy_import("plotly")
+px = lazy_import("plotly.express")
+plotly_offline = lazy_import("plotly.offline")
+
+DEFAULT_OUT_DIR = os.path.join(REPO_ROOT, "data", "reports")
+MANIFEST_NAME = "manifest.json"
+PLOTLYJS_FILE = "plotly.min.js"
+PLOTLYJS_MODES = ['directory', 'inline', 'cdn']
+
+# 版面或內容改變時遞增，讓所有頁面重新產生
+REPORT_VERSION = 1
+SEASON_COLUMN = 'Season'
+# 頁面只使用單列或單一球季內即可決定的欄位（WVPI 以全資料集標準化，任何一列改變都會影響所有頁面）
+PAGE_COLUMNS = ['Name', 'Team', 'Position', 'WAR', 'Salary_millions', 'value_ratio']
+# 市場異常名單：與市場異常偵測頁的預設設定相同
+ANOMALY_THRESHOLD = 30.0
+ANOMALY_MIN_WAR = 1.0
+MIN_SALARY_THRESHOLD = 1.0
+ANOMALY_TOP = 20
+ANOMALY_COLUMNS = ['Name', 'Team', 'Position', 'WAR', 'Salary_millions', 'expected_salary', 'residual_percent']
+
+CSS = """
+body{font-family:-apple-system,"Noto Sans TC","Microsoft JhengHei",sans-serif;margin:0 auto;max-width:1200px;padding:0 24px;color:#212121}
+h1{color:#1a237e;border-bottom:3px solid #1a237e;padding-bottom:8px}h2{color:#283593;margin-top:32px}
+nav{padding:12px 0;font-size:.9rem}nav a{color:#3949ab;margin-right:12px}
+.cards{display:flex;flex-wrap:wrap;gap:12px}.card{flex:1 1 160px;background:#f5f7ff;border-radius:8px;padding:12px 16px}
+.card .label{font-size:.8rem;color:#5c6bc0}.card .value{font-size:1.5rem;font-weight:600}.card .note{font-size:.8rem;color:#757575}
+table{border-collapse:collapse;width:100%;font-size:.9rem}th,td{padding:6px 8px;border-bottom:1px solid #e0e0e0;text-align:right}
+th{background:#e8eaf6}td:first-child,th:first-child{text-align:left}.columns{display:flex;flex-wrap:wrap;gap:24px}.columns>div{flex:1 1 480px}
+footer{margin:40px 0 24px;font-size:.8rem;color:#9e9e9e}
+"""
+
+
+def slug(value):
+    """檔名用的代稱（球隊名稱如「- - -」轉為 multi-team）"""
+    text = re.sub(r'[^A-Za-z0-9]+', '-', str(value)).strip('-')
+    return text or 'multi-team'
+
+
+# ============================================================
+# HTML
+# ============================================================
+def _plotlyjs_tag(mode, depth):
+    if mode == 'inline':
+        return f"<script>{plotly_offline.get_plotlyjs()}</script>"
+    if mode == 'cdn':
+        return f'<script src="https://cdn.plot.ly/plotly-{plotly_offline.get_plotlyjs_version()}.min.js"></script>'
+    return f'<script src="{"../" * depth}{PLOTLYJS_FILE}"></script>'
+
+
+def _page(title, body, nav, depth, plotlyjs, version):
+    return f"""<!DOCTYPE html>
+<html lang="zh-Hant"><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)}</title>{_plotlyjs_tag(plotlyjs, depth)}<style>{CSS}</style></head>
+<body><nav>{nav}</nav><h1>{html.escape(title)}</h1>
+{body}
+<footer>資料集版本 {html.escape(version)}・產生於 {datetime.now().strftime('%Y-%m-%d %H:%M')}</footer>
+</body></html>
+"""
+
+
+def _figure(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={'displaylogo': False})
+
+
+def _table(frame, float_format='{:,.3f}', escape=True):
+    if frame is None or frame.empty:
+        return '<p>無資料</p>'
+    return frame.to_html(index=False, border=0, escape=escape, na_rep='',
+                         float_format=lambda value: float_format.format(value))
+
+
+def _cards(items):
+    cards = ''.join(
+        f'<div class="card"><div class="label">{html.escape(label)}</div><div class="value">{html.escape(value)}</div>'
+        f'<div class="note">{html.escape(note)}</div></div>'
+        for label, value, note in items
+    )
+    return f'<div class="cards">{cards}</div>'
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def season_path(season):
+    return f"{slug(season)}/index.html"
+
+
+def team_path(season, team):
+    return f"{slug(season)}/teams/{slug(team)}.html"
+
+
+# ============================================================
+# 頁面（在工作行程中產生）
+# ============================================================
+def render_season_page(season, frame, contexts, out_dir, plotlyjs):
+    """球季頁：效率與 PSI 排名、全聯盟羅倫茲曲線、市場異常名單；回傳寫出的相對路徑"""
+    ctx = contexts[season]
+    teams = ctx['teams']
+
+    ranking = teams.sort_values('效率', ascending=False).copy()
+    ranking.insert(0, '排名', range(1, len(ranking) + 1))
+    ranking['Team'] = [f'<a href="teams/{slug(team)}.html">{html.escape(str(team))}</a>' for team in ranking['Team']]
+    ranking = ranking[['排名', 'Team', '球員數', '總WAR', '總薪資(M)', '效率', 'PSI', '管理評價', 'Gini']]
+
+    fig_efficiency = px.bar(teams.sort_values('效率', ascending=False), x='Team', y='效率',
+                            color='效率', color_continuous_scale='plasma', title='球隊效率排名 (WAR / 百萬美元)')
+    fig_psi = px.bar(teams.sort_values('PSI', ascending=False), x='Team', y='PSI', color='PSI',
+                     color_continuous_scale='RdYlGn', title='球隊投資組合夏普指數 (PSI) 排名')
+    fig_psi.add_hline(y=0, line_dash="dash", line_color="gray")
+    fig_lorenz, _ = plot_lorenz_curve(frame, f'{season} 全聯盟')
+
+    body = _cards([
+        ('球隊數', f"{len(teams)}", ''),
+        ('球員數', f"{len(frame):,}", ''),
+        ('聯盟效率', f"{ctx['league_efficiency']:.3f}", 'WAR / 百萬美元'),
+        ('薪資基尼係數', f"{ctx['gini']:.3f}", '0 = 完全平等'),
+    ])
+    body += f"<h2>效率排名</h2>{_table(ranking, escape=False)}"
+    body += f'<div class="columns"><div>{_figure(fig_efficiency)}</div><div>{_figure(fig_psi)}</div></div>'
+    body += f"<h2>薪資不平等</h2>{_figure(fig_lorenz)}"
+    if ctx['undervalued'] is None:
+        body += "<h2>市場異常</h2><p>薪資高於底薪的球員樣本不足，無法建立回歸模型</p>"
+    else:
+        body += (f"<h2>市場異常（實際薪資與 WAR 預期薪資差異超過 {ANOMALY_THRESHOLD:.0f}%）</h2>"
+                 f'<div class="columns"><div><h3>被低估（前 {ANOMALY_TOP} 名）</h3>{_table(ctx["undervalued"])}</div>'
+                 f'<div><h3>被高估（前 {ANOMALY_TOP} 名）</h3>{_table(ctx["overvalued"])}</div></div>')
+
+    nav = '<a href="../index.html">所有球季</a>'
+    path = season_path(season)
+    _write(os.path.join(out_dir, path), _page(f"{season} 球季報表", body, nav, 1, plotlyjs, ctx['version']))
+    return path
+
+
+def render_team_page(key, frame, contexts, out_dir, plotlyjs):
+    """球隊頁：效率與 PSI 排名、羅倫茲曲線、球員列表與市場異常球員；回傳寫出的相對路徑"""
+    season, team = key
+    ctx = contexts[key]
+    summary = ctx['summary']
+    n_teams = ctx['teams_in_season']
+
+    fig_lorenz, gini = plot_lorenz_curve(frame, str(team))
+    players = frame[[col for col in PAGE_COLUMNS if col in frame.columns and col != 'Team']]
+    players = players.sort_values('WAR', ascending=False)
+
+    body = _cards([
+        ('效率', f"{summary['效率']:.3f}", f"第 {summary['效率排名']} / {n_teams} 名"),
+        ('PSI', f"{summary['PSI']:.2f}", f"{summary['管理評價']}・第 {summary['PSI排名']} / {n_teams} 名"),
+        ('總WAR', f"{summary['總WAR']:.1f}", f"{summary['球員數']} 位球員"),
+        ('總薪資', f"${summary['總薪資(M)']:.1f}M", f"平均 ${summary['平均薪資']:.2f}M"),
+        ('薪資基尼係數', f"{gini:.3f}", '分配極度不均' if gini > 0.5 else '分配相對平均'),
+    ])
+    body += f"<h2>薪資不平等</h2>{_figure(fig_lorenz)}"
+    body += f"<h2>球員列表</h2>{_table(players)}"
+    if ctx['anomalies'] is not None and not ctx['anomalies'].empty:
+        body += f"<h2>市場異常球員</h2>{_table(ctx['anomalies'])}"
+
+    nav = f'<a href="../../index.html">所有球季</a><a href="../index.html">{html.escape(str(season))} 球季</a>'
+    path = team_path(season, team)
+    _write(os.path.join(out_dir, path), _page(f"{team}・{season} 球季", body, nav, 2, plotlyjs, ctx['version']))
+    return path
+
+
+def render_index(out_dir, seasons, plotlyjs, version):
+    rows = ''.join(
+        f'<tr><td><a href="{season_path(season)}">{html.escape(str(season))}</a></td><td>{info["teams"]}</td>'
+        f'<td>{info["players"]:,}</td></tr>'
+        for season, info in seasons.items()
+    )
+    body = f"<table><tr><th>球季</th><th>球隊數</th><th>球員數</th></tr>{rows}</table>"
+    _write(os.path.join(out_dir, "index.html"), _page("MLB 薪資效率報表", body, '', 0, plotlyjs, version))
+    return "index.html"
+
+
+# ============================================================
+# 輸入與指紋
+# ============================================================
+def season_anomalies(season_df):
+    """球季內以 WAR→薪資 回歸找出的被低估 / 被高估球員（樣本不足時為 (None, None)）"""
+    df_model = salary_model_data(season_df, MIN_SALARY_THRESHOLD)
+    if len(df_model) < 10:
+        return None, None
+    _, _, residuals = calculate_salary_residuals(season_df, df_model)
+    base = [col for col in ANOMALY_COLUMNS if col in season_df.columns and col not in residuals.columns]
+    frame = season_df[base].join(residuals)
+    frame = frame[(frame['WAR'] >= ANOMALY_MIN_WAR) & (frame['Salary_millions'] >= MIN_SALARY_THRESHOLD)]
+    undervalued, overvalued = split_salary_anomalies(frame, ANOMALY_THRESHOLD)
+    columns = [col for col in ANOMALY_COLUMNS if col in frame.columns]
+    return undervalued[columns].head(ANOMALY_TOP), overvalued[columns].head(ANOMALY_TOP)
+
+
+def build_contexts(df, executor, version):
+    """各球季與各球隊頁面所需的彙總資料（在主行程中計算，隨任務傳給工作行程）"""
+    summaries = team_report(df, by=[SEASON_COLUMN, 'Team'], executor=executor)
+    by_season = summaries.groupby(SEASON_COLUMN)
+    summaries['效率排名'] = by_season['效率'].rank(ascending=False, method='min').astype(int)
+    summaries['PSI排名'] = by_season['PSI'].rank(ascending=False, method='min').astype(int)
+
+    season_contexts, team_contexts = {}, {}
+    for season, season_df in df.groupby(SEASON_COLUMN, sort=True):
+        teams = summaries[summaries[SEASON_COLUMN] == season].drop(columns=[SEASON_COLUMN]).reset_index(drop=True)
+        undervalued, overvalued = season_anomalies(season_df)
+        season_contexts[season] = {
+            'version': version,
+            'teams': teams,
+            'league_efficiency': season_df['WAR'].sum() / season_df['Salary_millions'].sum(),
+            'gini': calculate_gini(season_df['Salary_millions']),
+            'undervalued': undervalued,
+            'overvalued': overvalued,
+        }
+        anomalies = pd.concat([
+            frame.assign(類型=label) for frame, label in ((undervalued, '被低估'), (overvalued, '被高估'))
+            if frame is not None
+        ]) if undervalued is not None else None
+        for row in teams.to_dict('records'):
+            team = row['Team']
+            team_contexts[(season, team)] = {
+                'version': version,
+                'summary': row,
+                'teams_in_season': len(teams),
+                'anomalies': None if anomalies is None else anomalies[anomalies['Team'] == team].drop(columns=['Team']),
+            }
+    return season_contexts, team_contexts
+
+
+def _digest_part(part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        return pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes() + repr(list(getattr(part, 'columns', []))).encode()
+    if isinstance(part, dict):
+        return b'{' + b'|'.join(str(k).encode() + b'=' + _digest_part(v) for k, v in sorted(part.items(), key=lambda kv: str(kv[0]))) + b'}'
+    return repr(part).encode('utf-8')
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(_digest_part(part))
+    return digest.hexdigest()
+
+
+def group_row_hashes(df, by, columns):
+    """每組資料列內容的雜湊 {鍵: 十六進位字串}"""
+    row_hash = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return {key: hashlib.sha1(row_hash[idx].tobytes()).hexdigest()
+            for key, idx in df.groupby(by, sort=False).indices.items()}
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('pages', {})
+
+
+def save_manifest(out_dir, pages, meta):
+    _write(os.path.join(out_dir, MANIFEST_NAME), json.dumps({**meta, 'pages': pages}, ensure_ascii=False, indent=1))
+
+
+# ============================================================
+# 建置
+# ============================================================
+def build(df, out_dir, version, workers=None, plotlyjs='directory', force=False):
+    """產生（或增量更新）報表，回傳 {'rendered': 數量, 'skipped': 數量, 'removed': 數量}"""
+    if SEASON_COLUMN not in df.columns:
+        df = df.assign(**{SEASON_COLUMN: 'all'})
+    df = df.dropna(subset=[SEASON_COLUMN, 'Team']).reset_index(drop=True)
+    columns = [col for col in PAGE_COLUMNS if col in df.columns and col != 'Team']
+
+    executor = GroupExecutor(workers=workers, min_rows=0)
+    try:
+        season_contexts, team_contexts = build_contexts(df, executor, version)
+        layout = (REPORT_VERSION, plotly.__version__, plotlyjs)
+
+        # 各頁面的輸入指紋：該組資料列 + 彙總資料 + 版面版本
+        season_rows = group_row_hashes(df, SEASON_COLUMN, columns + ['Team'])
+        team_rows = group_row_hashes(df, [SEASON_COLUMN, 'Team'], columns)
+        pages = {}
+        season_pages, team_pages = {}, {}
+        for season, ctx in season_contexts.items():
+            path = season_path(season)
+            pages[path] = fingerprint(layout, season_rows[season], {k: v for k, v in ctx.items() if k != 'version'})
+            season_pages[path] = season
+        for key, ctx in team_contexts.items():
+            path = team_path(*key)
+            pages[path] = fingerprint(layout, team_rows[key], {k: v for k, v in ctx.items() if k != 'version'})
+            team_pages[path] = key
+        seasons = {season: {'teams': len(ctx['teams']), 'players': int(ctx['teams']['球員數'].sum())}
+                   for season, ctx in season_contexts.items()}
+        pages['index.html'] = fingerprint(layout, seasons)
+
+        previous = {} if force else load_manifest(out_dir)
+        changed = {path for path, digest in pages.items()
+                   if previous.get(path) != digest or not os.path.exists(os.path.join(out_dir, path))}
+
+        os.makedirs(out_dir, exist_ok=True)
+        if plotlyjs == 'directory':
+            js_path = os.path.join(out_dir, PLOTLYJS_FILE)
+            js_version = plotly_offline.get_plotlyjs_version()
+            if force or previous.get(PLOTLYJS_FILE) != js_version or not os.path.exists(js_path):
+                _write(js_path, plotly_offline.get_plotlyjs())
+
+        changed_seasons = [season for path, season in season_pages.items() if path in changed]
+        changed_teams = [key for path, key in team_pages.items() if path in changed]
+        if changed_seasons:
+            executor.map_groups(df, SEASON_COLUMN, render_season_page, columns=columns + ['Team'],
+                                args=({s: season_contexts[s] for s in changed_seasons}, out_dir, plotlyjs),
+                                keys=changed_seasons)
+        if changed_teams:
+            executor.map_groups(df, [SEASON_COLUMN, 'Team'], render_team_page, columns=columns,
+                                args=({k: team_contexts[k] for k in changed_teams}, out_dir, plotlyjs),
+                                keys=changed_teams)
+        if 'index.html' in changed:
+            render_index(out_dir, seasons, plotlyjs, version)
+    finally:
+        executor.shutdown()
+
+    # 移除已不存在的球季或球隊頁面（只移除先前由報表產生的檔案）
+    removed = 0
+    for path in set(load_manifest(out_dir)) - set(pages) - {PLOTLYJS_FILE}:
+        full = os.path.join(out_dir, path)
+        if os.path.exists(full):
+            os.remove(full)
+            removed += 1
+            try:
+                os.removedirs(os.path.dirname(full))  # 一併移除已清空的球季目錄
+            except OSError:
+                pass
+
+    if plotlyjs == 'directory':
+        pages[PLOTLYJS_FILE] = plotly_offline.get_plotlyjs_version()
+    save_manifest(out_dir, pages, {'report_version': REPORT_VERSION, 'dataset_version': version})
+    return {'rendered': len(changed), 'skipped': len(pages) - len(changed) - (plotlyjs == 'directory'),
+            'removed': removed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="為每個球季與球隊產生靜態 HTML 報表")
+    parser.add_argument("--data", default=BUNDLED_DATA, help="CSV/Parquet 資料檔")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR, help="輸出目錄")
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 數）")
+    parser.add_argument("--plotlyjs", choices=PLOTLYJS_MODES, default="directory",
+                        help="directory: 報表目錄中的共用檔案；inline: 內嵌於每一頁；cdn: 由 CDN 載入")
+    parser.add_argument("--force", action="store_true", help="忽略 manifest，重新產生所有頁面")
+    args = parser.parse_args(argv)
+
+    from mlb_analysis.score import read_input
+
+    start = time.perf_counter()
+    df = preprocess_data(read_input(args.data))
+    result = build(df, args.out_dir, file_version(args.data), workers=args.workers,
+                   plotlyjs=args.plotlyjs, force=args.force)
+    print(f"✅ 產生 {result['rendered']} 頁，未變更 {result['skipped']} 頁，移除 {result['removed']} 頁，"
+          f"共 {time.perf_counter() - start:.1f}s → {os.path.join(args.out_dir, 'index.html')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+# score.py - 批次評分命令列工具
+"""對一個或多個與 merged_performance_salary.csv 相同格式的 CSV/Parquet 檔案，執行與儀表板 load_data
+相同的預處理與原創財務指標計算 (WVPI/RAV/MERI)，加上 TPM 分類與各球隊 PSI，輸出評分結果檔。
+
+檔案以行程池平行處理；每個工作行程處理 --max-tasks-per-child 個檔案後即重新啟動，
+pandas 的暫存記憶體隨行程釋放，整體記憶體上限約為 工作行程數 × 單一檔案所需記憶體。
+可用 --worker-memory-mb 限制每個工作行程的位址空間，超出時該檔案記為失敗而不影響其他檔案。
+
+每個輸入檔產生：
+    <名稱>.scored.<格式>     每位球員的衍生欄位、TPM 分類
+    <名稱>.team_psi.<格式>   各球隊 PSI 與管理評價
+輸出目錄中的 manifest.json 記錄每個輸入檔的版本與評分參數，--skip-unchanged 可略過兩者都未變更的檔案。
+
+用法：
+    python -m mlb_analysis.score data/seasons/*.csv --out-dir data/scored
+    python -m mlb_analysis.score data/seasons --format parquet --workers 4 --skip-unchanged
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from mlb_analysis.dataset import REPO_ROOT, file_version
+from mlb_analysis.metrics import assign_tpm_categories, calculate_all_team_psi, classify_psi, preprocess_data
+
+DEFAULT_OUT_DIR = os.path.join(REPO_ROOT, "data", "scored")
+INPUT_EXTENSIONS = ('.csv', '.parquet', '.pq')
+OUTPUT_FORMATS = ['csv', 'parquet']
+MANIFEST_NAME = "manifest.json"
+# 預處理（欄位名稱標準化）後必須存在的欄位
+REQUIRED_COLUMNS = ['Name', 'Team', 'WAR', 'Salary_millions']
+
+
+# ============================================================
+# 單一檔案評分（在工作行程中執行）
+# ============================================================
+def read_input(path):
+    """讀取 CSV 或 Parquet 輸入檔"""
+    if path.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def write_output(frame, path, fmt):
+    if fmt == 'parquet':
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def score_frame(raw, min_players=3):
+    """計算評分結果，回傳 (球員評分 DataFrame, 球隊 PSI DataFrame)"""
+    df = preprocess_data(raw)
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必要欄位: {', '.join(missing)}")
+
+    tpm = assign_tpm_categories(df)
+    df['value_percentile'] = tpm['value_percentile']
+    df['TPM_category'] = tpm['TPM_category']
+
+    team_psi = calculate_all_team_psi(df, min_players=min_players).reset_index(drop=True)
+    team_psi['管理評價'] = classify_psi(team_psi['PSI'])
+    return df, team_psi
+
+
+def _peak_rss():
+    """工作行程的最高常駐記憶體 (bytes)；不支援的平台回傳 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def score_file(path, out_dir, fmt='csv', min_players=3):
+    """評分一個輸入檔並寫出結果，回傳記錄於 manifest 的摘要"""
+    start = time.perf_counter()
+    version = file_version(path)
+    df, team_psi = score_frame(read_input(path), min_players=min_players)
+
+    stem = output_stem(path)
+    outputs = {
+        'scored': os.path.join(out_dir, f"{stem}.scored.{fmt}"),
+        'team_psi': os.path.join(out_dir, f"{stem}.team_psi.{fmt}"),
+    }
+    write_output(df, outputs['scored'], fmt)
+    write_output(team_psi, outputs['team_psi'], fmt)
+
+    return {
+        'input': os.path.abspath(path),
+        'version': version,
+        'params': scoring_params(min_players),
+        'outputs': {name: os.path.basename(p) for name, p in outputs.items()},
+        'rows': len(df),
+        'teams': len(team_psi),
+        'seconds': time.perf_counter() - start,
+        'peak_rss_bytes': _peak_rss(),
+        'pid': os.getpid(),
+    }
+
+
+def _limit_memory(megabytes):
+    """工作行程初始化：限制位址空間，超出時配置失敗 (MemoryError) 而非耗盡整台機器的記憶體"""
+    import resource
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+# ============================================================
+# 輸入與 manifest
+# ============================================================
+def output_stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def collect_inputs(paths):
+    """展開輸入：目錄取其中的 CSV/Parquet 檔；回傳排序後的檔案清單"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(INPUT_EXTENSIONS))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"找不到輸入檔: {path}")
+    files = list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+    stems = {}
+    for f in files:
+        stems.setdefault(output_stem(f), []).append(f)
+    duplicates = {stem: fs for stem, fs in stems.items() if len(fs) > 1}
+    if duplicates:
+        raise ValueError("輸出檔名重複（不同目錄中的同名檔案）: "
+                         + "; ".join(f"{stem}: {', '.join(fs)}" for stem, fs in duplicates.items()))
+    return files
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'files': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def scoring_params(min_players):
+    """影響評分結果的參數（記錄於 manifest，改變時 --skip-unchanged 重新評分）"""
+    return {'min_players': min_players}
+
+
+def is_unchanged(entry, path, out_dir, fmt, min_players=3):
+    """manifest 中的記錄與目前輸入檔版本、評分參數都相同，且輸出檔都還存在"""
+    if not entry or entry.get('version') != file_version(path):
+        return False
+    if entry.get('params') != scoring_params(min_players):
+        return False
+    outputs = entry.get('outputs', {})
+    return bool(outputs) and all(
+        name.endswith(f".{fmt}") and os.path.exists(os.path.join(out_dir, name)) for name in outputs.values()
+    )
+
+
+# ============================================================
+# 批次執行
+# ============================================================
+def run(files, out_dir, fmt='csv', workers=None, max_tasks_per_child=1, min_players=3,
+        worker_memory_mb=None, skip_unchanged=False):
+    """以行程池評分所有檔案，回傳 (成功摘要清單, {檔案: 錯誤訊息})"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    pending = []
+    for path in files:
+        if skip_unchanged and is_unchanged(manifest['files'].get(path), path, out_dir, fmt, min_players):
+            print(f"⏭️  {os.path.basename(path)}（未變更）")
+        else:
+            pending.append(path)
+    if not pending:
+        return [], {}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    pool_args = {'max_workers': workers, 'max_tasks_per_child': max_tasks_per_child}
+    if worker_memory_mb:
+        pool_args.update(initializer=_limit_memory, initargs=(worker_memory_mb,))
+    print(f"🚀 評分 {len(pending)} 個檔案（{workers} 個工作行程，每個行程處理 {max_tasks_per_child} 個檔案後重啟）")
+
+    results, errors = [], {}
+    with ProcessPoolExecutor(**pool_args) as pool:
+        futures = {pool.submit(score_file, path, out_dir, fmt, min_players): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except BrokenProcessPool as e:
+                errors[path] = f"工作行程異常結束: {e}"
+                print(f"❌ {os.path.basename(path)}: {errors[path]}")
+                continue
+            except Exception as e:
+                errors[path] = f"{type(e).__name__}: {e}"
+                print(f"❌ {os.path.basename(path)}: {errors[path]}")
+                continue
+
+            results.append(summary)
+            peak = summary['peak_rss_bytes']
+            print(f"✅ {os.path.basename(path)}: {summary['rows']} 位球員、{summary['teams']} 支球隊，"
+                  f"{summary['seconds']:.2f}s" + (f"，行程最高記憶體 {peak / 1024 ** 2:.0f} MB" if peak else ""))
+            # 每完成一個檔案就更新 manifest，中斷後重新執行可用 --skip-unchanged 接續
+            manifest['files'][path] = {
+                **{k: summary[k] for k in ('version', 'params', 'outputs', 'rows', 'teams', 'seconds')},
+                'scored_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+            save_manifest(out_dir, manifest)
+    return results, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次評分球員薪資資料檔（預處理、原創財務指標、TPM、球隊 PSI）")
+    parser.add_argument("inputs", nargs="+", help="輸入的 CSV/Parquet 檔或目錄")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR, help="輸出目錄")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="輸出格式")
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 數）")
+    parser.add_argument("--max-tasks-per-child", type=int, default=1,
+                        help="每個工作行程處理幾個檔案後重啟（釋放記憶體）")
+    parser.add_argument("--worker-memory-mb", type=int, default=None, help="每個工作行程的記憶體上限 (MB)")
+    parser.add_argument("--min-players", type=int, default=3, help="計算 PSI 的最少球員數")
+    parser.add_argument("--skip-unchanged", action="store_true", help="略過 manifest 中版本與評分參數都未變更的輸入檔")
+    args = parser.parse_args(argv)
+
+    try:
+        files = collect_inputs(args.inputs)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 2
+    if not files:
+        print("❌ 沒有找到 CSV/Parquet 輸入檔")
+        return 2
+
+    start = time.perf_counter()
+    results, errors = run(
+        files, args.out_dir, fmt=args.format, workers=args.workers,
+        max_tasks_per_child=args.max_tasks_per_child, min_players=args.min_players,
+        worker_memory_mb=args.worker_memory_mb, skip_unchanged=args.skip_unchanged,
+    )
+    print(f"\n完成 {len(results)} 個檔案，失敗 {len(errors)} 個，共 {time.perf_counter() - start:.1f}s → {args.out_dir}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
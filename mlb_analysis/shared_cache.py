@@ -0,0 +1,333 @@
+# shared_cache.py - 多個儀表板行程共用的衍生資料快取
+"""多個 Streamlit 行程（負載平衡後的多個 worker）共用的磁碟快取：存放 preprocess_data 的結果
+（欄位標準化與 calculate_original_financial_metrics 的所有原創指標），
+第一個需要的行程負責計算，其他行程直接以記憶體映射 (mmap) 讀取。
+
+快取目錄的內容：
+    <鍵值>.arrow     未壓縮的 Arrow IPC 檔案，以 mmap 讀取，多個行程共用作業系統的頁面快取
+    manifest.json    {鍵值: 資料檔、列數、欄數、計算秒數、建立時間}，以 manifest.lock 的檔案鎖保護
+    <鍵值>.lock      計算鎖：同一鍵值同時只有一個行程計算，其他行程等待後直接讀取結果
+                     （空檔案，淘汰或清除項目時都不刪除：其他行程可能正持有或等待該鎖）
+
+鍵值由資料檔版本 (dataset.file_version) 與衍生程式碼版本（metrics.py 內容的雜湊）組成，
+資料檔或指標計算方式改變時自動重新計算。資料檔先寫入暫存檔再以 os.replace 原子地換上，
+manifest 以「鎖定 → 讀取 → 修改 → 原子替換」更新，多個行程同時寫入也不會互相覆蓋或讀到寫到一半的檔案。
+
+設定環境變數 MLB_SHARED_CACHE_DIR 為快取目錄（所有 worker 須指向同一個本機目錄）即啟用；
+不支援 fcntl 檔案鎖的平台上自動停用。
+
+用法：
+    MLB_SHARED_CACHE_DIR=/var/cache/mlb streamlit run dashboard.py --server.port 8501
+    python -m mlb_analysis.shared_cache info --dir /var/cache/mlb
+    python -m mlb_analysis.shared_cache stress --dir /tmp/mlb-cache --workers 4
+    python -m mlb_analysis.shared_cache clear --dir /var/cache/mlb
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from mlb_analysis.dataset import BUNDLED_DATA, file_version
+from mlb_analysis.lazy_imports import lazy_import
+
+pa = lazy_import("pyarrow")
+pa_ipc = lazy_import("pyarrow.ipc")
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_ENV = "MLB_SHARED_CACHE_DIR"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_LOCK = "manifest.lock"
+# 保留的快取項目數（超過時移除最早建立的項目）
+MAX_ENTRIES = 8
+METRICS_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.py")
+
+
+def cache_dir():
+    """環境變數設定的共用快取目錄；未設定或平台不支援檔案鎖時回傳 None（停用）"""
+    path = os.environ.get(CACHE_DIR_ENV)
+    return path if path and fcntl is not None else None
+
+
+def code_version():
+    """衍生資料的程式碼版本：metrics.py 內容與 pandas 版本的雜湊"""
+    with open(METRICS_SOURCE, 'rb') as f:
+        digest = hashlib.sha1(f.read())
+    digest.update(pd.__version__.encode())
+    return digest.hexdigest()[:12]
+
+
+def cache_key(data_path):
+    return f"{file_version(data_path)}-{code_version()}"
+
+
+@contextmanager
+def _locked(path, exclusive=True):
+    """以 flock 鎖定檔案（行程結束時作業系統自動釋放，不會留下死鎖）
+
+    鎖檔不會被本模組刪除；若在等待期間被外部刪除或換掉，鎖住舊檔案 (inode) 無法與開啟新檔案的行程互斥，
+    因此取得鎖後確認仍是目錄中的同一個檔案，否則重新開啟並鎖定
+    """
+    while True:
+        f = open(path, 'a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                same_file = os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                same_file = False
+            if same_file:
+                break
+        except BaseException:
+            f.close()
+            raise
+        f.close()
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _atomic_write(path, write):
+    """寫入同一目錄的暫存檔後 fsync 並以 os.replace 換上，其他行程只會看到完整的舊檔或新檔"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp 建立的檔案只有擁有者可讀，以不同使用者執行的 worker 也須能讀取
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class SharedDerivedCache:
+    """以鍵值存放 DataFrame 的多行程共用快取（執行緒與行程安全）"""
+
+    def __init__(self, directory, max_entries=MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_lock = os.path.join(directory, MANIFEST_LOCK)
+
+    # ------------------------------------------------------------
+    # manifest
+    # ------------------------------------------------------------
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def manifest(self):
+        with _locked(self._manifest_lock, exclusive=False):
+            return self._read_manifest()
+
+    def _register(self, key, entry):
+        """加入一個項目並淘汰超過數量的舊項目（持有 manifest 鎖進行讀取 → 修改 → 替換）"""
+        with _locked(self._manifest_lock):
+            manifest = self._read_manifest()
+            manifest[key] = entry
+            stale = sorted(manifest, key=lambda k: manifest[k]['created'])[:-self.max_entries]
+            for old in stale:
+                old_entry = manifest.pop(old)
+                # 已映射此檔案的行程不受影響（POSIX 上刪除只移除目錄項目）；
+                # 計算鎖 <鍵值>.lock 保留：其他行程可能正持有或等待該鎖，刪除後會有兩個行程鎖住不同的檔案
+                try:
+                    os.remove(os.path.join(self.directory, old_entry['file']))
+                except FileNotFoundError:
+                    pass
+            payload = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            _atomic_write(self._manifest_path(), lambda f: f.write(payload))
+
+    # ------------------------------------------------------------
+    # 讀寫
+    # ------------------------------------------------------------
+    def _load(self, entry):
+        """以 mmap 讀取資料檔；object 欄位的缺失值還原為 NaN（與 read_csv 的結果一致）"""
+        with pa.memory_map(os.path.join(self.directory, entry['file'])) as source:
+            df = pa_ipc.open_file(source).read_all().to_pandas()
+        object_cols = df.columns[df.dtypes == object]
+        if len(object_cols):
+            df[object_cols] = df[object_cols].fillna(np.nan)
+        return df
+
+    def _store(self, key, df):
+        table = pa.Table.from_pandas(df)
+        filename = f"{key}.arrow"
+
+        def write(f):
+            with pa_ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        _atomic_write(os.path.join(self.directory, filename), write)
+        return filename
+
+    def get(self, key):
+        """讀取已存在的項目；沒有或檔案損毀時回傳 None"""
+        entry = self.manifest().get(key)
+        if entry is None:
+            return None
+        try:
+            return self._load(entry)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning("共用快取 %s 無法讀取，重新計算: %s", key, e)
+            return None
+
+    def get_or_compute(self, key, compute):
+        """取得 key 的 DataFrame，回傳 (DataFrame, 狀態)；狀態為 hit / built / uncached
+
+        沒有快取時取得該鍵值的計算鎖：先取得鎖的行程計算並寫入，其他行程等待後直接讀取其結果
+        """
+        df = self.get(key)
+        if df is not None:
+            return df, 'hit'
+
+        with _locked(os.path.join(self.directory, f"{key}.lock")):
+            # 等待鎖的期間可能已由其他行程完成
+            df = self.get(key)
+            if df is not None:
+                return df, 'hit'
+
+            start = time.perf_counter()
+            df = compute()
+            seconds = time.perf_counter() - start
+            try:
+                filename = self._store(key, df)
+            except (pa.ArrowException, TypeError, ValueError) as e:
+                # 例如 object 欄位混有無法轉為 Arrow 的型別：照常使用計算結果，只是不共用
+                logger.warning("共用快取無法儲存 %s: %s", key, e)
+                return df, 'uncached'
+            self._register(key, {
+                'file': filename,
+                'rows': len(df),
+                'columns': len(df.columns),
+                'compute_seconds': round(seconds, 3),
+                'created': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'pid': os.getpid(),
+            })
+        return df, 'built'
+
+    def clear(self):
+        """移除所有項目（計算鎖檔保留），回傳移除的數量"""
+        with _locked(self._manifest_lock):
+            manifest = self._read_manifest()
+            for entry in manifest.values():
+                try:
+                    os.remove(os.path.join(self.directory, entry['file']))
+                except FileNotFoundError:
+                    pass
+            payload = b'{}'
+            _atomic_write(self._manifest_path(), lambda f: f.write(payload))
+        return len(manifest)
+
+
+def load_derived(data_path, compute, directory=None):
+    """讀取資料檔的衍生資料；啟用共用快取時由快取取得或計算後寫入，回傳 (DataFrame, 狀態)"""
+    directory = directory or cache_dir()
+    if directory is None:
+        return compute(), 'disabled'
+    return SharedDerivedCache(directory).get_or_compute(cache_key(data_path), compute)
+
+
+# ============================================================
+# 命令列：檢視、清除與多行程壓力測試
+# ============================================================
+def _derive(data_path):
+    from mlb_analysis.metrics import preprocess_data
+    from mlb_analysis.score import read_input
+    return preprocess_data(read_input(data_path))
+
+
+def frame_digest(df):
+    """DataFrame 內容的雜湊（用於比對各行程取得的結果是否一致）"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update("|".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _stress_worker(directory, data_path, start_at):
+    # 所有行程在同一時間點開始，盡量同時競爭同一個鍵值
+    time.sleep(max(0.0, start_at - time.time()))
+    start = time.perf_counter()
+    df, status = load_derived(data_path, lambda: _derive(data_path), directory=directory)
+    return os.getpid(), status, time.perf_counter() - start, frame_digest(df)
+
+
+def stress(directory, data_path, workers):
+    """以多個行程同時讀取空的快取：應只有一個行程計算，其他行程讀取其結果，且所有結果與直接計算相同"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    expected = frame_digest(_derive(data_path))
+    start_at = time.time() + 1.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_stress_worker, [directory] * workers, [data_path] * workers,
+                                [start_at] * workers))
+    for pid, status, seconds, digest in results:
+        print(f"  pid {pid}: {status:<8} {seconds:6.2f}s {'✅' if digest == expected else '❌ 結果不一致'}")
+    built = sum(status == 'built' for _, status, _, _ in results)
+    return all(digest == expected for *_, digest in results) and built <= 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多個儀表板行程共用的衍生資料快取")
+    parser.add_argument("--dir", default=os.environ.get(CACHE_DIR_ENV), help=f"快取目錄（預設為 ${CACHE_DIR_ENV}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("info", help="列出快取項目")
+    subparsers.add_parser("clear", help="移除所有快取項目")
+    stress_parser = subparsers.add_parser("stress", help="多行程同時讀取同一資料檔，驗證只計算一次且結果一致")
+    stress_parser.add_argument("--data", default=BUNDLED_DATA)
+    stress_parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if not args.dir:
+        parser.error(f"請以 --dir 或 ${CACHE_DIR_ENV} 指定快取目錄")
+    if fcntl is None:
+        print("❌ 此平台不支援 fcntl 檔案鎖，共用快取無法使用")
+        return 1
+
+    cache = SharedDerivedCache(args.dir)
+    if args.command == "info":
+        manifest = cache.manifest()
+        for key, entry in sorted(manifest.items(), key=lambda kv: kv[1]['created']):
+            size = os.path.getsize(os.path.join(args.dir, entry['file'])) / 1024 ** 2
+            print(f"  {key}: {entry['rows']:,} 列 × {entry['columns']} 欄，{size:.1f} MB，"
+                  f"計算 {entry['compute_seconds']}s，{entry['created']}")
+        print(f"共 {len(manifest)} 個項目")
+    elif args.command == "clear":
+        print(f"🗑️ 已移除 {cache.clear()} 個項目")
+    else:
+        cache.clear()
+        print(f"🚀 {args.workers} 個行程同時讀取 {args.data}")
+        if not stress(args.dir, args.data, args.workers):
+            print("❌ 壓力測試失敗")
+            return 1
+        print("✅ 只計算一次，所有行程的結果與直接計算相同")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# summary_cube.py - 摘要立方體
+"""預先彙總 Team × Position × salary_category × war_category × Season 各格的筆數、總和與中心化的二階動差，
+任何維度篩選下的平均、相關係數與總計都由彙總格計算，而不必掃描資料列"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIMS = ['Team', 'Position', 'salary_category', 'war_category', 'Season']
+DEFAULT_VALUE_COLS = ['WAR', 'Salary_millions', 'WVPI', 'RAV', 'MERI']
+DEFAULT_COUNT_COLS = ['Name']
+DEFAULT_PAIR = ('WAR', 'Salary_millions')
+
+
+def _pair_correlation(cells):
+    """合併各格的中心化動差計算皮爾遜相關係數
+
+    每格存放 Σ(x − 格平均)(y − 格平均) 等動差，合併時加上格平均與總平均之差的貢獻
+    （平行變異數演算法），避免 Σxy − ΣxΣy/n 在數值大、變異小時的相消誤差。
+    """
+    n = cells['pair__count'].to_numpy(dtype=float)
+    total = n.sum()
+    if total < 2:
+        return np.nan
+    sum_x = cells['pair__sum_x'].to_numpy(dtype=float)
+    sum_y = cells['pair__sum_y'].to_numpy(dtype=float)
+    # 沒有有效資料的格權重為 0，平均值以 0 代替
+    mean_x = np.divide(sum_x, n, out=np.zeros_like(n), where=n > 0)
+    mean_y = np.divide(sum_y, n, out=np.zeros_like(n), where=n > 0)
+    dx = mean_x - sum_x.sum() / total
+    dy = mean_y - sum_y.sum() / total
+
+    cov = cells['pair__m_xy'].sum() + (n * dx * dy).sum()
+    var_x = cells['pair__m_xx'].sum() + (n * dx * dx).sum()
+    var_y = cells['pair__m_yy'].sum() + (n * dy * dy).sum()
+    if var_x <= 0 or var_y <= 0:
+        return np.nan
+    return cov / np.sqrt(var_x * var_y)
+
+
+class SummaryCube:
+    """摘要立方體：每格儲存筆數、各指標的有效筆數與總和，以及 WAR × 薪資 的中心化二階動差"""
+
+    def __init__(self, df, dims=None, value_cols=None, count_cols=None, pair=DEFAULT_PAIR):
+        self.dims = [d for d in (dims or DEFAULT_DIMS) if d in df.columns]
+        self.value_cols = [c for c in (value_cols or DEFAULT_VALUE_COLS) if c in df.columns]
+        self.count_cols = [c for c in (count_cols or DEFAULT_COUNT_COLS) if c in df.columns]
+        self.pair = pair if pair and all(c in df.columns for c in pair) else None
+        self.n_source_rows = len(df)
+
+        work = pd.DataFrame({d: df[d] for d in self.dims}, index=df.index)
+        work['rows'] = 1
+
+        for col in self.count_cols:
+            work[f'{col}__count'] = df[col].notna().astype(np.int64)
+
+        for col in self.value_cols:
+            values = pd.to_numeric(df[col], errors='coerce')
+            work[f'{col}__count'] = values.notna().astype(np.int64)
+            work[f'{col}__sum'] = values.fillna(0.0)
+
+        if self.pair:
+            # 只納入兩個欄位都有值的資料列（與 pandas corr 的成對刪除一致）
+            x = pd.to_numeric(df[self.pair[0]], errors='coerce')
+            y = pd.to_numeric(df[self.pair[1]], errors='coerce')
+            valid = x.notna() & y.notna()
+            x = x.where(valid, 0.0)
+            y = y.where(valid, 0.0)
+            work['pair__count'] = valid.astype(np.int64)
+            work['pair__sum_x'] = x
+            work['pair__sum_y'] = y
+            # 與所屬格平均的離差（格內中心化）
+            dx = (x - self._cell_mean(work, 'pair__sum_x')).where(valid, 0.0)
+            dy = (y - self._cell_mean(work, 'pair__sum_y')).where(valid, 0.0)
+            work['pair__m_xx'] = dx * dx
+            work['pair__m_yy'] = dy * dy
+            work['pair__m_xy'] = dx * dy
+
+        if self.dims:
+            self.cells = work.groupby(self.dims, observed=True, dropna=False, sort=False).sum().reset_index()
+        else:
+            self.cells = work.sum().to_frame().T
+
+    def _cell_mean(self, work, sum_col):
+        """每一列所屬格的成對有效資料平均"""
+        if not self.dims:
+            return work[sum_col].sum() / work['pair__count'].sum()
+        groups = work.groupby(self.dims, observed=True, dropna=False, sort=False)
+        return groups[sum_col].transform('sum') / groups['pair__count'].transform('sum')
+
+    @property
+    def n_cells(self):
+        """立方體的格數"""
+        return len(self.cells)
+
+    def _select(self, where):
+        """依維度條件挑出彙總格；條件值可以是單一值或清單"""
+        cells = self.cells
+        if not where:
+            return cells
+
+        mask = np.ones(len(cells), dtype=bool)
+        for dim, value in where.items():
+            if value is None:
+                continue
+            if dim not in self.dims:
+                raise KeyError(f"摘要立方體中沒有維度: {dim}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= cells[dim].isin(list(values)).to_numpy()
+        return cells[mask]
+
+    def totals(self, where=None):
+        """彙總符合條件的所有格，回傳各度量的總和"""
+        measures = self.cells.columns.difference(self.dims)
+        return self._select(where)[measures].sum()
+
+    def kpis(self, where=None):
+        """由彙總格計算關鍵指標：筆數、各指標平均與 WAR-薪資 相關係數"""
+        cells = self._select(where)
+        totals = cells[self.cells.columns.difference(self.dims)].sum()
+        kpis = {'rows': int(totals['rows'])}
+
+        for col in self.value_cols:
+            count = totals[f'{col}__count']
+            kpis[f'mean_{col}'] = totals[f'{col}__sum'] / count if count > 0 else np.nan
+
+        if self.pair:
+            kpis['correlation'] = _pair_correlation(cells)
+        return kpis
+
+    def group_table(self, dim, agg, where=None):
+        """依單一維度分組彙總，agg 格式同 pandas：{欄位: 'count' | 'sum' | 'mean'}"""
+        grouped = self._select(where).groupby(dim, observed=True, sort=True).sum(numeric_only=True)
+
+        result = pd.DataFrame(index=grouped.index)
+        for col, how in agg.items():
+            if how == 'count':
+                result[col] = grouped[f'{col}__count'].astype(np.int64)
+            elif how == 'sum':
+                result[col] = grouped[f'{col}__sum']
+            elif how == 'mean':
+                result[col] = grouped[f'{col}__sum'] / grouped[f'{col}__count'].replace(0, np.nan)
+            else:
+                raise ValueError(f"不支援的彙總方式: {how}")
+        return result.reset_index()
+
+
+def row_kpis(df, value_cols=None, pair=DEFAULT_PAIR):
+    """直接由資料列計算與 SummaryCube.kpis 相同的關鍵指標（數值範圍篩選時使用）"""
+    value_cols = [c for c in (value_cols or DEFAULT_VALUE_COLS) if c in df.columns]
+    kpis = {'rows': len(df)}
+
+    for col in value_cols:
+        kpis[f'mean_{col}'] = df[col].mean()
+
+    if pair and all(c in df.columns for c in pair):
+        kpis['correlation'] = df[pair[0]].corr(df[pair[1]])
+    return kpis
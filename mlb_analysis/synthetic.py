@@ -0,0 +1,253 @@
+# synthetic.py - 合成 MLB 球員賽季資料產生器
+"""以現有的 merged_performance_salary.csv 擬合聯合分佈，產生任意筆數、任意賽季數的合成資料，
+供效能測試與基準測試離線重現使用。
+
+擬合方式：把各數值欄位轉成常態分數 (Gaussian copula)，每筆合成資料以一筆真實資料為錨點、
+在常態分數空間加上核平滑雜訊，再透過經驗分佈的反函數轉回原尺度；球隊與守備位置沿用錨點，
+因此 WAR、薪資、年齡、合約年數、位置之間的相關結構都會保留。
+
+用法：
+    python -m mlb_analysis.synthetic --rows 100000 --seasons 5 --seed 42 --out data/synthetic/mlb_100k
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+from mlb_analysis.dataset import BUNDLED_DATA
+
+# 以 copula 建模的數值欄位；缺值以 0 代表（例如沒有多年合約的 Years）
+NUMERIC_COLUMNS = [
+    'WAR', 'Salary_millions', 'Age', 'Years', 'G', 'PA', 'AB', 'H', 'HR', 'RBI',
+    'Total_value_millions', 'Average_Annual_millions'
+]
+INTEGER_COLUMNS = ['Age', 'Years', 'G', 'PA', 'AB', 'H', 'HR', 'RBI']
+# 原始資料中缺值代表「不適用」的欄位，產生 0 時還原為缺值
+ZERO_AS_MISSING = ['Years', 'Average_Annual_millions']
+CATEGORY_COLUMNS = ['Team_performance', 'Position']
+
+# 逐季演變參數：所有欄位共用同一個 AR(1) 係數，欄位間的相關結構才能逐季維持不變
+SEASON_PERSISTENCE = 0.7
+TURNOVER_RATE = 0.15   # 每季被新球員取代的平均比例
+RETIREMENT_AGE_SLOPE = 0.25  # 年齡每高於平均一歲，退休風險的對數增加量
+TRADE_RATE = 0.10      # 每季更換球隊的比例
+KERNEL_BANDWIDTH = 0.25
+
+
+class SyntheticProfile:
+    """從真實資料擬合的合成資料設定檔：常態分數矩陣、經驗分佈與類別欄位"""
+
+    def __init__(self, df):
+        self.columns = [c for c in NUMERIC_COLUMNS if c in df.columns]
+        self.categories = {c: df[c].astype(str).to_numpy() for c in CATEGORY_COLUMNS if c in df.columns}
+        self.n_reference = len(df)
+
+        values = df[self.columns].apply(pd.to_numeric, errors='coerce').fillna(0.0).to_numpy(dtype=float)
+
+        # 經驗分佈：排序後的值對應 (i + 0.5) / n 的累積機率
+        self.sorted_values = np.sort(values, axis=0)
+        self.grid = (np.arange(self.n_reference) + 0.5) / self.n_reference
+
+        # 常態分數：以平均秩處理同值
+        ranks = pd.DataFrame(values).rank(method='average').to_numpy()
+        self.scores = ndtri((ranks - 0.5) / self.n_reference)
+
+        self.age_col = self.columns.index('Age') if 'Age' in self.columns else None
+        self.mean_age = values[:, self.age_col].mean() if self.age_col is not None else None
+        if self.age_col is not None:
+            # 核平滑後常態分數的共變異矩陣，用於在年齡固定時調整其他欄位（高斯條件分佈）
+            cov = (np.cov(self.scores, rowvar=False) + KERNEL_BANDWIDTH ** 2 * np.eye(len(self.columns)))
+            cov /= 1 + KERNEL_BANDWIDTH ** 2
+            self.age_slopes = cov[:, self.age_col] / cov[self.age_col, self.age_col]
+
+    @classmethod
+    def from_csv(cls, path=BUNDLED_DATA):
+        """從 CSV 檔擬合設定檔"""
+        return cls(pd.read_csv(path))
+
+    def sample_scores(self, rng, anchors):
+        """以錨點的常態分數加上核平滑雜訊（縮放後保持單位變異數）"""
+        noise = rng.standard_normal((len(anchors), len(self.columns)))
+        return (self.scores[anchors] + KERNEL_BANDWIDTH * noise) / np.sqrt(1 + KERNEL_BANDWIDTH ** 2)
+
+    def age_scores(self, ages):
+        """年齡 → 經驗分佈的累積機率 → 常態分數"""
+        u = np.interp(ages, self.sorted_values[:, self.age_col], self.grid)
+        return ndtri(u)
+
+    def condition_on_age(self, scores, ages):
+        """把年齡的常態分數固定為實際年齡，其他欄位依迴歸係數一起調整"""
+        target = self.age_scores(ages)
+        scores = scores + np.outer(target - scores[:, self.age_col], self.age_slopes)
+        scores[:, self.age_col] = target
+        return scores
+
+    def to_values(self, scores):
+        """常態分數 → 經驗分佈反函數 → 原尺度數值"""
+        u = ndtr(scores)
+        values = np.empty_like(scores)
+        for j in range(len(self.columns)):
+            values[:, j] = np.interp(u[:, j], self.grid, self.sorted_values[:, j])
+        return values
+
+
+def _build_frame(profile, values, player_ids, season, teams, positions):
+    """把數值矩陣與類別欄位組成與原始檔相容的 DataFrame"""
+    frame = pd.DataFrame(values, columns=profile.columns)
+
+    for col in INTEGER_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].round().astype(np.int64)
+    for col in ZERO_AS_MISSING:
+        if col in frame.columns:
+            frame[col] = frame[col].where(frame[col] > 0)
+    if 'WAR' in frame.columns:
+        frame['WAR'] = frame['WAR'].round(1)
+    if 'Salary_millions' in frame.columns:
+        # 薪資必須為正，避免性價比除以零
+        frame['Salary_millions'] = frame['Salary_millions'].clip(lower=0.5).round(6)
+        frame['Salary_cleaned'] = frame['Salary_millions'] * 1_000_000
+
+    names = np.char.add('Player ', np.char.zfill(player_ids.astype(str), 7))
+    frame.insert(0, 'IDfg', player_ids)
+    frame.insert(1, 'Season', season)
+    frame.insert(2, 'Name', names)
+    if teams is not None:
+        frame.insert(3, 'Team_performance', teams)
+    if positions is not None:
+        frame['Position'] = positions
+    frame['Name_clean'] = np.char.lower(names)
+    frame['Player_formatted'] = names
+    return frame
+
+
+def generate_chunks(profile, n_rows, n_seasons=1, seed=0, first_season=2023, chunk_players=200_000):
+    """逐塊產生合成資料（每塊為一組球員的所有賽季），總筆數恰為 n_rows"""
+    rng = np.random.default_rng(seed)
+    n_players = -(-n_rows // n_seasons)
+    teams_ref = profile.categories.get('Team_performance')
+    positions_ref = profile.categories.get('Position')
+    generation_stride = n_seasons + 1
+    emitted = 0
+
+    for block_start in range(0, n_players, chunk_players):
+        m = min(chunk_players, n_players - block_start)
+        slots = np.arange(block_start, block_start + m)
+        generation = np.zeros(m, dtype=np.int64)
+
+        anchors = rng.integers(0, profile.n_reference, m)
+        scores = profile.sample_scores(rng, anchors)
+        values = profile.to_values(scores)
+        teams = teams_ref[anchors] if teams_ref is not None else None
+        positions = positions_ref[anchors] if positions_ref is not None else None
+
+        for season_idx in range(n_seasons):
+            if season_idx > 0:
+                # 延續的球員：各欄位以 AR(1) 演變，年齡加一；
+                # 新息取自獨立錨點，使常態分數維持單位變異數與原有的欄位相關
+                fresh = profile.sample_scores(rng, rng.integers(0, profile.n_reference, m))
+                rho = SEASON_PERSISTENCE
+                scores = rho * scores + np.sqrt(1 - rho ** 2) * fresh
+                if profile.age_col is not None:
+                    ages = values[:, profile.age_col] + 1
+                    scores = profile.condition_on_age(scores, ages)
+                values = profile.to_values(scores)
+                if profile.age_col is not None:
+                    values[:, profile.age_col] = ages
+
+                # 球隊異動
+                if teams is not None:
+                    traded = rng.random(m) < TRADE_RATE
+                    teams = teams.copy()
+                    teams[traded] = teams_ref[rng.integers(0, profile.n_reference, traded.sum())]
+
+                # 球員汰換：年紀越大越容易退休（使年齡分佈逐季穩定），以新錨點產生新球員
+                retire_prob = np.full(m, TURNOVER_RATE)
+                if profile.age_col is not None:
+                    age_gap = values[:, profile.age_col] - profile.mean_age
+                    retire_prob = np.minimum(TURNOVER_RATE * np.exp(RETIREMENT_AGE_SLOPE * age_gap), 1.0)
+                replaced = np.flatnonzero(rng.random(m) < retire_prob)
+                if len(replaced):
+                    new_anchors = rng.integers(0, profile.n_reference, len(replaced))
+                    scores[replaced] = profile.sample_scores(rng, new_anchors)
+                    values[replaced] = profile.to_values(scores[replaced])
+                    generation[replaced] += 1
+                    if teams is not None:
+                        teams[replaced] = teams_ref[new_anchors]
+                    if positions is not None:
+                        positions = positions.copy()
+                        positions[replaced] = positions_ref[new_anchors]
+
+            player_ids = slots * generation_stride + generation + 1
+            frame = _build_frame(profile, values, player_ids, first_season + season_idx, teams, positions)
+
+            remaining = n_rows - emitted
+            if len(frame) > remaining:
+                frame = frame.iloc[:remaining]
+            if len(frame):
+                emitted += len(frame)
+                yield frame
+            if emitted >= n_rows:
+                return
+
+
+def generate_frame(n_rows, n_seasons=1, seed=0, profile=None, **kwargs):
+    """產生完整的合成資料 DataFrame（適合記憶體內的基準測試）"""
+    profile = profile or SyntheticProfile.from_csv()
+    return pd.concat(list(generate_chunks(profile, n_rows, n_seasons, seed, **kwargs)), ignore_index=True)
+
+
+def write_outputs(chunks, out_prefix, formats=('csv', 'parquet')):
+    """逐塊寫出 CSV 與 Parquet，記憶體用量只與單一區塊大小有關"""
+    os.makedirs(os.path.dirname(os.path.abspath(out_prefix)), exist_ok=True)
+    paths = {fmt: f"{out_prefix}.{fmt}" for fmt in formats}
+    parquet_writer = None
+    rows = 0
+
+    try:
+        for i, chunk in enumerate(chunks):
+            if 'csv' in paths:
+                chunk.to_csv(paths['csv'], mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            if 'parquet' in paths:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(paths['parquet'], table.schema, compression='zstd')
+                parquet_writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    return paths, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生合成 MLB 球員賽季資料")
+    parser.add_argument("--rows", type=int, required=True, help="總筆數")
+    parser.add_argument("--seasons", type=int, default=1, help="賽季數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--first-season", type=int, default=2023, help="第一個賽季年份")
+    parser.add_argument("--source", default=BUNDLED_DATA, help="用來擬合分佈的真實資料")
+    parser.add_argument("--out", required=True, help="輸出路徑前綴（自動加上 .csv / .parquet）")
+    parser.add_argument("--format", nargs="+", choices=["csv", "parquet"], default=["csv", "parquet"])
+    parser.add_argument("--chunk-players", type=int, default=200_000, help="每個區塊的球員數")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    profile = SyntheticProfile.from_csv(args.source)
+    chunks = generate_chunks(profile, args.rows, args.seasons, args.seed,
+                             first_season=args.first_season, chunk_players=args.chunk_players)
+    paths, rows = write_outputs(chunks, args.out, formats=args.format)
+
+    print(f"✅ 產生 {rows:,} 筆合成資料 ({args.seasons} 個賽季)，耗時 {time.perf_counter() - start:.1f}s")
+    for path in paths.values():
+        print(f"   {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+# telemetry.py - Prometheus 指標輸出
+"""長時間執行的儀表板在旁路連接埠以 Prometheus 文字格式輸出指標：
+load_data 快取命中／未命中次數、圖表快取統計、各分析模式的 rerun 延遲直方圖、
+活躍工作階段數、載入資料集的列數與欄數、行程常駐記憶體。
+
+設定環境變數 MLB_METRICS_PORT 時，儀表板第一次執行會啟動背景 HTTP 執行緒（預設只綁定 127.0.0.1，
+可用 MLB_METRICS_HOST 調整）；未設定時仍會累計指標，但不對外提供。
+
+用法（本機抓取，驗證輸出格式）：
+    python -m mlb_analysis.telemetry scrape --url http://127.0.0.1:9108/metrics
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PORT_ENV = "MLB_METRICS_PORT"
+HOST_ENV = "MLB_METRICS_HOST"
+DEFAULT_HOST = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# rerun 延遲直方圖的上界（秒）
+RERUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_server_lock = threading.Lock()
+_state = {'server': None, 'thread': None}
+
+
+def process_start_since_boot():
+    """目前行程在開機後第幾秒啟動：/proc/self/stat 的 starttime（時脈數），讀不到 /proc 時回傳 None"""
+    try:
+        with open('/proc/self/stat') as f:
+            # 第 2 欄 (comm) 可能含空白或括號，從最後一個 ')' 之後算起：starttime 為第 22 欄
+            start_ticks = int(f.read().rpartition(')')[2].split()[19])
+        return start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def process_start_time():
+    """目前行程的啟動時間（Unix 秒）：開機後的啟動秒數加上 /proc/stat 的開機時間
+
+    模組可能在行程啟動很久之後才被匯入，不能以匯入時間代替；讀不到 /proc 的平台改用 psutil，都沒有時回傳 None
+    """
+    since_boot = process_start_since_boot()
+    if since_boot is not None:
+        try:
+            with open('/proc/stat') as f:
+                boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime '))
+            return boot_time + since_boot
+        except (OSError, ValueError, IndexError, StopIteration):
+            pass
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except Exception:
+        return None
+
+
+PROCESS_START = process_start_time()
+
+
+def read_rss():
+    """目前行程的常駐記憶體 (bytes)，讀取 /proc/self/status"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# ============================================================
+# 指標
+# ============================================================
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """具標籤的計數器 (counter) 或量規 (gauge)；提供 fn 時於每次抓取呼叫 fn() 取值
+
+    fn 回傳單一數值，或 {標籤值 tuple: 數值}；回傳 None 時不輸出。
+    """
+
+    def __init__(self, name, help_text, kind, labelnames=(), fn=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        # 沒有標籤的指標一開始就輸出 0，抓取端不必處理缺值
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        if self.fn is None:
+            with self._lock:
+                return sorted(self._values.items())
+        result = self.fn()
+        if result is None:
+            return []
+        if isinstance(result, dict):
+            return sorted((tuple(str(v) for v in key), value) for key, value in result.items())
+        return [((), result)]
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.samples():
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """具標籤的直方圖（累積桶、總和、次數）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=RERUN_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, dict(series, counts=list(series['counts'])))
+                                  for key, series in self._series.items())
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    """指標集合，依註冊順序輸出"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=(), fn=None):
+        return self.register(Metric(name, help_text, 'counter', labelnames, fn))
+
+    def gauge(self, name, help_text, labelnames=(), fn=None):
+        return self.register(Metric(name, help_text, 'gauge', labelnames, fn))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=RERUN_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def expose(self):
+        """Prometheus 文字格式"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.expose())
+            except Exception:
+                # 單一指標取值失敗不影響其他指標
+                logger.exception("指標 %s 取值失敗", metric.name)
+        return '\n'.join(lines) + '\n'
+
+
+# ============================================================
+# 儀表板指標
+# ============================================================
+_figure_caches = {}
+_precompute = {}
+
+
+def watch_figure_cache(name, cache):
+    """登記要輸出統計的圖表快取（FigureCache）；重複登記會取代同名快取"""
+    _figure_caches[name] = cache
+
+
+def _figure_cache_stat(field):
+    def collect():
+        return {(name,): cache.stats()[field] for name, cache in list(_figure_caches.items())}
+    return collect
+
+
+def watch_precompute(name, scheduler):
+    """登記要輸出統計的背景預先計算排程器（PrecomputeScheduler）；重複登記會取代同名排程器"""
+    _precompute[name] = scheduler
+
+
+def _precompute_stat(fields, label):
+    def collect():
+        values = {}
+        for name, scheduler in list(_precompute.items()):
+            stats = scheduler.stats()
+            for field in fields:
+                values[(name, field) if label else (name,)] = stats[field]
+        return values
+    return collect
+
+
+def _active_sessions():
+    """Streamlit 伺服器目前連線中的工作階段數（不在伺服器中執行時不輸出）"""
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return None
+        return Runtime.instance()._session_mgr.num_active_sessions()
+    except Exception:
+        return None
+
+
+REGISTRY = Registry()
+LOAD_DATA_REQUESTS = REGISTRY.counter(
+    'mlb_load_data_requests_total', 'load_data 呼叫次數，依快取命中 (hit) 或重新載入 (miss) 區分', ['result'])
+SHARED_CACHE_LOADS = REGISTRY.counter(
+    'mlb_shared_cache_loads_total', '載入資料時的共用衍生資料快取結果：讀取既有結果 (hit)、由此行程計算 (built)、'
+    '無法儲存 (uncached)、未啟用 (disabled)', ['status'])
+RERUN_SECONDS = REGISTRY.histogram(
+    'mlb_rerun_duration_seconds', '完整執行到頁尾的 rerun 耗時（秒），依分析模式區分', ['mode'])
+RERUNS_ABORTED = REGISTRY.counter(
+    'mlb_reruns_aborted_total', '未執行到頁尾的 rerun 次數（st.stop 或被新的互動中斷）')
+DATASET_ROWS = REGISTRY.gauge('mlb_dataset_rows', '最近一次載入的資料集列數')
+DATASET_COLUMNS = REGISTRY.gauge('mlb_dataset_columns', '最近一次載入的資料集欄數')
+REGISTRY.counter('mlb_figure_cache_hits_total', '圖表快取命中次數', ['cache'], fn=_figure_cache_stat('hits'))
+REGISTRY.counter('mlb_figure_cache_misses_total', '圖表快取未命中次數', ['cache'], fn=_figure_cache_stat('misses'))
+REGISTRY.counter('mlb_figure_cache_evictions_total', '圖表快取淘汰次數', ['cache'], fn=_figure_cache_stat('evictions'))
+REGISTRY.gauge('mlb_figure_cache_entries', '圖表快取項目數', ['cache'], fn=_figure_cache_stat('entries'))
+REGISTRY.gauge('mlb_figure_cache_bytes', '圖表快取使用位元組', ['cache'], fn=_figure_cache_stat('bytes'))
+REGISTRY.counter('mlb_precompute_requests_total', '頁面取用預先計算結果的次數，依已完成 (hits)、等待背景計算 (waits)、'
+                 '在目前執行緒計算 (misses) 區分', ['scheduler', 'result'],
+                 fn=_precompute_stat(['hits', 'waits', 'misses'], True))
+REGISTRY.counter('mlb_precompute_tasks_total', '預先計算任務的結束次數，依完成、失敗、取消區分', ['scheduler', 'status'],
+                 fn=_precompute_stat(['done', 'failed', 'cancelled'], True))
+REGISTRY.gauge('mlb_precompute_queued', '排隊中的預先計算任務數', ['scheduler'], fn=_precompute_stat(['queued'], False))
+REGISTRY.gauge('mlb_active_sessions', '連線中的工作階段數', fn=_active_sessions)
+REGISTRY.gauge('process_resident_memory_bytes', '行程常駐記憶體 (bytes)', fn=read_rss)
+REGISTRY.gauge('process_start_time_seconds', '行程啟動時間（Unix 秒）', fn=lambda: PROCESS_START)
+
+
+def note_load_data_miss():
+    """在 load_data 函數本體中呼叫：本體有執行即代表快取未命中"""
+    _local.load_data_miss = True
+
+
+@contextlib.contextmanager
+def load_data_call():
+    """包住 load_data() 呼叫，依本體是否執行記錄命中或未命中"""
+    _local.load_data_miss = False
+    try:
+        yield
+    finally:
+        LOAD_DATA_REQUESTS.inc(result='miss' if _local.load_data_miss else 'hit')
+
+
+def note_shared_cache(status):
+    """記錄一次共用衍生資料快取的載入結果（shared_cache.load_derived 回傳的狀態）"""
+    SHARED_CACHE_LOADS.inc(status=status)
+
+
+def record_dataset(df):
+    """記錄載入資料集的大小"""
+    DATASET_ROWS.set(len(df))
+    DATASET_COLUMNS.set(len(df.columns))
+
+
+def observe_rerun(mode, seconds):
+    """記錄一次完整執行到頁尾的 rerun"""
+    RERUN_SECONDS.observe(seconds, mode=mode)
+
+
+# ============================================================
+# HTTP 伺服器
+# ============================================================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取請求很頻繁，不寫入標準錯誤
+        pass
+
+
+def start_server(port, host=DEFAULT_HOST):
+    """在背景執行緒啟動指標伺服器（每個行程只啟動一次），回傳伺服器物件"""
+    with _server_lock:
+        if _state['server'] is not None:
+            return _state['server']
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, name="mlb-metrics", daemon=True)
+        thread.start()
+        _state['server'], _state['thread'] = server, thread
+        logger.info("指標伺服器已啟動: http://%s:%s/metrics", host, server.server_address[1])
+        return server
+
+
+def stop_server():
+    """停止指標伺服器"""
+    with _server_lock:
+        server = _state['server']
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            _state['thread'].join()
+        _state['server'] = _state['thread'] = None
+
+
+def ensure_server():
+    """依環境變數 MLB_METRICS_PORT 啟動指標伺服器；未設定或連接埠被占用時回傳 None"""
+    port = os.environ.get(PORT_ENV)
+    if not port:
+        return None
+    try:
+        return start_server(int(port), os.environ.get(HOST_ENV) or DEFAULT_HOST)
+    except OSError as e:
+        # 指標輸出失敗不應讓儀表板無法使用
+        logger.warning("無法啟動指標伺服器 (port %s): %s", port, e)
+        return None
+
+
+# ============================================================
+# 本機抓取（Prometheus 抓取的替代品，用於驗證輸出）
+# ============================================================
+def parse_exposition(text):
+    """解析 Prometheus 文字格式，回傳 {(指標名稱, ((標籤, 值), ...)): 數值}；格式錯誤時拋出 ValueError"""
+    samples = {}
+    types = {}
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        if line.startswith('#'):
+            parts = line.split(None, 3)
+            if len(parts) >= 4 and parts[1] == 'TYPE':
+                types[parts[2]] = parts[3]
+            continue
+
+        head, _, value = line.rpartition(' ')
+        if not head:
+            raise ValueError(f"第 {lineno} 行缺少數值: {line}")
+        labels = ()
+        name = head
+        if '{' in head:
+            if not head.endswith('}'):
+                raise ValueError(f"第 {lineno} 行標籤格式錯誤: {line}")
+            name, _, label_text = head[:-1].partition('{')
+            pairs = []
+            for item in _split_labels(label_text):
+                key, _, quoted = item.partition('=')
+                if len(quoted) < 2 or quoted[0] != '"' or quoted[-1] != '"':
+                    raise ValueError(f"第 {lineno} 行標籤值格式錯誤: {line}")
+                pairs.append((key, quoted[1:-1].replace('\\"', '"').replace('\\n', '\n').replace('\\\\', '\\')))
+            labels = tuple(pairs)
+
+        base = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and types.get(name[:-len(suffix)]) == 'histogram':
+                base = name[:-len(suffix)]
+        if base not in types:
+            raise ValueError(f"第 {lineno} 行的指標 {name} 沒有 TYPE 宣告")
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def _split_labels(text):
+    """以逗號分隔標籤（略過引號內的逗號）"""
+    items, current, quoted, escaped = [], [], False, False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            items.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        items.append(''.join(current))
+    return items
+
+
+def scrape(url, timeout=5.0):
+    """抓取並解析指標端點"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('text/plain'):
+            raise ValueError(f"Content-Type 不是 text/plain: {content_type}")
+        return parse_exposition(response.read().decode('utf-8'))
+
+
+def _scrape_command(args):
+    try:
+        samples = scrape(args.url, args.timeout)
+    except (OSError, ValueError) as e:
+        print(f"❌ 抓取失敗: {e}", file=sys.stderr)
+        return 1
+    for (name, labels), value in sorted(samples.items()):
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+        print(f"{name}{{{label_text}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+    print(f"\n✅ {len(samples)} 個樣本")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="儀表板 Prometheus 指標工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scrape_parser = subparsers.add_parser("scrape", help="抓取指標端點並驗證格式")
+    scrape_parser.add_argument("--url", default=f"http://{DEFAULT_HOST}:9108/metrics", help="指標端點網址")
+    scrape_parser.add_argument("--timeout", type=float, default=5.0, help="逾時秒數")
+    scrape_parser.set_defaults(func=_scrape_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
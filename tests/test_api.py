@@ -0,0 +1,54 @@
+"""api：ETag 條件請求先驗證查詢參數，回應快取依位元組大小淘汰"""
+import asyncio
+
+import pytest
+
+from mlb_analysis.api import MetricsAPI
+from mlb_analysis.dataset import BUNDLED_DATA as DATA
+
+
+def _get(app, path, query=b'', headers=()):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query, 'headers': list(headers)}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, None, send))
+    start, body = messages
+    return start['status'], dict(start['headers']), body['body']
+
+
+@pytest.fixture(scope='module')
+def app():
+    return MetricsAPI(data_path=DATA)
+
+
+def test_invalid_params_are_rejected_even_if_etag_matches(app):
+    status, headers, _ = _get(app, '/teams/psi', b'min_players=3')
+    assert status == 200
+    etag = headers[b'etag']
+    assert _get(app, '/teams/psi', b'min_players=3', [(b'if-none-match', etag)])[0] == 304
+
+    # 無效參數：即使帶著 * 或相同格式的 ETag 也要回 400，不是 304
+    for value in (b'*', etag):
+        status, _, body = _get(app, '/teams/psi', b'min_players=0', [(b'if-none-match', value)])
+        assert status == 400 and 'min_players' in body.decode('utf-8')
+
+
+def test_etag_matches_after_eviction():
+    app = MetricsAPI(data_path=DATA, cache_bytes=0)
+    status, headers, _ = _get(app, '/sei')
+    assert status == 200
+    # 快取放不下任何回應：重新計算驗證後仍回 304
+    assert _get(app, '/sei', headers=[(b'if-none-match', headers[b'etag'])])[0] == 304
+
+
+def test_response_cache_is_bounded_by_bytes():
+    size = len(_get(MetricsAPI(data_path=DATA), '/players', b'limit=20')[2])
+    app = MetricsAPI(data_path=DATA, cache_bytes=3 * size)
+    for name in ('a', 'e', 'i', 'o', 'u', ''):
+        assert _get(app, '/players', f'limit=20&name={name}'.encode('ascii'))[0] == 200
+    stats = app._responses.stats()
+    assert stats['bytes'] <= 3 * size
+    assert stats['evictions'] > 0 and stats['entries'] < 6
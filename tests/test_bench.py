@@ -0,0 +1,34 @@
+"""bench compare：效能回歸與缺少的階段都讓比較失敗"""
+import json
+
+from mlb_analysis import bench
+
+
+def _write(path, stages):
+    results = [{'stage': stage, 'rows': rows, 'median': median, 'samples': [median] * 5, 'peak_bytes': 1024}
+               for stage, rows, median in stages]
+    path.write_text(json.dumps({'meta': {'commit': 'abcdef0'}, 'results': results}), encoding='utf-8')
+    return str(path)
+
+
+def test_identical_results_pass(tmp_path):
+    base = _write(tmp_path / "base.json", [('load', 1000, 0.5), ('psi', 1000, 0.2)])
+    assert bench.main(['compare', base, base]) == 0
+
+
+def test_slowdown_fails(tmp_path):
+    base = _write(tmp_path / "base.json", [('load', 1000, 0.5)])
+    new = _write(tmp_path / "new.json", [('load', 1000, 1.0)])
+    assert bench.main(['compare', base, new]) == 1
+
+
+def test_missing_stage_fails_unless_allowed(tmp_path, capsys):
+    base = _write(tmp_path / "base.json", [('load', 1000, 0.5), ('psi', 1000, 0.2), ('psi', 10000, 2.0)])
+    new = _write(tmp_path / "new.json", [('load', 1000, 0.5), ('psi', 1000, 0.2)])
+
+    assert bench.main(['compare', base, new]) == 1
+    assert "比較結果缺少 psi (10000)" in capsys.readouterr().out
+    assert bench.main(['compare', base, new, '--allow-missing']) == 0
+
+    # 新增的階段不影響結果
+    assert bench.main(['compare', new, base]) == 0
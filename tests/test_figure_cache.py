@@ -0,0 +1,38 @@
+"""figure_cache：依位元組大小的 LRU 淘汰，以及篩選參數的鍵值正規化"""
+import numpy as np
+
+from mlb_analysis.figure_cache import FigureCache, make_key, normalize_params
+
+
+def test_lru_eviction_by_bytes():
+    cache = FigureCache(max_bytes=10)
+    cache.put('a', 'x' * 4)
+    cache.put('b', 'x' * 4)
+    assert cache.get('a') == 'x' * 4  # a 變成最近使用
+
+    cache.put('c', 'x' * 4)  # 超過 10 bytes：淘汰最久未使用的 b
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['bytes'] == 8
+    assert cache.stats()['evictions'] == 1
+
+    # 覆寫同一鍵值只計算新的大小
+    cache.put('a', 'x' * 2)
+    assert cache.stats()['bytes'] == 6
+
+    # 單一圖表超過容量時不存入，也不淘汰其他圖表
+    cache.put('huge', 'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_key_normalisation():
+    params = {'teams': {'NYY', 'BOS'}, 'war': (np.float64(1.0000001), 5.2), 'n': np.int64(3)}
+    assert normalize_params(params) == {'n': 3, 'teams': ['BOS', 'NYY'], 'war': [1.0, 5.2]}
+
+    # 集合順序、numpy 型別與滑桿的浮點誤差不影響鍵值
+    same = {'n': 3, 'war': [1.0, 5.2], 'teams': frozenset(['BOS', 'NYY'])}
+    assert make_key('v1', 'scatter', params) == make_key('v1', 'scatter', same)
+    assert make_key('v1', 'scatter', params) != make_key('v2', 'scatter', params)
+    assert make_key('v1', 'scatter', params) != make_key('v1', 'box', params)
+    assert make_key('v1', 'scatter', {'war': [1.0, 5.3]}) != make_key('v1', 'scatter', {'war': [1.0, 5.2]})
@@ -0,0 +1,91 @@
+"""filter_index：二分搜尋 + 球隊位元圖的篩選結果與 pandas 布林遮罩相同"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlb_analysis.filter_index import FilterIndex
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(7)
+    n = 403  # 不是 8 的倍數：位元圖最後一個位元組只用到一部分
+    frame = pd.DataFrame({
+        'Name': [f"P{i}" for i in range(n)],
+        'Team': rng.choice(['NYY', 'BOS', 'LAD', 'TBR', 'SEA'], n),
+        'WAR': rng.normal(2.0, 2.0, n).round(1),
+        'Salary_millions': rng.lognormal(1.0, 1.0, n).round(2),
+    })
+    frame.loc[rng.choice(n, 20, replace=False), 'WAR'] = np.nan
+    frame.loc[rng.choice(n, 20, replace=False), 'Salary_millions'] = np.nan
+    return frame
+
+
+def _mask_rows(df, ranges, team):
+    mask = pd.Series(True, index=df.index)
+    for col, (low, high) in ranges.items():
+        values = df[col]
+        mask &= values.notna()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    if team is not None:
+        mask &= df['Team'] == team
+    return np.flatnonzero(mask.to_numpy())
+
+
+@pytest.mark.parametrize('ranges', [
+    {'WAR': (0.0, 3.0)},
+    {'Salary_millions': (1.5, 10.0)},
+    {'WAR': (-1.0, 4.5), 'Salary_millions': (0.5, 20.0)},
+    {'WAR': (1.0, None)},
+    {'Salary_millions': (None, 2.0)},
+])
+@pytest.mark.parametrize('team', [None, 'NYY', 'SEA'])
+def test_query_matches_pandas_mask(df, ranges, team):
+    index = FilterIndex(df)
+    np.testing.assert_array_equal(index.query(ranges, team), _mask_rows(df, ranges, team))
+    pd.testing.assert_frame_equal(index.select(df, ranges, team), df.iloc[_mask_rows(df, ranges, team)])
+
+
+def test_bounds_are_inclusive(df):
+    index = FilterIndex(df)
+    war = df['WAR'].dropna()
+    low, high = war.iloc[0], war.iloc[1]
+    low, high = min(low, high), max(low, high)
+    rows = index.query({'WAR': (low, high)})
+    np.testing.assert_array_equal(rows, _mask_rows(df, {'WAR': (low, high)}, None))
+    assert set(df['WAR'].iloc[rows]) >= {low, high}
+
+
+def test_nan_rows_are_excluded(df):
+    index = FilterIndex(df)
+    full = (df['WAR'].min(), df['WAR'].max())
+    rows = index.query({'WAR': full})
+    # 範圍涵蓋所有數值時仍排除 WAR 為 NaN 的列，與遮罩相同
+    assert len(rows) == df['WAR'].notna().sum()
+    assert index.restricts({'WAR': full})
+    assert not df['WAR'].iloc[rows].isna().any()
+
+
+def test_unknown_team_returns_no_rows(df):
+    index = FilterIndex(df)
+    assert len(index.query(team='XXX')) == 0
+    assert len(index.query({'WAR': (0.0, 3.0)}, team='XXX')) == 0
+    assert index.select(df, team='XXX').empty
+
+
+def test_unrestricted_returns_df_itself():
+    frame = pd.DataFrame({'Team': ['A', 'B', 'A'], 'WAR': [1.0, 2.0, 3.0], 'Salary_millions': [1.0, 5.0, 9.0]})
+    index = FilterIndex(frame)
+    ranges = {'WAR': (0.0, 10.0), 'Salary_millions': (1.0, 9.0)}
+    assert not index.restricts(ranges)
+    assert index.query(ranges) is None
+    assert index.select(frame, ranges) is frame
+    assert index.select(frame) is frame
+
+
+def test_unknown_column_raises(df):
+    with pytest.raises(KeyError):
+        FilterIndex(df).query({'HR': (0, 10)})
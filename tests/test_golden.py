@@ -0,0 +1,67 @@
+"""golden：目前的實作與 data/golden/bundled 的快照相符，且刻意改變的輸出會被偵測出來"""
+import os
+import shutil
+
+import pytest
+
+from mlb_analysis import golden
+
+BUNDLED = ['bundled']
+
+
+@pytest.fixture
+def golden_copy(tmp_path):
+    """複製內附資料集的快照，讓測試可以修改"""
+    shutil.copytree(os.path.join(golden.GOLDEN_DIR, "bundled"), tmp_path / "bundled")
+    return tmp_path
+
+
+def _perturb(golden_dir, table, column, factor):
+    path = golden_dir / "bundled" / f"{table}.csv"
+    frame = golden._read(path)
+    frame.loc[frame.index[0], column] *= factor
+    frame.to_csv(path, float_format='%.17g')
+
+
+def _failed(report):
+    return {key: problems for key, problems in report.items() if problems}
+
+
+def test_bundled_matches_golden():
+    report = golden.check(BUNDLED)
+    assert {table for _, table in report} == {'derived_columns', 'team_psi', 'sei', 'ols', 'wvpi_pca'}
+    assert _failed(report) == {}
+
+
+def test_changed_snapshot_value_is_detected(golden_copy):
+    _perturb(golden_copy, 'team_psi', 'PSI', 1 + 1e-6)
+
+    failed = _failed(golden.check(BUNDLED, golden_dir=str(golden_copy)))
+    assert list(failed) == [('bundled', 'team_psi')]
+    assert failed[('bundled', 'team_psi')][0].startswith("PSI: 1 列超出容許誤差")
+
+
+def test_changed_implementation_is_detected(monkeypatch):
+    # 模擬改寫時不小心改動分類門檻：管理評價整體平移一級
+    classify_psi = golden.classify_psi
+    monkeypatch.setattr(golden, 'classify_psi', lambda psi: classify_psi(psi + 1.0))
+
+    failed = _failed(golden.check(BUNDLED))
+    assert list(failed) == [('bundled', 'team_psi')]
+    assert failed[('bundled', 'team_psi')][0].startswith("管理評價:")
+
+
+def test_difference_within_tolerance_passes(golden_copy):
+    _perturb(golden_copy, 'sei', 'sei', 1 + 1e-12)
+    assert _failed(golden.check(BUNDLED, golden_dir=str(golden_copy))) == {}
+    # 收緊容許誤差後，同一個差異即被偵測
+    assert _failed(golden.check(BUNDLED, golden_dir=str(golden_copy), rtol=1e-14, atol=0))
+
+
+def test_missing_table_and_cli_exit_code(golden_copy, capsys):
+    args = ['check', '--datasets', 'bundled', '--golden-dir', str(golden_copy)]
+    assert golden.main(args) == 0
+
+    (golden_copy / "bundled" / "ols.csv").unlink()
+    assert golden.main(args) == 1
+    assert "❌ bundled/ols" in capsys.readouterr().out
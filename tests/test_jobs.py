@@ -0,0 +1,105 @@
+"""jobs：相同工作只排入一次、失敗不影響之後的工作、取消排隊中的工作、清理時刪除輸出檔"""
+import os
+
+import pandas as pd
+import pytest
+
+from mlb_analysis import jobs
+from mlb_analysis.dataset import BUNDLED_DATA
+
+
+def _answer(ctx, df, value=1):
+    return {'rows': len(df), 'value': value}
+
+
+def _boom(ctx, df):
+    raise RuntimeError("boom")
+
+
+def _write_file(ctx, df, name='a'):
+    path = ctx.output_path('.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(name)
+    return {'path': path}
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = tmp_path / "players.csv"
+    pd.read_csv(BUNDLED_DATA).head(40).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    for name, fn in (('answer', _answer), ('boom', _boom), ('file', _write_file)):
+        monkeypatch.setitem(jobs.JOB_KINDS, name, jobs.JobKind(name, name, fn))
+    return jobs.JobQueue(str(tmp_path / "jobs" / "jobs.sqlite3"))
+
+
+def test_same_key_returns_existing_job(queue, data):
+    job_id, created = queue.submit('answer', {'value': 2}, data)
+    assert created
+    # 參數補上預設值後相同：同一項工作
+    assert queue.submit('answer', {'value': 2}, data) == (job_id, False)
+    assert queue.submit('answer', {}, data)[1]
+    assert queue.submit('answer', {'value': 1}, data)[1] is False
+
+    # 完成後仍取用同一項工作的結果
+    queue.work(once=True)
+    assert queue.submit('answer', {'value': 2}, data) == (job_id, False)
+    assert queue.result(job_id) == {'rows': 40, 'value': 2}
+
+
+def test_force_creates_new_job(queue, data):
+    job_id, _ = queue.submit('answer', None, data)
+    forced, created = queue.submit('answer', None, data, force=True)
+    assert created and forced != job_id
+    # 之後的送出取用最新的一項
+    assert queue.submit('answer', None, data) == (forced, False)
+
+
+def test_failed_job_does_not_stop_the_next(queue, data):
+    failed_id, _ = queue.submit('boom', None, data)
+    ok_id, _ = queue.submit('answer', None, data)
+
+    queue.work(once=True)
+    failed = queue.get(failed_id)
+    assert failed['state'] == 'failed' and 'RuntimeError: boom' in failed['error']
+    assert queue.get(ok_id)['state'] == 'done'
+    assert queue.result(ok_id) == {'rows': 40, 'value': 1}
+
+    # 失敗的工作不會被取用：再次送出時重新排入
+    retry_id, created = queue.submit('boom', None, data)
+    assert created and retry_id != failed_id
+
+
+def test_cancel_queued_job(queue, data):
+    job_id, _ = queue.submit('answer', None, data)
+    assert queue.cancel(job_id)
+    assert queue.get(job_id)['state'] == 'cancelled'
+    assert not queue.cancel(job_id)  # 已結束的工作
+
+    assert queue.run_next() is None  # 已取消的工作不會被認領
+    assert not queue.has_active()
+
+
+def test_prune_deletes_output_files(queue, data):
+    paths = []
+    for name in ('a', 'b', 'c'):
+        job_id, _ = queue.submit('file', {'name': name}, data)
+        queue.run_next()
+        paths.append(queue.result(job_id)['path'])
+    assert all(open(path, encoding='utf-8').read() for path in paths)
+
+    assert queue.prune(keep=1) == 2
+    assert [job['state'] for job in queue.list_jobs()] == ['done']
+    assert [path for path in paths if os.path.exists(path)] == paths[-1:]
+
+
+def test_invalid_params_are_refused_at_submit(queue, data):
+    with pytest.raises(ValueError, match='n_permutations'):
+        queue.submit('permutation', {'n_permutations': -1}, data)
+    with pytest.raises(ValueError, match='沒有參數'):
+        queue.submit('answer', {'missing': 1}, data)
+    assert queue.list_jobs() == []
@@ -0,0 +1,57 @@
+"""lazy_imports：啟動階段 import 的時間在新的直譯器中量測，不受目前行程已載入模組的影響"""
+import os
+import sys
+
+import pandas as pd  # noqa: F401  目前行程已載入 pandas
+import pytest
+
+from mlb_analysis import lazy_imports
+from mlb_analysis.dataset import REPO_ROOT
+
+
+def test_eager_modules_lists_top_level_imports_only(tmp_path):
+    script = tmp_path / "app.py"
+    script.write_text(
+        "import os, json\n"
+        "from mlb_analysis import telemetry\n"
+        "from mlb_analysis.metrics import preprocess_data\n"
+        "if os.environ.get('X'):\n"
+        "    import csv\n"
+        "def f():\n"
+        "    import sqlite3\n",
+        encoding='utf-8',
+    )
+    assert lazy_imports.eager_modules(str(script)) == [
+        'os', 'json', 'mlb_analysis', 'mlb_analysis.telemetry',
+        'mlb_analysis.metrics', 'mlb_analysis.metrics.preprocess_data',
+    ]
+
+
+def test_time_imports_skips_imported_names_that_are_not_modules():
+    timings = lazy_imports.time_imports(['mlb_analysis.metrics', 'mlb_analysis.metrics.preprocess_data'])
+    assert list(timings) == ['mlb_analysis.metrics']
+    with pytest.raises(ModuleNotFoundError):
+        lazy_imports.time_imports(['mlb_analysis_missing_module'])
+
+
+def test_fresh_measurement_counts_modules_already_loaded_here():
+    assert 'pandas' in sys.modules
+    # 在目前行程中 import 已載入的模組只會量到查表的時間
+    assert lazy_imports.time_imports(['pandas'])['pandas'] < 0.01
+
+    timings = lazy_imports.measure_fresh_imports(['pandas', 'numpy'])
+    assert timings['pandas'] > 0.05
+    # numpy 已由 pandas 載入，不重複計算
+    assert timings['numpy'] < timings['pandas']
+
+
+def test_dashboard_eager_imports_are_measured():
+    modules = lazy_imports.eager_modules(os.path.join(REPO_ROOT, "dashboard.py"))
+    assert {'streamlit', 'pandas', 'numpy', 'mlb_analysis.telemetry'} <= set(modules)
+    # 延遲載入的子系統不在啟動階段 import
+    assert not {'plotly.express', 'scipy.stats', 'sklearn.decomposition'} & set(modules)
+
+    report = lazy_imports.startup_report({'pandas': 0.4, 'numpy': 0.0})
+    assert report['eager_seconds'] == pytest.approx(0.4)
+    assert [t['module'] for t in report['eager_imports']] == ['pandas', 'numpy']
+    assert all(not t['lazy'] for t in report['eager_imports'])
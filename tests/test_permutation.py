@@ -0,0 +1,69 @@
+"""permutation：向量化統計量與 metrics 的計算相同，固定種子的結果與行程數無關，重抽次數不可為負"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlb_analysis import permutation
+from mlb_analysis.dataset import BUNDLED_DATA
+from mlb_analysis.jobs import JOB_KINDS
+from mlb_analysis.metrics import calculate_all_team_psi, preprocess_data
+from mlb_analysis.parallel import GroupExecutor
+
+
+@pytest.fixture(scope='module')
+def df():
+    return preprocess_data(pd.read_csv(BUNDLED_DATA)).dropna(subset=['WAR', 'Salary_millions'])
+
+
+def test_observed_statistics_match_metrics(df):
+    observed = permutation.permutation_test(df, 0)['observed']
+    expected_r = np.corrcoef(df['WAR'], df['Salary_millions'])[0, 1]
+    assert observed['correlation'] == pytest.approx(expected_r, rel=1e-10)
+    assert observed['r_squared'] == pytest.approx(expected_r ** 2, rel=1e-10)
+    expected_psi = calculate_all_team_psi(df, min_players=permutation.MIN_TEAM_PLAYERS)['PSI'].std()
+    assert observed['psi_dispersion'] == pytest.approx(expected_psi, rel=1e-9)
+
+
+def test_bootstrap_statistics_match_metrics(df):
+    # 拔靴的一列（重抽後的樣本）也要與直接計算相同
+    arrays = permutation.prepare(df)
+    index = np.random.default_rng(3).integers(0, len(df), size=(2, len(df)))
+    stats = permutation.block_statistics(arrays['salary'][index], arrays['war'][index], arrays['pos'][index],
+                                         arrays['team'][index], arrays['n_pos'], arrays['n_team'])
+    for row in range(2):
+        sample = df.iloc[index[row]]
+        assert stats['correlation'][row] == pytest.approx(
+            np.corrcoef(sample['WAR'], sample['Salary_millions'])[0, 1], rel=1e-10)
+        assert stats['psi_dispersion'][row] == pytest.approx(calculate_all_team_psi(sample)['PSI'].std(), rel=1e-9)
+
+
+def test_fixed_seed_is_independent_of_workers(df, monkeypatch):
+    # 縮小區塊讓重抽分成多個區塊，平行時分散到不同的工作行程
+    monkeypatch.setattr(permutation, 'BLOCK_ELEMENTS', 50 * len(df))
+    local = permutation.permutation_test(df, 300, 200, seed=7)
+    executor = GroupExecutor(workers=2)
+    try:
+        parallel = permutation.permutation_test(df, 300, 200, seed=7, executor=executor, min_parallel=0)
+    finally:
+        executor.shutdown()
+
+    assert local['blocks'] == parallel['blocks'] == 10
+    assert parallel['workers'] == 2
+    for name in permutation.STATISTICS:
+        np.testing.assert_array_equal(local['null'][name], parallel['null'][name])
+        np.testing.assert_array_equal(local['bootstrap'][name], parallel['bootstrap'][name])
+    assert local['p_values'] == parallel['p_values']
+    assert local['ci'] == parallel['ci']
+
+
+def test_negative_counts_are_rejected(df):
+    with pytest.raises(ValueError, match='n_permutations'):
+        permutation.permutation_test(df, -1)
+    with pytest.raises(ValueError, match='n_bootstrap'):
+        permutation.permutation_test(df, 10, n_bootstrap=-5)
+    with pytest.raises(SystemExit):
+        permutation.main(['--permutations', '-1'])
+    # 送出背景工作時即檢查，不會排入佇列
+    with pytest.raises(ValueError, match='n_permutations'):
+        JOB_KINDS['permutation'].params({'n_permutations': -1})
+    assert JOB_KINDS['permutation'].params({'n_permutations': 0})['n_permutations'] == 0
@@ -0,0 +1,30 @@
+"""precompute：背景任務失敗不影響之後的任務，頁面取用時重新計算並呈現錯誤"""
+import pytest
+
+from mlb_analysis.precompute import PrecomputeScheduler
+
+
+def _boom():
+    raise RuntimeError("boom")
+
+
+def test_failed_background_task_keeps_worker_alive():
+    scheduler = PrecomputeScheduler()
+    bad = scheduler.submit('v1', 'bad', _boom, priority=0)
+    good = scheduler.submit('v1', 'good', lambda: 42, priority=1)
+
+    assert good.done.wait(5)
+    assert bad.state == 'failed' and isinstance(bad.error, RuntimeError)
+    assert good.state == 'done' and good.result == 42
+    assert scheduler.stats()['failed'] == 1 and scheduler.stats()['done'] == 1
+
+    # 同一個背景執行緒繼續處理之後排入的任務
+    later = scheduler.submit('v1', 'later', lambda: 'ok')
+    assert later.done.wait(5) and later.result == 'ok'
+
+
+def test_foreground_failure_is_raised():
+    scheduler = PrecomputeScheduler()
+    with pytest.raises(RuntimeError):
+        scheduler.get('v1', 'bad', _boom)
+    assert scheduler.get('v1', 'good', lambda: 1) == 1
@@ -0,0 +1,38 @@
+"""score：--skip-unchanged 只略過輸入檔版本與評分參數都未變更的檔案"""
+import shutil
+
+from mlb_analysis import score
+from mlb_analysis.dataset import BUNDLED_DATA as DATA
+
+
+def test_skip_unchanged_rescores_when_params_change(tmp_path):
+    src = tmp_path / "in" / "season.csv"
+    src.parent.mkdir()
+    shutil.copy(DATA, src)
+    out_dir = str(tmp_path / "out")
+    files = [str(src)]
+
+    results, errors = score.run(files, out_dir, workers=1, min_players=3)
+    assert errors == {} and len(results) == 1
+    entry = score.load_manifest(out_dir)['files'][str(src)]
+    assert entry['params'] == {'min_players': 3}
+
+    # 相同參數：略過
+    assert score.run(files, out_dir, workers=1, min_players=3, skip_unchanged=True) == ([], {})
+
+    # 改變 min_players：重新評分並更新 manifest
+    results, errors = score.run(files, out_dir, workers=1, min_players=5, skip_unchanged=True)
+    assert errors == {} and len(results) == 1
+    assert score.load_manifest(out_dir)['files'][str(src)]['params'] == {'min_players': 5}
+    assert score.run(files, out_dir, workers=1, min_players=5, skip_unchanged=True) == ([], {})
+
+
+def test_entry_without_params_is_rescored(tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    (out_dir / "season.scored.csv").write_text("x\n")
+    entry = {'version': score.file_version(DATA), 'outputs': {'scored': "season.scored.csv"}}
+    # 舊版 manifest 沒有記錄評分參數，無法確認結果相同
+    assert not score.is_unchanged(entry, DATA, str(out_dir), 'csv')
+    assert score.is_unchanged({**entry, 'params': {'min_players': 3}}, DATA, str(out_dir), 'csv')
+    assert not score.is_unchanged({**entry, 'params': {'min_players': 3}}, DATA, str(out_dir), 'csv', min_players=4)
@@ -0,0 +1,90 @@
+"""shared_cache：多個行程同時讀取時只計算一次，且快取的結果與直接計算相同"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from mlb_analysis import shared_cache
+from mlb_analysis.dataset import BUNDLED_DATA as DATA
+from mlb_analysis.shared_cache import SharedDerivedCache, _derive, _locked
+
+pytestmark = pytest.mark.skipif(shared_cache.fcntl is None, reason="平台不支援 fcntl 檔案鎖")
+
+WORKERS = 4
+
+
+def _counted_derive(marker_dir):
+    # 每次實際計算留下一個標記檔，並拉長計算時間讓其他行程必定在計算期間到達
+    with open(os.path.join(marker_dir, f"compute-{os.getpid()}-{time.time_ns()}"), 'w'):
+        pass
+    time.sleep(0.5)
+    return _derive(DATA)
+
+
+def _worker(directory, marker_dir, start_at):
+    time.sleep(max(0.0, start_at - time.time()))
+    return SharedDerivedCache(directory).get_or_compute('bundled', lambda: _counted_derive(marker_dir))
+
+
+def test_concurrent_processes_compute_once(tmp_path):
+    directory, marker_dir = tmp_path / "cache", tmp_path / "markers"
+    marker_dir.mkdir()
+    start_at = time.time() + 1.0
+    with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(_worker, [str(directory)] * WORKERS, [str(marker_dir)] * WORKERS,
+                                [start_at] * WORKERS))
+
+    assert len(os.listdir(marker_dir)) == 1
+    assert sorted(status for _, status in results) == ['built'] + ['hit'] * (WORKERS - 1)
+
+    expected = _derive(DATA)
+    for df, _ in results:
+        pd.testing.assert_frame_equal(df, expected)
+    pd.testing.assert_frame_equal(SharedDerivedCache(str(directory)).get('bundled'), expected)
+
+
+def test_eviction_keeps_lock_files(tmp_path):
+    cache = SharedDerivedCache(str(tmp_path), max_entries=1)
+    frame = pd.DataFrame({'x': [1, 2, 3]})
+    cache.get_or_compute('old', lambda: frame)
+    cache.get_or_compute('new', lambda: frame)
+
+    assert list(cache.manifest()) == ['new']
+    assert not (tmp_path / "old.arrow").exists()
+    # 其他行程可能仍持有或等待舊鍵值的計算鎖，鎖檔不可刪除
+    assert (tmp_path / "old.lock").exists()
+
+
+def test_lock_rechecks_inode_after_external_unlink(tmp_path):
+    path = str(tmp_path / "key.lock")
+    entered = []
+    holding, release_old = threading.Event(), threading.Event()
+
+    def holder():
+        with _locked(path):
+            holding.set()
+            release_old.wait()
+
+    def waiter():
+        with _locked(path):
+            entered.append('waiter')
+
+    holder_thread = threading.Thread(target=holder)
+    holder_thread.start()
+    holding.wait()
+    waiter_thread = threading.Thread(target=waiter)
+    waiter_thread.start()
+    time.sleep(0.2)  # waiter 正在等待舊檔案的鎖
+
+    os.remove(path)
+    with _locked(path):  # 鎖住新建的鎖檔
+        release_old.set()
+        holder_thread.join()
+        time.sleep(0.2)  # waiter 取得舊檔案的鎖後應發現 inode 不同，改等新檔案
+        assert entered == []
+        entered.append('main')
+    waiter_thread.join(timeout=5)
+    assert entered == ['main', 'waiter']
@@ -0,0 +1,57 @@
+"""summary_cube：由彙總格計算的關鍵指標與直接掃描資料列的結果相同"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlb_analysis.dataset import BUNDLED_DATA as DATA
+from mlb_analysis.metrics import preprocess_data
+from mlb_analysis.summary_cube import SummaryCube, row_kpis
+
+
+@pytest.fixture(scope='module')
+def df():
+    return preprocess_data(pd.read_csv(DATA))
+
+
+def _assert_kpis_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    assert actual['rows'] == expected['rows']
+    for key in expected:
+        np.testing.assert_allclose(actual[key], expected[key], rtol=1e-10, atol=1e-12, err_msg=key)
+
+
+def test_kpis_match_rows_for_every_team(df):
+    cube = SummaryCube(df)
+    _assert_kpis_equal(cube.kpis(), row_kpis(df))
+    _assert_kpis_equal(cube.kpis({'Team': None}), row_kpis(df))
+    for team in df['Team'].dropna().unique():
+        _assert_kpis_equal(cube.kpis({'Team': team}), row_kpis(df[df['Team'] == team]))
+
+
+def test_correlation_is_stable_for_large_offsets():
+    # 數值大、變異小：Σxy − ΣxΣy/n 的相消誤差會讓相關係數明顯偏離
+    rng = np.random.default_rng(0)
+    n = 5000
+    x = 1e8 + rng.normal(0, 1, n)
+    frame = pd.DataFrame({
+        'Team': rng.choice(['A', 'B', 'C'], n),
+        'WAR': x,
+        'Salary_millions': 1e8 + 0.5 * (x - 1e8) + rng.normal(0, 1, n),
+    })
+    frame.loc[::97, 'Salary_millions'] = np.nan
+
+    cube = SummaryCube(frame, dims=['Team'])
+    valid = frame.dropna()
+    expected = np.corrcoef(valid['WAR'], valid['Salary_millions'])[0, 1]
+    assert cube.kpis()['correlation'] == pytest.approx(expected, rel=1e-9)
+
+    team_a = valid[valid['Team'] == 'A']
+    expected_a = np.corrcoef(team_a['WAR'], team_a['Salary_millions'])[0, 1]
+    assert cube.kpis({'Team': 'A'})['correlation'] == pytest.approx(expected_a, rel=1e-9)
+
+
+def test_correlation_needs_two_rows():
+    frame = pd.DataFrame({'Team': ['A', 'B'], 'WAR': [1.0, 2.0], 'Salary_millions': [3.0, 5.0]})
+    cube = SummaryCube(frame, dims=['Team'])
+    assert np.isnan(cube.kpis({'Team': 'A'})['correlation'])
+    assert cube.kpis()['correlation'] == pytest.approx(1.0)
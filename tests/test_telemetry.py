@@ -0,0 +1,77 @@
+"""telemetry：指標端點可由本機抓取並解析，行程啟動時間為實際的啟動時間"""
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from mlb_analysis import telemetry
+from mlb_analysis.dataset import REPO_ROOT
+
+
+@pytest.fixture
+def metrics_url():
+    server = telemetry.start_server(port=0)
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    finally:
+        telemetry.stop_server()
+
+
+def test_metrics_endpoint_round_trip(metrics_url):
+    with telemetry.load_data_call():
+        telemetry.note_load_data_miss()
+    telemetry.note_shared_cache('hit')
+    telemetry.record_dataset(pd.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]}))
+    telemetry.observe_rerun('綜合儀表板', 0.3)
+    telemetry.observe_rerun('綜合儀表板', 7.0)
+
+    with urllib.request.urlopen(metrics_url, timeout=5) as response:
+        assert response.headers['Content-Type'] == telemetry.CONTENT_TYPE
+        samples = telemetry.parse_exposition(response.read().decode('utf-8'))
+
+    mode = (('mode', '綜合儀表板'),)
+    assert samples[('mlb_load_data_requests_total', (('result', 'miss'),))] >= 1
+    assert samples[('mlb_shared_cache_loads_total', (('status', 'hit'),))] >= 1
+    assert samples[('mlb_dataset_rows', ())] == 3
+    assert samples[('mlb_dataset_columns', ())] == 2
+    assert samples[('mlb_rerun_duration_seconds_count', mode)] >= 2
+    assert samples[('mlb_rerun_duration_seconds_bucket', mode + (('le', '0.5'),))] >= 1
+    assert samples[('mlb_rerun_duration_seconds_bucket', mode + (('le', '+Inf'),))] \
+        == samples[('mlb_rerun_duration_seconds_count', mode)]
+    assert samples[('process_start_time_seconds', ())] == pytest.approx(telemetry.PROCESS_START)
+    if telemetry.read_rss() is not None:
+        assert samples[('process_resident_memory_bytes', ())] > 0
+
+    # scrape() 與直接解析得到相同的指標
+    assert set(telemetry.scrape(metrics_url)) == set(samples)
+
+
+def test_unknown_path_is_404(metrics_url):
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        urllib.request.urlopen(metrics_url.replace('/metrics', '/other'), timeout=5)
+    assert excinfo.value.code == 404
+
+
+def test_parse_exposition_rejects_undeclared_metric():
+    with pytest.raises(ValueError):
+        telemetry.parse_exposition("mlb_unknown_total 1\n")
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason="需要 /proc")
+def test_process_start_time_ignores_late_import():
+    # 子行程先等待 2 秒再匯入模組：啟動時間應接近子行程建立的時間，而不是匯入的時間
+    launched = time.time()
+    output = subprocess.run(
+        [sys.executable, '-c', 'import time; time.sleep(2); imported = time.time(); '
+         'from mlb_analysis import telemetry; print(telemetry.PROCESS_START, imported)'],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    start, imported = float(output[0]), float(output[1])
+    # /proc/stat 的開機時間只精確到秒
+    assert launched - 1.5 <= start <= launched + 1.0
+    assert start < imported - 1.0